@@ -0,0 +1,65 @@
+"""Catching a client up: full snapshot vs the mutations since its seq
+
+Builds a service over LOBBIES lobbies, commits CHANGES join/leave mutations, then
+times encoding & applying what the lobby server would send a client behind by them.
+
+Run from the repository root:
+    python -m benchmarks.change_feed 10000
+"""
+import json
+import shutil
+import sys
+import tempfile
+import time
+from benchmarks.synthetic import MakeLobbies
+from src.journal import JournaledStorage
+from src.lobby_server import ChangesMessage
+from src.lobby_service import LobbyService
+from src.storage import JsonStorage, Storage
+
+CHANGES = (1, 10, 100, 1000)
+
+
+def CatchUp(service, seq):
+    """Encode what a client at seq gets & apply it to a fresh mirror, returns (bytes, seconds)"""
+    mirror = LobbyService(Storage())
+    mirror.Reset(dict(service.lobbies))
+    start = time.perf_counter()
+    data = json.dumps(ChangesMessage(seq, service.ChangesSince(seq)), separators=(",", ":"))
+    message = json.loads(data)
+    if "lobbies" in message:
+        mirror.Reset(message['lobbies'])
+    else:
+        mirror.Replay(message['mutations'])
+    return len(data), time.perf_counter() - start
+
+
+def Main(argv):
+    lobby_count = int(argv[0]) if argv else 10000
+    data_dir = tempfile.mkdtemp()
+    try:
+        storage = JsonStorage(data_dir)
+        storage.InitDataFiles()
+        storage.SaveLobbies(MakeLobbies(lobby_count))
+        # Journaled so each commit appends instead of rewriting every lobby
+        service = LobbyService(JournaledStorage(data_dir))
+        leader = {"username": "bench_tank", "role": "Tank", "rating": 4000}
+        service.CreateLobby(leader, "bench", 0)
+        user = {"username": "bench_dps", "role": "DPS", "rating": 4000}
+
+        print(f"{lobby_count} lobbies")
+        print(f"{'behind by':>10} {'snapshot':>22} {'changes since':>22}")
+        for changes in CHANGES:
+            seq = service.feed.seq
+            for i in range(changes):
+                (service.JoinLobby if i % 2 == 0 else service.LeaveLobby)(user, "bench")
+            snapshot_bytes, snapshot_time = CatchUp(service, -1)
+            changes_bytes, changes_time = CatchUp(service, seq)
+            print(f"{changes:>10} {snapshot_bytes / 1024:>10.0f} KiB {snapshot_time * 1e3:>7.1f} ms"
+                  f" {changes_bytes / 1024:>10.1f} KiB {changes_time * 1e3:>7.2f} ms")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
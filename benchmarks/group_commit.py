@@ -0,0 +1,80 @@
+"""Lobby writes per second with & without group commit
+
+Run from the repository root:
+    python -m benchmarks.group_commit [seconds per run]
+"""
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from benchmarks.synthetic import MakeLobbies
+from src.journal import JournaledStorage
+from src.lobby_service import LobbyService
+from src.storage import JsonStorage
+from src.write_behind import WriteBehindStorage
+
+BACKGROUND_LOBBIES = 1000
+WRITER_COUNTS = (1, 10, 100)
+BACKENDS = (("json", JsonStorage), ("journal", JournaledStorage))
+
+
+def Seed(data_dir, writers):
+    """Background lobbies plus one lobby per writer with free DPS slots"""
+    storage = JsonStorage(data_dir)
+    storage.InitDataFiles()
+    storage.SaveLobbies(MakeLobbies(BACKGROUND_LOBBIES))
+
+    service = LobbyService(storage)
+    leaders = [{"username": f"tank{i}", "role": "Tank", "rating": 4000} for i in range(writers)]
+    service.CreateMany([(leader, f"bench{i}", 0) for i, leader in enumerate(leaders)])
+
+
+def Run(backend, writers, coalesce, seconds):
+    """Hammer join/leave from `writers` threads, returns ops/sec including the final flush"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        Seed(data_dir, writers)
+        storage = backend(data_dir)
+        if coalesce:
+            storage = WriteBehindStorage(storage, window=0.02, max_ops=256)
+        service = LobbyService(storage)
+
+        counts = [0] * writers
+        stop = threading.Event()
+
+        def Writer(i):
+            user = {"username": f"dps{i}", "role": "DPS", "rating": 4000}
+            while not stop.is_set():
+                service.JoinLobby(user, f"bench{i}")
+                service.LeaveLobby(user, f"bench{i}")
+                counts[i] += 2
+
+        threads = [threading.Thread(target=Writer, args=(i,)) for i in range(writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if coalesce:
+            storage.Close()
+        elapsed = time.perf_counter() - start
+        return sum(counts) / elapsed
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def Main(argv):
+    seconds = float(argv[0]) if argv else 2.0
+    for name, backend in BACKENDS:
+        for writers in WRITER_COUNTS:
+            direct = Run(backend, writers, False, seconds)
+            coalesced = Run(backend, writers, True, seconds)
+            print(f"{name:>8} | {writers:>3} writers | direct {direct:10.0f} ops/s "
+                  f"| coalesced {coalesced:10.0f} ops/s | x{coalesced / direct:6.1f}")
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
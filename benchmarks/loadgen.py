@@ -0,0 +1,279 @@
+"""Synthetic load: simulated players replaying an operation mix against the account & lobby services
+
+Seeds users & lobbies shaped like data/users.json & data/lobbies.json into a
+fresh storage opened the way the app opens it, then runs one thread per
+simulated player. Every player picks operations from the mix. An operation
+that doesn't fit where the player stands becomes the one that does: join or
+create while in a lobby leaves it (deletes it as the leader), leave or delete
+outside of one joins one. Each operation is timed alone, choosing its target
+isn't.
+
+Operations: register, login, create, join, leave, delete & prompt (ranking
+the joinable lobbies & building the AI prompt, without asking the AI).
+
+Run from the repository root:
+    python -m benchmarks.loadgen --storage journal --users 10000 --lobbies 2000 --players 32 --ops 20000
+    python -m benchmarks.loadgen --mix join=40,leave=40,prompt=20 --out results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from benchmarks.synthetic import MakeLobbies, MakeUsers, RandomRole
+from src.accounts import AccountService
+from src.backends import OpenServiceStorage
+from src.lobby_ranker import BuildPrompt, PromptLobbies, RankLobbies
+from src.lobby_service import LobbyService
+
+OPS = ("register", "login", "create", "join", "leave", "delete", "prompt")
+MIXES = {
+    # A bit of everything, most players hop between lobbies & ask for suggestions
+    "default": {"register": 2, "login": 15, "create": 8, "join": 25, "leave": 20, "delete": 5, "prompt": 25},
+    # Players looking around rather than moving
+    "browse": {"login": 30, "prompt": 60, "join": 5, "leave": 5},
+    # Lobbies coming & going as fast as players can make them
+    "churn": {"create": 25, "join": 30, "leave": 30, "delete": 15},
+}
+PASSWORD = "12345678"
+
+
+def ParseMix(text):
+    """A mix by name, or weights like 'join=40,leave=40,prompt=20'"""
+    if text in MIXES:
+        return dict(MIXES[text])
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        op = op.strip()
+        if op not in OPS:
+            raise ValueError(f"Unknown operation {op!r}, pick from {', '.join(OPS)} or a mix: {', '.join(MIXES)}")
+        mix[op] = float(weight or 1)
+    return mix
+
+
+def Percentile(samples, q):
+    """q-quantile of already sorted samples, nearest rank"""
+    if not samples:
+        return None
+    return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+
+def LatencyStats(samples):
+    """Count & latency percentiles in milliseconds of (ok, seconds) samples"""
+    seconds = sorted(elapsed for _, elapsed in samples)
+    return {
+        "count": len(samples),
+        "ok": sum(1 for ok, _ in samples if ok),
+        "p50_ms": Percentile(seconds, 0.50) * 1e3 if seconds else None,
+        "p95_ms": Percentile(seconds, 0.95) * 1e3 if seconds else None,
+        "p99_ms": Percentile(seconds, 0.99) * 1e3 if seconds else None,
+        "max_ms": seconds[-1] * 1e3 if seconds else None,
+    }
+
+
+class Player:
+    """One simulated player, a signed in user doing one operation after another"""
+
+    def __init__(self, index, user, services, rng):
+        self.index = index
+        self.user = user
+        self.accounts, self.lobbies = services
+        self.rng = rng
+        self.created = 0
+        self.registered = 0
+        # (op, ok, seconds) of every operation
+        self.samples = []
+
+    def Fit(self, op):
+        """The operation actually run for op, given whether & how the player sits in a lobby"""
+        lobby_id = self.lobbies.LobbyOf(self.user['username'])
+        if lobby_id is not None and op in ("create", "join", "delete"):
+            lobby = self.lobbies.lobbies.get(lobby_id)
+            return ("delete" if lobby is not None and lobby['leader'] == self.user['username'] else "leave"), lobby_id
+        if lobby_id is None and op in ("leave", "delete"):
+            return "join", None
+        return op, lobby_id
+
+    def Step(self, op):
+        """Run one operation of the mix & record how long it took"""
+        op, lobby_id = self.Fit(op)
+        username = self.user['username']
+        if op == "register":
+            self.registered += 1
+            name = f"new{self.index}_{self.registered}"
+            start = time.perf_counter()
+            ok = self.accounts.Register(name, PASSWORD, f"{name}@gmail.com", RandomRole(self.rng),
+                                        self.rng.randint(0, 4000)).ok
+        elif op == "login":
+            start = time.perf_counter()
+            ok = self.accounts.Login(username, PASSWORD)[1] is not None
+        elif op == "create":
+            self.created += 1
+            name = f"{username}'s lobby {self.created}"
+            rating = self.rng.randrange(0, self.user['rating'] + 1, 50)
+            start = time.perf_counter()
+            ok = self.lobbies.CreateLobby(self.user, name, rating).ok
+        elif op == "join":
+            joinable = self.lobbies.JoinableLobbies(self.user)
+            target = self.rng.choice(joinable) if joinable else "no such lobby"
+            start = time.perf_counter()
+            ok = self.lobbies.JoinLobby(self.user, target).ok
+        elif op == "leave":
+            start = time.perf_counter()
+            ok = self.lobbies.LeaveLobby(self.user, lobby_id).ok
+        elif op == "delete":
+            start = time.perf_counter()
+            ok = self.lobbies.DeleteLobby(self.user, lobby_id).ok
+        else:
+            # What the app does before asking the AI, under the lock since other players change the lobbies
+            start = time.perf_counter()
+            with self.lobbies.lock:
+                lobbies = self.lobbies.LoadLobbies()
+                ranked = RankLobbies(self.user, lobbies, self.lobbies.JoinableLobbies(self.user))
+                ok = bool(ranked) and bool(BuildPrompt(self.user, lobbies, PromptLobbies(lobbies, ranked)))
+        self.samples.append((op, ok, time.perf_counter() - start))
+
+    def Run(self, ops, mix, barrier):
+        """Run ops operations drawn from mix, starting together with the other players"""
+        names, weights = zip(*mix.items())
+        chosen = self.rng.choices(names, weights, k=ops)
+        barrier.wait()
+        for op in chosen:
+            self.Step(op)
+
+
+def Seed(spec, user_count, lobby_count, seed=0):
+    """Fresh users & lobbies in the storage of spec"""
+    storage = OpenServiceStorage(spec)
+    storage.InitDataFiles()
+    storage.ReplaceUsers(MakeUsers(user_count, seed).items())
+    storage.SaveLobbies(MakeLobbies(lobby_count, seed))
+    storage.Close()
+
+
+def RunScenario(storage="journal", users=10000, lobbies=2000, players=32, ops=20000, mix="default", seed=0):
+    """Seed a temporary storage, replay the mix from players threads, returns the results dict"""
+    mix_weights = ParseMix(mix)
+    data_dir = tempfile.mkdtemp()
+    try:
+        spec = f"{storage}:{os.path.join(data_dir, 'wow.db') if storage == 'sqlite' else data_dir}"
+        Seed(spec, users, lobbies, seed)
+
+        # One service shared by every player thread, like one app or server process
+        service_storage = OpenServiceStorage(spec)
+        services = (AccountService(service_storage), LobbyService(service_storage))
+        all_users = MakeUsers(min(players, users), seed)
+        simulated = [Player(i, {"username": username, **user}, services, random.Random(seed * 1000003 + i))
+                     for i, (username, user) in enumerate(all_users.items())]
+        barrier = threading.Barrier(len(simulated) + 1)
+        threads = [threading.Thread(target=player.Run, args=(ops // len(simulated), mix_weights, barrier))
+                   for player in simulated]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        # Whatever is still queued counts, the app waits for it on exit too
+        service_storage.Close()
+        total_elapsed = time.perf_counter() - start
+
+        samples = [sample for player in simulated for sample in player.samples]
+        by_op = {op: [(ok, seconds) for kind, ok, seconds in samples if kind == op] for op in OPS}
+        return {
+            "name": f"{storage}/{mix}",
+            "storage": storage,
+            "mix": mix_weights,
+            "users": users,
+            "lobbies": lobbies,
+            "players": len(simulated),
+            "ops": len(samples),
+            "seconds": total_elapsed,
+            "throughput": len(samples) / total_elapsed,
+            "flush_seconds": total_elapsed - elapsed,
+            "all": LatencyStats([(ok, seconds) for _, ok, seconds in samples]),
+            "by_op": {op: LatencyStats(op_samples) for op, op_samples in by_op.items() if op_samples},
+        }
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def Environment():
+    """Where the results came from, so runs can be compared like for like"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"created": datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+
+
+def SaveResults(path, scenarios):
+    """Write scenarios & the environment as JSON"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"environment": Environment(), "scenarios": scenarios}, f, indent=2)
+
+
+def Describe(result):
+    """Human-readable lines of one scenario's results"""
+    lines = [f"{result['name']}: {result['ops']} ops from {result['players']} players in {result['seconds']:.2f}s, "
+             f"{result['throughput']:,.0f} ops/s ({result['users']} users, {result['lobbies']} lobbies)"]
+    for op, stats in [("all", result['all'])] + list(result['by_op'].items()):
+        lines.append(f"  {op:<9} {stats['count']:>7} ({stats['ok']:>7} ok)  p50 {stats['p50_ms']:>8.3f} ms  "
+                     f"p95 {stats['p95_ms']:>8.3f} ms  p99 {stats['p99_ms']:>8.3f} ms  max {stats['max_ms']:>8.2f} ms")
+    return lines
+
+
+def Compare(baseline, scenarios):
+    """Lines comparing scenarios with the same names in a baseline results dict"""
+    previous = {scenario['name']: scenario for scenario in baseline['scenarios']}
+    lines = [f"against {baseline['environment'].get('commit')} from {baseline['environment'].get('created')}:"]
+    for result in scenarios:
+        old = previous.get(result['name'])
+        if old is None:
+            lines.append(f"  {result['name']}: not in the baseline")
+            continue
+        change = result['throughput'] / old['throughput'] - 1
+        parts = [f"throughput {change:+.1%}"]
+        for op, stats in result['by_op'].items():
+            if op in old['by_op'] and old['by_op'][op]['p95_ms']:
+                parts.append(f"{op} p95 {stats['p95_ms'] / old['by_op'][op]['p95_ms'] - 1:+.0%}")
+        lines.append(f"  {result['name']}: " + ", ".join(parts))
+    return lines
+
+
+def Main(argv):
+    parser = argparse.ArgumentParser(description="Replay an operation mix from simulated players")
+    parser.add_argument("--storage", default="journal", choices=("json", "journal", "sqlite"))
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--lobbies", type=int, default=2000)
+    parser.add_argument("--players", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=20000, help="operations across all players")
+    parser.add_argument("--mix", default="default", help=f"{', '.join(MIXES)} or weights like join=40,leave=60")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="save the results as JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare with")
+    args = parser.parse_args(argv)
+
+    result = RunScenario(args.storage, args.users, args.lobbies, args.players, args.ops, args.mix, args.seed)
+    print("\n".join(Describe(result)))
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            print("\n".join(Compare(json.load(f), [result])))
+    if args.out:
+        SaveResults(args.out, [result])
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
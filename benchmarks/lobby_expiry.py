@@ -0,0 +1,104 @@
+"""Working-set size under lobby churn, with & without the expiry sweeper
+
+Simulates SECONDS of a server on a fake clock. Every second RATE players create
+a lobby that sees joins & leaves for a random active life, after which it is
+abandoned, a third of them emptied by their leader leaving. The sweeper runs
+once per simulated second.
+
+Run from the repository root:
+    python -m benchmarks.lobby_expiry 3600 2
+(one simulated hour, 2 new lobbies a second)
+"""
+import heapq
+import random
+import shutil
+import sys
+import tempfile
+import time
+from src.journal import JournaledStorage
+from src.lobby_expiry import LobbyExpiry
+from src.lobby_service import LobbyService
+
+MEAN_ACTIVE_LIFE = 600
+MEAN_ACTIVITY_GAP = 120
+IDLE = 600
+EMPTY = 60
+
+
+class FakeClock:
+    """Wall-clock-like time that only moves when told to"""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+def Simulate(seconds, rate, expire):
+    """Returns (peak lobbies, final lobbies, expiry stats or None, slowest sweep in seconds)"""
+    data_dir = tempfile.mkdtemp()
+    try:
+        storage = JournaledStorage(data_dir, fsync=False)
+        storage.InitDataFiles()
+        service = LobbyService(storage)
+        clock = FakeClock()
+        expiry = LobbyExpiry(service, ttl=None, idle=IDLE, empty=EMPTY, clock=clock) if expire else None
+        rng = random.Random(0)
+        # (when, tie breaker, lobby index, end of its active life)
+        events = []
+        sequence = 0
+        peak = 0
+        slowest = 0.0
+        start = clock.now
+
+        for second in range(seconds):
+            clock.now = start + second
+            for _ in range(rate):
+                index = sequence
+                leader = {"username": f"leader{index}", "role": "Tank", "rating": 4000}
+                service.CreateLobby(leader, f"lobby{index}", 0)
+                end = clock.now + rng.expovariate(1 / MEAN_ACTIVE_LIFE)
+                heapq.heappush(events, (clock.now + rng.expovariate(1 / MEAN_ACTIVITY_GAP), sequence, index, end))
+                sequence += 1
+
+            while events and events[0][0] <= clock.now:
+                _, _, index, end = heapq.heappop(events)
+                lobby_id = f"lobby{index}"
+                if clock.now >= end:
+                    # Abandoned, a third of the leaders leave on the way out
+                    if index % 3 == 0:
+                        service.LeaveLobby({"username": f"leader{index}", "role": "Tank", "rating": 4000}, lobby_id)
+                    continue
+                visitor = {"username": f"visitor{index}", "role": "DPS", "rating": 4000}
+                service.JoinLobby(visitor, lobby_id)
+                service.LeaveLobby(visitor, lobby_id)
+                heapq.heappush(events, (clock.now + rng.expovariate(1 / MEAN_ACTIVITY_GAP), sequence, index, end))
+                sequence += 1
+
+            if expiry is not None:
+                started = time.perf_counter()
+                expiry.Sweep()
+                slowest = max(slowest, time.perf_counter() - started)
+            peak = max(peak, len(service.lobbies))
+
+        return peak, len(service.lobbies), expiry.Stats() if expiry else None, slowest
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def Main(argv):
+    seconds = int(argv[0]) if argv else 3600
+    rate = int(argv[1]) if len(argv) > 1 else 2
+    print(f"{seconds}s simulated, {rate} new lobbies/s, idle {IDLE}s, empty {EMPTY}s")
+    for expire in (False, True):
+        peak, final, stats, slowest = Simulate(seconds, rate, expire)
+        line = f"{'with' if expire else 'without':>7} expiry: peak {peak} lobbies, {final} at the end"
+        if stats:
+            line += (f", evicted {stats['evicted']} (idle {stats['idle']}, empty {stats['empty']}), "
+                     f"slowest sweep {slowest * 1e3:.1f} ms")
+        print(line)
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
@@ -0,0 +1,83 @@
+"""Refresh time & widget count of the virtualized lobby list, needs a display
+
+Run from the repository root:
+    python -m benchmarks.lobby_list 100 1000 10000 100000
+"""
+import sys
+import time
+import tkinter as tk
+from benchmarks.synthetic import MakeLobbies
+from src import lobby_service
+from src.lobby_list import VirtualLobbyList
+
+
+class FakeApp:
+    """Just enough of WorldOfWarcraft for the list to render rows"""
+
+    def __init__(self):
+        self.current_user = {"username": "bench", "role": "DPS", "rating": 2500}
+
+    def CanJoinLobby(self, lobby):
+        """Same rule as the app"""
+        return lobby_service.CanJoinLobby(self.current_user, lobby)
+
+    def IsMemberOfLobby(self, lobby):
+        """Same rule as the app"""
+        return lobby_service.IsMemberOfLobby(self.current_user, lobby)
+
+    def JoinRestrictionReason(self, lobby):
+        """Same rule as the app"""
+        return lobby_service.JoinRestrictionReason(self.current_user, lobby)
+
+    def JoinLobby(self, lobby_id):
+        """Buttons do nothing in the benchmark"""
+
+    LeaveLobby = DeleteLobby = JoinLobby
+
+
+def CountWidgets(widget):
+    """Every widget below widget, recursively"""
+    return sum(1 + CountWidgets(child) for child in widget.winfo_children())
+
+
+def Main(argv):
+    sizes = [int(arg) for arg in argv] or [100, 1000, 10000, 100000]
+    root = tk.Tk()
+    root.geometry("800x600")
+    lobby_list = VirtualLobbyList(root, FakeApp())
+    lobby_list.frame.pack(expand=True, fill='both')
+    root.update()
+
+    for count in sizes:
+        lobbies = MakeLobbies(count)
+        versions = dict.fromkeys(lobbies, count)
+        start = time.perf_counter()
+        lobby_list.ShowPage(list(lobbies.items()), versions)
+        root.update()
+        refresh_time = time.perf_counter() - start
+
+        # One lobby changes, the way a join or leave looks to the list
+        versions = dict(versions)
+        versions[next(iter(lobbies))] += 1
+        start = time.perf_counter()
+        patched = lobby_list.ShowPage(list(lobbies.items()), versions)
+        root.update()
+        patch_time = time.perf_counter() - start
+
+        # Scroll through the middle of the list a few pages at a time
+        start = time.perf_counter()
+        for fraction in range(1, 21):
+            lobby_list.canvas.yview_moveto(fraction / 40)
+            root.update()
+        scroll_time = (time.perf_counter() - start) / 20
+
+        print(f"{count:>7} lobbies | refresh {refresh_time * 1000:8.1f} ms "
+              f"| patch {patched} row {patch_time * 1000:6.1f} ms "
+              f"| scroll {scroll_time * 1000:6.1f} ms/step "
+              f"| {lobby_list.WidgetCount()} rows, {CountWidgets(root)} widgets")
+
+    root.destroy()
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
@@ -0,0 +1,77 @@
+"""Cost of one page of lobby search as lobbies grow, against filtering every lobby
+
+For every lobby count: builds the search & open slot indexes, then times one
+page (PAGE_SIZE lobbies) of a few typical searches, both the first page & one
+deep into the results through keyset cursors, next to a full scan that filters
+& sorts every lobby for the same page.
+
+Run from the repository root:
+    python -m benchmarks.lobby_search 10000 100000 1000000
+"""
+import sys
+import time
+from benchmarks.synthetic import MakeLobbies
+from src.lobby_index import LobbyQuery, LobbySearchIndex, Matches, NameKey, OpenSlotIndex, Search, PAGE_SIZE
+
+QUERIES = {
+    "everything": LobbyQuery(),
+    "name prefix": LobbyQuery(prefix="Lobby12"),
+    "rating 1500-2000": LobbyQuery(min_rating=1500, max_rating=2000),
+    "needs Tank <= 2500": LobbyQuery(role="Tank", max_rating=2500),
+    "leader": LobbyQuery(leader="leader4242"),
+}
+DEEP_PAGE = 20
+REPEATS = 20
+
+
+def Best(run, repeats=REPEATS):
+    """Fastest of repeats runs, in seconds"""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def FullScan(lobbies, query):
+    """The first page the way a search without indexes finds it: filter & sort every lobby"""
+    if query.prefix or query.leader is not None:
+        order = lambda lobby_id: (NameKey(lobbies[lobby_id]['name']), lobby_id)
+    else:
+        order = lambda lobby_id: (lobbies[lobby_id]['required_rating'], lobby_id)
+    return sorted((lobby_id for lobby_id, lobby in lobbies.items() if Matches(lobby, query)), key=order)[:PAGE_SIZE]
+
+
+def Main(argv):
+    counts = [int(arg) for arg in argv] or [10000, 100000]
+    for count in counts:
+        lobbies = MakeLobbies(count)
+        start = time.perf_counter()
+        search_index = LobbySearchIndex()
+        search_index.Build(lobbies)
+        slot_index = OpenSlotIndex()
+        slot_index.Build(lobbies)
+        print(f"{count} lobbies, indexes built in {time.perf_counter() - start:.2f}s")
+
+        for name, query in QUERIES.items():
+            first, cursor = Search(search_index, slot_index, lobbies, query)
+            assert first == FullScan(lobbies, query), name
+            # Walk to a deep page, then time fetching it again from its cursor
+            deep_cursor = None
+            for _ in range(DEEP_PAGE - 1):
+                if cursor is None:
+                    break
+                deep_cursor = cursor
+                _, cursor = Search(search_index, slot_index, lobbies, query, deep_cursor)
+
+            first_time = Best(lambda: Search(search_index, slot_index, lobbies, query))
+            deep = (f"page {DEEP_PAGE} {Best(lambda: Search(search_index, slot_index, lobbies, query, deep_cursor)) * 1e6:>7.1f} us"
+                    if deep_cursor is not None else f"{'(fewer pages)':>18}")
+            scan_time = Best(lambda: FullScan(lobbies, query), repeats=3)
+            print(f"  {name:<20} {len(first):>3} on page 1: {first_time * 1e6:>7.1f} us, {deep}, "
+                  f"full scan {scan_time * 1e3:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
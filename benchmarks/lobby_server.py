@@ -0,0 +1,127 @@
+"""Lobby server under many subscribed connections: join/leave latency & push fan-out
+
+Starts the server in its own process on a temporary data directory, connects
+CONNECTIONS subscribed clients, then times joins & leaves from one of them.
+
+Run from the repository root:
+    python -m benchmarks.lobby_server 2000 2000
+(2000 connections, 2000 timed join/leave requests)
+"""
+import asyncio
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+LOBBIES = 20
+
+
+async def Open(port):
+    """One protocol connection with a request helper"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=1 << 24)
+    return Client(reader, writer)
+
+
+class Client:
+    """Sends requests & reads their responses, counting the pushes that arrive in between"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 0
+        self.pushes = 0
+
+    async def Call(self, op, **fields):
+        self.next_id += 1
+        self.writer.write(json.dumps({"id": self.next_id, "op": op, **fields}).encode('utf-8') + b"\n")
+        while True:
+            message = json.loads(await self.reader.readline())
+            if "event" in message:
+                self.pushes += 1
+                continue
+            return message
+
+    async def Drain(self):
+        """Count pushes until the connection closes, reading what piled up every 50ms like the app's poll"""
+        while True:
+            # Client & server share the CPU here, waking every subscriber per push would time the client
+            await asyncio.sleep(0.05)
+            data = await self.reader.read(1 << 20)
+            if not data:
+                return
+            self.pushes += data.count(b"\n")
+
+
+async def Setup(port, index, role):
+    """Register, sign in & subscribe one client"""
+    client = await Open(port)
+    username = f"bench{index}"
+    await client.Call("register", username=username, password="12345678", email=f"{username}@gmail.com",
+                      role=role, rating=4000)
+    response = await client.Call("login", username=username, password="12345678")
+    assert response['ok'], response
+    await client.Call("list", subscribe=True)
+    return client
+
+
+async def Bench(port, connections, requests):
+    # Leaders create the lobbies the timed client joins & leaves
+    leaders = [await Setup(port, f"leader{i}", "DPS") for i in range(LOBBIES)]
+    for i, leader in enumerate(leaders):
+        response = await leader.Call("create", name=f"lobby{i}", required_rating=0)
+        assert response['ok'], response
+
+    start = time.perf_counter()
+    clients = []
+    for batch in range(0, connections, 200):
+        clients.extend(await asyncio.gather(*(Setup(port, i, "Tank")
+                                               for i in range(batch, min(batch + 200, connections)))))
+    setup_time = time.perf_counter() - start
+
+    drains = [asyncio.create_task(client.Drain()) for client in clients[1:] + leaders]
+    driver = clients[0]
+
+    latencies = []
+    for i in range(requests):
+        lobby_id = f"lobby{i // 2 % LOBBIES}"
+        op = "join" if i % 2 == 0 else "leave"
+        sent = time.perf_counter()
+        response = await driver.Call(op, lobby_id=lobby_id)
+        latencies.append(time.perf_counter() - sent)
+        assert response['ok'], response
+
+    # Give the last pushes a moment to arrive everywhere
+    await asyncio.sleep(0.5)
+    for client in clients + leaders:
+        client.writer.close()
+    for task in drains:
+        task.cancel()
+
+    latencies.sort()
+    pushes = sum(client.pushes for client in clients + leaders)
+    print(f"{connections} connections set up in {setup_time:.2f}s")
+    print(f"{requests} join/leave requests: median {latencies[len(latencies) // 2] * 1e6:.0f} us, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f} us, "
+          f"{requests / sum(latencies):.0f} req/s")
+    print(f"{pushes} pushes delivered ({pushes / requests:.0f} per request)")
+
+
+def Main(argv):
+    connections = int(argv[0]) if argv else 2000
+    requests = int(argv[1]) if len(argv) > 1 else 2000
+    data_dir = tempfile.mkdtemp()
+    server = subprocess.Popen([sys.executable, "-m", "src.lobby_server", "--port", "0",
+                               "--storage", f"journal:{data_dir}"], stdout=subprocess.PIPE, text=True)
+    try:
+        port = int(server.stdout.readline().split()[4].rsplit(":", 1)[1])
+        asyncio.run(Bench(port, connections, requests))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
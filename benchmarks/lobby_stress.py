@@ -0,0 +1,122 @@
+"""Many processes joining & leaving the same few lobbies, checks no update was lost
+
+Run from the repository root:
+    python -m benchmarks.lobby_stress sqlite
+    python -m benchmarks.lobby_stress journal    # shows what shared JSON files lose
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from src.backends import OpenStorage
+from src.lobby_service import LobbyService, LobbyMembers
+
+PROCESSES = 8
+PLAYERS_PER_PROCESS = 10
+OPS_PER_PROCESS = 300
+LOBBIES = 6
+
+
+def Spec(backend, data_dir):
+    """Storage spec for a backend living in data_dir"""
+    if backend == "sqlite":
+        return f"sqlite:{os.path.join(data_dir, 'wow.db')}"
+    return f"{backend}:{data_dir}"
+
+
+def Seed(spec):
+    """A handful of lobbies, every leader is a DPS so Tank & Healer stay open"""
+    storage = OpenStorage(spec)
+    storage.InitDataFiles()
+    service = LobbyService(storage)
+    leaders = [{"username": f"leader{i}", "role": "DPS", "rating": 4000} for i in range(LOBBIES)]
+    service.CreateMany([(leader, f"lobby{i}", 0) for i, leader in enumerate(leaders)])
+    storage.Close()
+
+
+def Worker(spec, worker, seed):
+    """Random joins & leaves, returns every successful action in the order it happened"""
+    rng = random.Random(seed)
+    storage = OpenStorage(spec)
+    service = LobbyService(storage)
+    players = [{"username": f"w{worker}p{i}", "role": rng.choice(("Tank", "Healer", "DPS")), "rating": 4000}
+               for i in range(PLAYERS_PER_PROCESS)]
+    current = {}
+    log = []
+
+    for _ in range(OPS_PER_PROCESS):
+        player = rng.choice(players)
+        username = player['username']
+        if username in current:
+            result = service.LeaveLobby(player, current[username])
+            if result.ok:
+                log.append((username, "leave", result.lobby_id))
+                del current[username]
+        else:
+            result = service.JoinLobby(player, f"lobby{rng.randrange(LOBBIES)}")
+            if result.ok:
+                log.append((username, "join", result.lobby_id))
+                current[username] = result.lobby_id
+
+    storage.Close()
+    return log
+
+
+def Check(spec, logs):
+    """Compare the final lobbies with what every player was told, returns the problems found"""
+    expected = {}
+    for log in logs:
+        for username, op, lobby_id in log:
+            if op == "join":
+                expected[username] = lobby_id
+            else:
+                expected.pop(username, None)
+
+    lobbies = OpenStorage(spec).LoadLobbies()
+    actual = {}
+    problems = []
+    for lobby_id, lobby in lobbies.items():
+        for username in LobbyMembers(lobby):
+            if username.startswith("leader"):
+                continue
+            if username in actual:
+                problems.append(f"{username} sits in {actual[username]} and {lobby_id}")
+            actual[username] = lobby_id
+
+    for username in sorted(set(expected) | set(actual)):
+        if expected.get(username) != actual.get(username):
+            problems.append(f"{username}: told {expected.get(username)}, stored {actual.get(username)}")
+    return problems
+
+
+def Main(argv):
+    backend = argv[0] if argv else "sqlite"
+    data_dir = tempfile.mkdtemp()
+    try:
+        spec = Spec(backend, data_dir)
+        Seed(spec)
+
+        start = time.perf_counter()
+        with multiprocessing.Pool(PROCESSES) as pool:
+            logs = pool.starmap(Worker, [(spec, worker, worker) for worker in range(PROCESSES)])
+        elapsed = time.perf_counter() - start
+
+        actions = sum(len(log) for log in logs)
+        problems = Check(spec, logs)
+        print(f"{backend}: {PROCESSES} processes, {actions} successful joins/leaves in {elapsed:.2f}s")
+        if problems:
+            print(f"{len(problems)} lost updates, e.g.:")
+            for problem in problems[:10]:
+                print(f"  {problem}")
+            return 1
+        print("no lost updates")
+        return 0
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(Main(sys.argv[1:]))
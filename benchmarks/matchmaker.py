@@ -0,0 +1,84 @@
+"""Batch auto-fill: seat waiting players into open slots with NumPy, checked against a plain Python greedy
+
+Run from the repository root:
+    python -m benchmarks.matchmaker 100000 50000
+"""
+import sys
+import time
+from bisect import bisect_right
+from benchmarks.synthetic import MakeUsers, MakeLobbies
+from src.lobby_index import OpenSlotIndex, ROLES
+from src.lobby_service import CanJoinLobby, TakeSlot
+from src.matchmaker import Plan, WaitingPlayers
+
+
+def ReferencePlan(players, lobbies):
+    """The same greedy one player at a time: strongest first, most demanding free slot they qualify for"""
+    joins = []
+    for role in ROLES:
+        slots = sorted((lobby['required_rating'], lobby_id)
+                       for lobby_id, lobby in lobbies.items()
+                       for _ in range(lobby['members']['DPS'].count(None) if role == "DPS"
+                                      else lobby['members'][role] is None))
+        waiting = sorted(((user['rating'], username) for username, user in players.items()
+                          if user['role'] == role), key=lambda entry: -entry[0])
+        for rating, username in waiting:
+            i = bisect_right(slots, (rating, chr(0x10FFFF)))
+            if i:
+                joins.append((username, slots.pop(i - 1)[1]))
+    return joins
+
+
+def Check(players, lobbies, joins):
+    """Apply the joins to a copy of the lobbies, every one must be legal & every player seated once"""
+    lobbies = {lobby_id: {**lobby, "members": {**lobby['members'], "DPS": list(lobby['members']['DPS'])}}
+               for lobby_id, lobby in lobbies.items()}
+    seen = set()
+    for username, lobby_id in joins:
+        user = players[username]
+        if username in seen:
+            raise AssertionError(f"{username} seated twice")
+        if not CanJoinLobby(user, lobbies[lobby_id]):
+            raise AssertionError(f"{username} can't join {lobby_id}")
+        seen.add(username)
+        TakeSlot(lobbies[lobby_id], username, user['role'])
+
+
+def Gap(players, lobbies, joins):
+    """Mean rating points a seated player sits above the lobby requirement"""
+    if not joins:
+        return 0.0
+    return sum(players[u]['rating'] - lobbies[l]['required_rating'] for u, l in joins) / len(joins)
+
+
+def Main(argv):
+    player_count = int(argv[0]) if argv else 100000
+    lobby_count = int(argv[1]) if len(argv) > 1 else 50000
+
+    users = MakeUsers(player_count, seed=1)
+    lobbies = MakeLobbies(lobby_count, seed=2)
+    players = WaitingPlayers(users, lobbies)
+    index = OpenSlotIndex()
+    index.Build(lobbies)
+    open_slots = sum(len(lobby['members']['DPS']) - sum(map(bool, lobby['members']['DPS']))
+                     + (lobby['members']['Tank'] is None) + (lobby['members']['Healer'] is None)
+                     for lobby in lobbies.values())
+
+    start = time.perf_counter()
+    joins = Plan(players, lobbies, index)
+    plan_time = time.perf_counter() - start
+    Check(players, lobbies, joins)
+
+    start = time.perf_counter()
+    expected = ReferencePlan(players, lobbies)
+    reference_time = time.perf_counter() - start
+    if sorted(joins) != sorted(expected):
+        raise AssertionError("NumPy plan disagrees with the reference greedy")
+
+    print(f"{len(players)} players, {lobby_count} lobbies, {open_slots} open slots")
+    print(f"numpy plan     {plan_time * 1000:9.1f} ms | {len(joins)} seated | mean gap {Gap(players, lobbies, joins):.0f}")
+    print(f"python greedy  {reference_time * 1000:9.1f} ms | same assignment")
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
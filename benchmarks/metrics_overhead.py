@@ -0,0 +1,92 @@
+"""What the timing instrumentation costs, switched off & on
+
+Times an empty function bare and wrapped in Timed, then join/leave round trips
+through LobbyService on the journal backend with metrics off & on, and prints
+what was recorded as served over HTTP.
+
+Run from the repository root:
+    python -m benchmarks.metrics_overhead 1000000 20000
+"""
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+from src.journal import JournaledStorage
+from src.lobby_service import LobbyService
+from src.metrics import METRICS, Timed
+
+
+def Nothing():
+    pass
+
+
+TimedNothing = Timed(Nothing)
+
+
+def PerCall(fn, calls):
+    """Nanoseconds per call of fn, best of 3"""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1e9
+
+
+def JoinLeave(service, rounds):
+    """Join & leave one lobby rounds times, returns round trips per second"""
+    user = {"username": "bench", "role": "DPS", "rating": 4000}
+    start = time.perf_counter()
+    for _ in range(rounds):
+        assert service.JoinLobby(user, "bench").ok
+        assert service.LeaveLobby(user, "bench").ok
+    return rounds / (time.perf_counter() - start)
+
+
+def Main(argv):
+    calls = int(argv[0]) if argv else 1000000
+    rounds = int(argv[1]) if len(argv) > 1 else 20000
+
+    bare = PerCall(Nothing, calls)
+    METRICS.SetEnabled(False)
+    off = PerCall(TimedNothing, calls)
+    METRICS.SetEnabled(True)
+    on = PerCall(TimedNothing, calls)
+    METRICS.Reset()
+    print(f"empty call: bare {bare:.0f} ns, Timed off {off:.0f} ns (+{off - bare:.0f}), "
+          f"Timed on {on:.0f} ns (+{on - bare:.0f})")
+
+    data_dir = tempfile.mkdtemp()
+    try:
+        storage = JournaledStorage(data_dir, fsync=False)
+        storage.InitDataFiles()
+        service = LobbyService(storage)
+        service.CreateLobby({"username": "leader", "role": "Tank", "rating": 4000}, "bench", 0)
+        results = {}
+        # Alternate so neither side gets a warmer cache
+        for enabled in (False, True) * 3:
+            METRICS.SetEnabled(enabled)
+            results.setdefault(enabled, []).append(JoinLeave(service, rounds))
+        off, on = max(results[False]), max(results[True])
+        print(f"join+leave: metrics off {off:,.0f}/s, on {on:,.0f}/s ({(off - on) / off:+.1%} slower)")
+
+        server = METRICS.Serve(0)
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        text = urllib.request.urlopen(url).read().decode('utf-8')
+        print(f"{url}: {len(text.splitlines())} lines")
+        histograms, counters = METRICS.Summary()
+        for name, labels, count, p50, p95, p99, total in histograms:
+            print(f"  {labels.get('fn', name):<32} {count:>7} calls, p50 {p50 * 1e6:>7.1f} us, "
+                  f"p95 {p95 * 1e6:>7.1f} us, p99 {p99 * 1e6:>7.1f} us")
+        for name, labels, value in counters:
+            print(f"  {name:<32} {value:>7}")
+        METRICS.Close()
+        service.Close()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
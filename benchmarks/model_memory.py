@@ -0,0 +1,79 @@
+"""Memory held by loaded lobbies: lobbies.json parsed into dicts vs the LobbyTable storage now loads
+
+Writes one lobbies.json, then loads it both ways & reports what tracemalloc
+sees still allocated afterwards, plus a lossless round trip check. Lobby
+members are drawn from USERS registered usernames, like real players would be.
+
+Run from the repository root:
+    python -m benchmarks.model_memory 1000000 100000
+(1M lobbies, 100k users)
+"""
+import gc
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.synthetic import MakeLobbies
+from src.storage import JsonStorage
+
+
+def Held(load):
+    """(result, bytes it keeps allocated, seconds) for load()"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = load()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held, elapsed
+
+
+def Seat(lobbies, usernames, seed=0):
+    """Replace the synthetic member names with random registered usernames"""
+    rng = random.Random(seed)
+    for lobby in lobbies.values():
+        members = lobby['members']
+        players = rng.sample(usernames, 5)
+        for role in ("Tank", "Healer"):
+            if members[role] is not None:
+                members[role] = players.pop()
+        members['DPS'] = [players.pop() if username is not None else None for username in members['DPS']]
+        lobby['leader'] = next(username for username in (members['Tank'], members['Healer'], *members['DPS'])
+                               if username is not None)
+    return lobbies
+
+
+def Main(argv):
+    lobby_count = int(argv[0]) if argv else 100000
+    user_count = int(argv[1]) if len(argv) > 1 else lobby_count // 10
+    data_dir = tempfile.mkdtemp()
+    try:
+        storage = JsonStorage(data_dir, fsync=False)
+        storage.SaveLobbies(Seat(MakeLobbies(lobby_count), [f"player{i}" for i in range(user_count)]))
+
+        def ParseDicts():
+            with open(storage.lobbies_path, 'rb') as f:
+                return json.loads(f.read())
+
+        dicts, dict_bytes, dict_time = Held(ParseDicts)
+        table, table_bytes, table_time = Held(lambda: storage.LoadLobbies())
+        assert dict(table.items()) == dicts, "lobbies did not round trip"
+        print(f"{lobby_count} lobbies, {user_count} users: dicts {dict_bytes / lobby_count:.0f} B each "
+              f"in {dict_time:.2f}s, LobbyTable {table_bytes / lobby_count:.0f} B each in {table_time:.2f}s "
+              f"({dict_bytes / table_bytes:.1f}x smaller)")
+        del dicts
+
+        # What a service holds on top: its writable copy of the table, sharing the usernames
+        _, copy_bytes, copy_time = Held(lambda: storage.LoadLobbies().Copy())
+        print(f"service copy: {copy_bytes / lobby_count:.0f} B each in {copy_time:.2f}s")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
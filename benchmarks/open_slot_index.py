@@ -0,0 +1,80 @@
+"""Open slot index vs the CanJoinLobby linear scan
+
+Run from the repository root:
+    python -m benchmarks.open_slot_index 10000 100000 1000000
+"""
+import random
+import sys
+import time
+from benchmarks.synthetic import MakeLobbies, RandomRole
+from src.lobby_index import OpenSlotIndex
+from src.lobby_service import CanJoinLobby, TakeSlot, FreeSlot
+
+QUERIES = 50
+UPDATES = 10000
+
+
+def LinearScan(lobbies, user):
+    """What RefreshLobbies & the AI suggestions did before the index"""
+    return [lobby_id for lobby_id, lobby in lobbies.items() if CanJoinLobby(user, lobby)]
+
+
+def Time(fn, *args):
+    """Run fn once, return (seconds, result)"""
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def Bench(count, rng):
+    """Benchmark one lobby count and print a row"""
+    lobbies = MakeLobbies(count, seed=count)
+    index = OpenSlotIndex()
+    build_time, _ = Time(index.Build, lobbies)
+
+    users = [{"username": f"q{i}", "role": RandomRole(rng), "rating": rng.randint(0, 4000)}
+             for i in range(QUERIES)]
+
+    scan_total = index_total = 0.0
+    for user in users:
+        scan_time, expected = Time(LinearScan, lobbies, user)
+        index_time, found = Time(index.Query, user['role'], user['rating'])
+        if sorted(expected) != sorted(found):
+            raise AssertionError(f"index disagrees with scan for {user}")
+        scan_total += scan_time
+        index_total += index_time
+
+    # Slots filling up & freeing again must keep the index correct
+    lobby_ids = list(lobbies)
+    update_start = time.perf_counter()
+    for i in range(UPDATES):
+        lobby_id = rng.choice(lobby_ids)
+        lobby = lobbies[lobby_id]
+        username = f"churn{i}"
+        role = RandomRole(rng)
+        if TakeSlot(lobby, username, role):
+            index.Update(lobby_id, lobby)
+            if rng.random() < 0.5:
+                FreeSlot(lobby, username)
+                index.Update(lobby_id, lobby)
+    update_time = time.perf_counter() - update_start
+
+    user = users[0]
+    if sorted(LinearScan(lobbies, user)) != sorted(index.Query(user['role'], user['rating'])):
+        raise AssertionError("index drifted after updates")
+
+    print(f"{count:>9} lobbies | build {build_time * 1000:9.1f} ms "
+          f"| scan {scan_total / QUERIES * 1000:9.3f} ms/query "
+          f"| index {index_total / QUERIES * 1000:9.3f} ms/query "
+          f"| update {update_time / UPDATES * 1e6:7.2f} us/op")
+
+
+def Main(argv):
+    sizes = [int(arg) for arg in argv] or [10000, 100000, 1000000]
+    rng = random.Random(0)
+    for count in sizes:
+        Bench(count, rng)
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
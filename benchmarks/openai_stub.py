@@ -0,0 +1,122 @@
+"""Local stand-in for the OpenAI chat completions API, streams a canned answer word by word
+
+Run from the repository root, then point the app at it:
+    python -m benchmarks.openai_stub --port 8765 --delay 0.05
+    WOW_AI_BASE_URL=http://127.0.0.1:8765/v1 python main.py
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def Answer(prompt):
+    """Recommend the first lobby listed in the prompt"""
+    match = re.search(r"^- (\S+) \(Leader", prompt, re.MULTILINE)
+    lobby = match.group(1) if match else "none"
+    return (f"Recommended: {lobby}\n"
+            f"Reason: {lobby} is the first lobby in the list and this stub server does not think very hard.")
+
+
+def Chunk(completion_id, content=None, finish_reason=None):
+    """One chat.completion.chunk object"""
+    delta = {"content": content} if content is not None else {}
+    return {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "stub",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers POST /v1/chat/completions, streaming or not"""
+
+    delay = 0.05
+    requests = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        with StubHandler.lock:
+            StubHandler.requests += 1
+            completion_id = f"chatcmpl-stub-{StubHandler.requests}"
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+        answer = Answer(prompt)
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            try:
+                for word in re.findall(r"\S+\s*", answer):
+                    time.sleep(self.delay)
+                    self.SendEvent(Chunk(completion_id, word))
+                self.SendEvent(Chunk(completion_id, finish_reason="stop"))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # The app cancelled the request & closed the stream
+                pass
+            return
+
+        time.sleep(self.delay)
+        data = json.dumps({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": answer}}],
+            "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(answer.split()),
+                      "total_tokens": len(prompt.split()) + len(answer.split())}
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def SendEvent(self, data):
+        """Write one server-sent event"""
+        self.wfile.write(b"data: " + json.dumps(data).encode('utf-8') + b"\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def Serve(port=8765, delay=0.05):
+    """Start the stub on a background thread, returns the server (port 0 picks a free one)"""
+    StubHandler.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def Main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds between streamed words")
+    args = parser.parse_args()
+
+    server = Serve(args.port, args.delay)
+    print(f"OpenAI stub listening on http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    Main()
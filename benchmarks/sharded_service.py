@@ -0,0 +1,71 @@
+"""Join/leave throughput of the sharded lobby engine as the worker count grows
+
+Every shard count gets a fresh data directory with LOBBIES lobbies. CLIENTS
+threads then join & leave BATCH players at a time for a few seconds. Scaling
+needs as many free cores as shards, on fewer the numbers stay flat.
+
+Run from the repository root:
+    python -m benchmarks.sharded_service 5 1 2 4 8
+(5 seconds per run, then the shard counts)
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from src.sharded_service import ShardedLobbyService
+
+LOBBIES = 2000
+CLIENTS = 8
+BATCH = 32
+
+
+def Run(shards, seconds):
+    """Join/leave operations per second with `shards` workers"""
+    data_dir = tempfile.mkdtemp()
+    service = ShardedLobbyService(f"journal:{data_dir}", shards)
+    try:
+        leaders = [{"username": f"tank{i}", "role": "Tank", "rating": 4000} for i in range(LOBBIES)]
+        service.CreateMany([(leader, f"lobby{i}", 0) for i, leader in enumerate(leaders)])
+
+        counts = [0] * CLIENTS
+        stop = threading.Event()
+
+        def Client(index):
+            rng = random.Random(index)
+            users = [{"username": f"dps{index}_{i}", "role": "DPS", "rating": 4000} for i in range(BATCH)]
+            while not stop.is_set():
+                joins = [(user, f"lobby{rng.randrange(LOBBIES)}") for user in users]
+                results = service.JoinMany(joins)
+                service.LeaveMany([request for request, result in zip(joins, results) if result.ok])
+                counts[index] += 2 * BATCH
+
+        threads = [threading.Thread(target=Client, args=(i,)) for i in range(CLIENTS)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return sum(counts) / (time.perf_counter() - start)
+    finally:
+        service.Close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def Main(argv):
+    seconds = float(argv[0]) if argv else 5
+    shard_counts = [int(arg) for arg in argv[1:]] or [1, 2, 4]
+    print(f"{os.cpu_count()} CPUs, {LOBBIES} lobbies, {CLIENTS} clients joining & leaving {BATCH} at a time")
+    baseline = None
+    for shards in shard_counts:
+        rate = Run(shards, seconds)
+        baseline = baseline or rate
+        print(f"{shards:>3} shards: {rate:>9.0f} ops/s ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
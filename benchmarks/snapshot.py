@@ -0,0 +1,98 @@
+"""Cold start & lookups: parsing the JSON files vs mapping the binary snapshot
+
+Writes USERS users & LOBBIES lobbies as JSON plus a snapshot into a temporary
+directory, then times, each in a fresh process so nothing is already parsed:
+opening & finding one user, and LOOKUPS random user/lobby lookups.
+
+Run from the repository root:
+    python -m benchmarks.snapshot 1000000 200000
+(1M users, 200k lobbies)
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.synthetic import MakeLobbies, MakeUsers
+from src.snapshot import OpenSnapshot, WriteSnapshot
+from src.storage import JsonStorage
+
+LOOKUPS = 100000
+
+
+def PrivateRss():
+    """Resident memory of this process that no other process shares, in MiB (Linux only)"""
+    # Mapped snapshot pages are file-backed & shared, only the anonymous part is this process's own
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def Probe(mode, data_dir, user_count, lobby_count):
+    """Child process: open one way, then look things up, prints a JSON line of timings"""
+    rng = random.Random(1)
+    usernames = [f"player{rng.randrange(user_count)}" for _ in range(LOOKUPS)]
+    lobby_ids = [f"lobby{rng.randrange(lobby_count)}" for _ in range(LOOKUPS)]
+
+    start = time.perf_counter()
+    storage = JsonStorage(data_dir)
+    if mode == "json":
+        users = storage.LoadUsers()
+        lobbies = storage.LoadLobbies()
+        find_user, find_lobby = users.get, lobbies.get
+    else:
+        snapshot = OpenSnapshot(storage)
+        find_user, find_lobby = snapshot.User, snapshot.Lobby
+    assert find_user(usernames[0]) is not None
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for username, lobby_id in zip(usernames, lobby_ids):
+        find_user(username)
+        find_lobby(lobby_id)
+    lookups = time.perf_counter() - start
+    print(json.dumps({"first": first, "lookup": lookups / (2 * LOOKUPS), "rss": PrivateRss()}))
+
+
+def Run(mode, data_dir, user_count, lobby_count):
+    """Probe in a fresh interpreter, returns its timings"""
+    output = subprocess.run([sys.executable, "-m", "benchmarks.snapshot", "--probe", mode, data_dir,
+                             str(user_count), str(lobby_count)], capture_output=True, text=True, check=True)
+    return json.loads(output.stdout)
+
+
+def Main(argv):
+    if argv[:1] == ["--probe"]:
+        Probe(argv[1], argv[2], int(argv[3]), int(argv[4]))
+        return
+
+    user_count = int(argv[0]) if argv else 1000000
+    lobby_count = int(argv[1]) if len(argv) > 1 else user_count // 5
+    data_dir = tempfile.mkdtemp()
+    try:
+        storage = JsonStorage(data_dir, fsync=False)
+        storage.InitDataFiles()
+        storage.SaveUsers(MakeUsers(user_count))
+        storage.SaveLobbies(MakeLobbies(lobby_count))
+        start = time.perf_counter()
+        path = WriteSnapshot(storage)
+        write_time = time.perf_counter() - start
+
+        json_size = os.path.getsize(storage.users_path) + os.path.getsize(storage.lobbies_path)
+        print(f"{user_count} users, {lobby_count} lobbies: JSON {json_size / 2**20:.0f} MiB, "
+              f"snapshot {os.path.getsize(path) / 2**20:.0f} MiB written in {write_time:.1f}s")
+        for mode in ("json", "snapshot"):
+            result = Run(mode, data_dir, user_count, lobby_count)
+            print(f"{mode:>9}: first user in {result['first'] * 1e3:>8.1f} ms, "
+                  f"lookups {result['lookup'] * 1e6:>5.1f} us each, private RSS {result['rss']:>6.0f} MiB")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
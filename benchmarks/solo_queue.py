@@ -0,0 +1,77 @@
+"""Solo queue simulation: players arrive every tick, prints queue-time percentiles & tick cost
+
+Run from the repository root:
+    python -m benchmarks.solo_queue 600 50
+(600 simulated one-second ticks, 50 arrivals per tick)
+"""
+import random
+import shutil
+import sys
+import tempfile
+import time
+from benchmarks.synthetic import RandomRole
+from src.backends import OpenStorage
+from src.lobby_index import ROLES
+from src.lobby_service import LobbyService, LobbyMembers
+from src.solo_queue import SoloQueue
+
+
+class FakeClock:
+    """Simulated time, one tick is one second"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def Main(argv):
+    ticks = int(argv[0]) if argv else 600
+    arrivals = int(argv[1]) if len(argv) > 1 else 50
+    rng = random.Random(0)
+    data_dir = tempfile.mkdtemp()
+    try:
+        storage = OpenStorage(f"journal:{data_dir}")
+        storage.InitDataFiles()
+        clock = FakeClock()
+        solo = SoloQueue(LobbyService(storage), clock=clock)
+
+        ratings = {}
+        formed = 0
+        tick_time = 0.0
+        queued_total = 0
+        for tick in range(ticks):
+            for i in range(arrivals):
+                username = f"t{tick}p{i}"
+                ratings[username] = int(min(max(rng.gauss(2000, 600), 0), 4000))
+                solo.Enqueue({"username": username, "role": RandomRole(rng), "rating": ratings[username]})
+            queued_total += len(solo.waiting)
+            start = time.perf_counter()
+            formed += sum(result.ok for result in solo.Tick())
+            tick_time += time.perf_counter() - start
+            clock.now += 1
+
+        lobbies = storage.LoadLobbies()
+        spread = []
+        for lobby in lobbies.values():
+            members = [ratings[username] for username in LobbyMembers(lobby)]
+            spread.append(max(members) - min(members))
+        storage.Close()
+
+        print(f"{ticks} ticks, {arrivals} arrivals/tick: {formed} lobbies formed, "
+              f"{sum(solo.QueuedCount(role) for role in ROLES)} players still queued")
+        print(f"tick cost {tick_time / ticks * 1000:.2f} ms/tick, "
+              f"{tick_time / max(queued_total, 1) * 1e6:.2f} us per queued player")
+        if spread:
+            spread.sort()
+            print(f"rating spread in formed lobbies: median {spread[len(spread) // 2]}, max {spread[-1]}")
+        for role, points in solo.Percentiles().items():
+            print(f"{role:>6} queue time " + " ".join(
+                f"p{point}={'-' if seconds is None else f'{seconds:.0f}s'}" for point, seconds in points.items()))
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
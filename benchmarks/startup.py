@@ -0,0 +1,131 @@
+"""Cold start: what importing the app costs & how long until its first frames are drawn
+
+Import times come from `python -X importtime -c "import src.app"` in a fresh
+interpreter, with the heaviest modules the app pulls in directly. The frame
+timings (needs a display) start a fresh process against LOBBIES lobbies & time
+the login screen, the main window after signing in & the lobbies tab when it
+is first opened.
+
+Run from the repository root:
+    python -m benchmarks.startup 100000
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Imported only once the AI is used, none of these may show up at launch
+LAZY_MODULES = ("openai", "httpx", "pydantic")
+TOP_MODULES = 8
+
+
+def ImportTimes(module):
+    """(cumulative microseconds of module, [(microseconds, name)] of what it imports directly, lazy ones loaded)"""
+    code = (f"import {module}; import sys, json; "
+            f"print(json.dumps([name for name in {LAZY_MODULES!r} if name in sys.modules]))")
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, check=True)
+    total = 0
+    children = []
+    # A module's line comes after the lines of everything it imported
+    pending = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            pending.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                total = int(cumulative)
+                children = pending
+            pending = []
+    return total, sorted(children, reverse=True), json.loads(output.stdout)
+
+
+def Probe(data_dir):
+    """Child process: start the app, prints a JSON line of milliseconds since the probe started"""
+    started = time.perf_counter()
+    os.environ["WOW_STORAGE"] = f"journal:{data_dir}"
+    import src.app as App
+    imported = time.perf_counter()
+
+    app = App.WorldOfWarcraft()
+    app.window.update()
+    login = time.perf_counter()
+
+    app.current_user = app.accounts.Login("bench", "12345678")[1]
+    app.ShowMainApp()
+    app.window.update()
+    main = time.perf_counter()
+
+    app.notebook.select(app.lobbies_frame)
+    app.window.update()
+    lobbies = time.perf_counter()
+
+    print(json.dumps({"import": (imported - started) * 1e3, "login": (login - started) * 1e3,
+                      "main": (main - login) * 1e3, "lobbies": (lobbies - main) * 1e3,
+                      "lazy": [name for name in LAZY_MODULES if name in sys.modules]}))
+    app.window.destroy()
+    if app.lobby_expiry is not None:
+        app.lobby_expiry.Stop()
+    app.lobby_service.Close()
+
+
+def Frames(lobby_count):
+    """Frame timings of a fresh app process, None without a display"""
+    from benchmarks.synthetic import MakeLobbies
+    from src.journal import JournaledStorage
+    from src.accounts import AccountService
+
+    data_dir = tempfile.mkdtemp()
+    try:
+        storage = JournaledStorage(data_dir, fsync=False)
+        storage.InitDataFiles()
+        storage.SaveLobbies(MakeLobbies(lobby_count))
+        AccountService(storage).Register("bench", "12345678", "bench@gmail.com", "DPS", 2500)
+        storage.Close()
+
+        output = subprocess.run([sys.executable, "-m", "benchmarks.startup", "--probe", data_dir],
+                                capture_output=True, text=True)
+        if output.returncode != 0:
+            if "TclError" in output.stderr:
+                return None
+            raise RuntimeError(output.stderr)
+        return json.loads(output.stdout)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def Main(argv):
+    if argv[:1] == ["--probe"]:
+        Probe(argv[1])
+        return
+
+    lobby_count = int(argv[0]) if argv else 100000
+    total, children, lazy = ImportTimes("src.app")
+    print(f"import src.app: {total / 1e3:.1f} ms, lazy modules loaded: {', '.join(lazy) or 'none'}")
+    for cumulative, name in children[:TOP_MODULES]:
+        print(f"  {name:<24} {cumulative / 1e3:>6.1f} ms")
+    try:
+        openai_total, _, _ = ImportTimes("openai")
+        print(f"import openai (paid on the first AI suggestion instead): {openai_total / 1e3:.1f} ms")
+    except subprocess.CalledProcessError:
+        print("import openai: not installed here")
+
+    frames = Frames(lobby_count)
+    if frames is None:
+        print("frame timings: skipped, no display")
+        return
+    print(f"{lobby_count} lobbies: login screen {frames['login']:.0f} ms after start "
+          f"(import {frames['import']:.0f} ms), main window {frames['main']:.0f} ms after sign in, "
+          f"lobbies tab {frames['lobbies']:.0f} ms on first open, "
+          f"lazy modules loaded: {', '.join(frames['lazy']) or 'none'}")
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
@@ -0,0 +1,55 @@
+"""The load generator's standard scenarios, saved as JSON to compare every change against a baseline
+
+Runs every mix on the journal & SQLite backends with the same seed, prints the
+results & writes them to benchmarks/results/<time>-<commit>.json (or --out).
+
+Run from the repository root, once for a baseline & again after a change:
+    python -m benchmarks.suite --out baseline.json
+    python -m benchmarks.suite --baseline baseline.json
+    python -m benchmarks.suite --quick    # a smaller run, seconds instead of minutes
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from benchmarks.loadgen import Compare, Describe, Environment, MIXES, RunScenario, SaveResults
+
+STORAGES = ("journal", "sqlite")
+FULL = {"users": 100000, "lobbies": 10000, "players": 64, "ops": 50000}
+QUICK = {"users": 5000, "lobbies": 1000, "players": 16, "ops": 5000}
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def Main(argv):
+    parser = argparse.ArgumentParser(description="Run the standard load scenarios")
+    parser.add_argument("--quick", action="store_true", help=f"{QUICK} instead of {FULL}")
+    parser.add_argument("--storage", action="append", choices=STORAGES, help="only these backends")
+    parser.add_argument("--mix", action="append", choices=tuple(MIXES), help="only these mixes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="where to save the results JSON")
+    parser.add_argument("--baseline", help="results JSON to compare with")
+    args = parser.parse_args(argv)
+
+    scale = QUICK if args.quick else FULL
+    scenarios = []
+    for storage in args.storage or STORAGES:
+        for mix in args.mix or MIXES:
+            result = RunScenario(storage, mix=mix, seed=args.seed, **scale)
+            print("\n".join(Describe(result)), flush=True)
+            scenarios.append(result)
+
+    out = args.out
+    if out is None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(RESULTS_DIR, f"{stamp}-{Environment()['commit'] or 'nocommit'}.json")
+    SaveResults(out, scenarios)
+    print(f"results saved to {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            print("\n".join(Compare(json.load(f), scenarios)))
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
@@ -0,0 +1,51 @@
+import random
+from datetime import datetime, timedelta
+from src.lobby_service import NewLobby, TakeSlot, DPS_SLOTS
+
+ROLE_WEIGHTS = (("Tank", 1), ("Healer", 1), ("DPS", 3))
+
+
+def RandomRole(rng):
+    """Pick a role with the 1 Tank / 1 Healer / 3 DPS mix of a full lobby"""
+    roles, weights = zip(*ROLE_WEIGHTS)
+    return rng.choices(roles, weights)[0]
+
+
+def MakeUsers(count, seed=0):
+    """Users shaped like data/users.json, keyed by username"""
+    rng = random.Random(seed)
+    start = datetime(2025, 6, 5)
+    users = {}
+    for i in range(count):
+        username = f"player{i}"
+        users[username] = {
+            "password": "12345678",
+            "email": f"{username}@gmail.com",
+            "role": RandomRole(rng),
+            "rating": rng.randint(0, 4000),
+            "created_at": (start + timedelta(seconds=i)).isoformat()
+        }
+    return users
+
+
+def MakeLobbies(count, seed=0):
+    """Lobbies shaped like data/lobbies.json with random ratings & partially filled slots"""
+    rng = random.Random(seed)
+    start = datetime(2025, 6, 5)
+    lobbies = {}
+    for i in range(count):
+        name = f"lobby{i}"
+        lobby = NewLobby(name, f"leader{i}", rng.randrange(0, 4001, 50),
+                         (start + timedelta(seconds=i)).isoformat())
+        TakeSlot(lobby, f"leader{i}", RandomRole(rng))
+
+        # Fill a random number of the remaining slots
+        for role in ("Tank", "Healer"):
+            if rng.random() < 0.5:
+                TakeSlot(lobby, f"{name}_{role.lower()}", role)
+        for slot in range(DPS_SLOTS):
+            if rng.random() < 0.5:
+                TakeSlot(lobby, f"{name}_dps{slot}", "DPS")
+
+        lobbies[name] = lobby
+    return lobbies
@@ -0,0 +1,95 @@
+"""Login & registration latency as accounts grow, plus streaming import/export memory
+
+For every user count: writes a users.json dump, imports it into SQLite & the
+journal backend with src.user_dumps (tracemalloc peak alongside), then times
+logins of random existing users & registrations of new ones through
+AccountService on a fresh storage, as a new app process would see them.
+
+Run from the repository root:
+    python -m benchmarks.user_store 10000 100000 1000000
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.synthetic import MakeUsers
+from src.accounts import AccountService
+from src.backends import CopyUsers, OpenStorage
+from src.user_dumps import DumpFile
+
+LOGINS = 1000
+# Registering into a JSON file rewrites it, a few are enough to see the trend
+REGISTRATIONS = {"sqlite": 200, "journal": 5}
+
+
+def Median(samples):
+    samples = sorted(samples)
+    return samples[len(samples) // 2]
+
+
+def Traced(run):
+    """(result, peak traced bytes) of run()"""
+    tracemalloc.start()
+    try:
+        result = run()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def Bench(kind, spec, dump, user_count):
+    """Import the dump into spec, then time logins & registrations there"""
+    storage = OpenStorage(spec)
+    storage.InitDataFiles()
+    start = time.perf_counter()
+    _, peak = Traced(lambda: CopyUsers(dump, storage))
+    import_time = time.perf_counter() - start
+    storage.Close()
+
+    storage = OpenStorage(spec)
+    accounts = AccountService(storage)
+    rng = random.Random(1)
+    logins = []
+    for _ in range(LOGINS):
+        username = f"player{rng.randrange(user_count)}"
+        started = time.perf_counter()
+        result, _ = accounts.Login(username, "12345678")
+        logins.append(time.perf_counter() - started)
+        assert result.ok, result
+    # The first login of a process pays for whatever loading the backend does
+    first_login = logins[0]
+
+    registrations = []
+    for i in range(REGISTRATIONS[kind]):
+        username = f"newcomer{i}"
+        started = time.perf_counter()
+        result = accounts.Register(username, "12345678", f"{username}@gmail.com", "DPS", 2000)
+        registrations.append(time.perf_counter() - started)
+        assert result.ok, result
+    storage.Close()
+
+    print(f"{user_count:>8} {kind:>8}: import {import_time:>6.1f}s peak {peak / 2**20:>5.1f} MiB, "
+          f"first login {first_login * 1e3:>8.1f} ms, login {Median(logins[1:]) * 1e6:>6.0f} us, "
+          f"register {Median(registrations) * 1e3:>8.2f} ms")
+
+
+def Main(argv):
+    user_counts = [int(arg) for arg in argv] or [10000, 100000]
+    for user_count in user_counts:
+        data_dir = tempfile.mkdtemp()
+        try:
+            dump_path = os.path.join(data_dir, "dump.json")
+            dump = DumpFile(dump_path)
+            dump.ReplaceUsers(MakeUsers(user_count).items())
+            print(f"{user_count:>8} users: dump {os.path.getsize(dump_path) / 2**20:.0f} MiB")
+            Bench("sqlite", f"sqlite:{os.path.join(data_dir, 'wow.db')}", dump, user_count)
+            Bench("journal", f"journal:{os.path.join(data_dir, 'journal')}", dump, user_count)
+        finally:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
@@ -0,0 +1,58 @@
+from datetime import datetime
+from src.lobby_index import ROLES
+from src.lobby_service import Result, MIN_RATING, MAX_RATING
+
+
+class AccountService:
+    """Registration & login rules without any UI, shared by the app and the lobby server"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def Register(self, username, password, email, role, rating):
+        """Register a new user, rating may still be the text typed into the form"""
+        username = str(username).strip()
+        password = str(password).strip()
+        email = str(email).strip()
+        rating = str(rating).strip()
+
+        if not all([username, password, email, rating]):
+            return Result(False, "All fields are required!", None)
+
+        if not email.endswith("@gmail.com"):
+            return Result(False, "Please enter a valid Gmail address!", None)
+
+        try:
+            rating = int(rating)
+        except ValueError:
+            return Result(False, "Rating must be a number!", None)
+        if rating < MIN_RATING or rating > MAX_RATING:
+            return Result(False, f"Rating must be between {MIN_RATING} and {MAX_RATING}!", None)
+
+        if role not in ROLES:
+            return Result(False, "Please pick a role!", None)
+
+        user = {
+            "password": password,
+            "email": email,
+            "role": role,
+            "rating": rating,
+            "created_at": datetime.now().isoformat()
+        }
+        # A keyed insert, backends like SQLite add it without touching the other accounts
+        if not self.storage.AddUser(username, user):
+            return Result(False, "Username already exists!", None)
+        return Result(True, "Registration successful! You can now sign in.", None)
+
+    def Login(self, username, password):
+        """Check credentials, returns (Result, user dict with its username) with user None on failure"""
+        username = str(username).strip()
+        password = str(password).strip()
+        if not username or not password:
+            return Result(False, "Username and password are required!", None), None
+
+        user = self.storage.GetUser(username)
+        if user is None or user["password"] != password:
+            return Result(False, "Invalid username or password!", None), None
+
+        return Result(True, "Logged in successfully!", None), {"username": username, **user}
@@ -0,0 +1,78 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+# Players within the same rating bucket get the same answer for the same lobbies
+RATING_BUCKET = 250
+
+
+def CacheKey(role, rating, lobbies_text):
+    """(role, rating bucket, hash of the lobby list), the list must not hold anything rating specific"""
+    digest = hashlib.sha256(lobbies_text.encode('utf-8')).hexdigest()
+    return (role, rating // RATING_BUCKET, digest)
+
+
+class AICache:
+    """LRU cache of finished AI answers that expire after ttl seconds"""
+
+    def __init__(self, capacity=128, ttl=300, clock=time.monotonic):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        # key -> (expires_at, text, seconds the upstream call took)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.saved_seconds = 0.0
+
+    def Get(self, key):
+        """Cached answer for key or None, a hit counts the upstream latency it saved"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[2]
+            return entry[1]
+
+    def Put(self, key, text, latency):
+        """Remember an answer, evicting the least recently used one when full"""
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, text, latency)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def Shared(self, latency):
+        """A request joined one already in flight instead of calling upstream"""
+        with self.lock:
+            self.shared += 1
+            self.saved_seconds += latency
+
+    def Stats(self):
+        """Hit rate & saved latency, shared in-flight requests count as hits"""
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses - self.shared,
+                "shared": self.shared,
+                "hit_rate": (self.hits + self.shared) / requests if requests else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self.entries)
+            }
@@ -0,0 +1,218 @@
+import itertools
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.metrics import Timed
+
+AI_MODEL = "gpt-4o"
+
+
+def OpenAIClient(base_url, api_key):
+    """An OpenAI client, openai is imported here since it & httpx/pydantic take longer to load than the rest of the app"""
+    from openai import OpenAI
+    return OpenAI(base_url=base_url, api_key=api_key)
+
+
+class LazyClient:
+    """Stands in for a client that gets built on first use, by whichever thread needs it first"""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.client = None
+        self.lock = threading.Lock()
+
+    def Get(self):
+        """The client, built now if nobody needed it yet"""
+        with self.lock:
+            if self.client is None:
+                self.client = self.factory()
+            return self.client
+
+    def __getattr__(self, name):
+        return getattr(self.Get(), name)
+
+
+class AIJob:
+    """One streaming AI request, cancel it when nobody wants the answer anymore"""
+
+    def __init__(self, job_id, on_token, on_done, on_error):
+        self.job_id = job_id
+        self.on_token = on_token
+        self.on_done = on_done
+        self.on_error = on_error
+        self.cancelled = threading.Event()
+
+    def Cancel(self):
+        """Stop streaming, nothing else gets delivered for this job"""
+        self.cancelled.set()
+
+
+class Flight:
+    """One upstream request, shared by every job that asked the same question while it ran"""
+
+    def __init__(self, flight_id, key):
+        self.flight_id = flight_id
+        self.key = key
+        self.jobs = []
+        self.parts = []
+        self.started = time.monotonic()
+
+    def Cancelled(self):
+        """Nobody is waiting for this answer anymore"""
+        return all(job.cancelled.is_set() for job in self.jobs)
+
+
+class AIWorker:
+    """Runs AI requests on a small thread pool & hands their output back to Tk through a queue"""
+
+    def __init__(self, window, client, cache=None, max_workers=2, poll_ms=50, timeout=60):
+        self.window = window
+        self.client = client
+        self.cache = cache
+        self.poll_ms = poll_ms
+        self.timeout = timeout
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai")
+        # (flight_id, kind, payload) filled by workers, drained on the Tk thread only
+        self.results = queue.Queue()
+        self.flights = {}
+        # Cache key -> flight still streaming, so identical requests share it
+        self.in_flight = {}
+        self.ids = itertools.count(1)
+        self.polling = False
+
+    def Stream(self, prompt, on_token, on_done, on_error, key=None):
+        """Start a streaming completion, callbacks run on the Tk thread, a key lets it share cached & running answers
+
+        prompt may also be a function building it, only called once the answer turns out
+        to be neither cached nor already on its way.
+        """
+        job = AIJob(next(self.ids), on_token, on_done, on_error)
+        # Whatever the workers already produced has to be delivered before anyone joins a flight
+        self.Drain()
+
+        cached = self.cache.Get(key) if self.cache is not None and key is not None else None
+        if cached is not None:
+            flight = Flight(next(self.ids), None)
+            flight.jobs.append(job)
+            self.flights[flight.flight_id] = flight
+            self.results.put((flight.flight_id, "token", cached))
+            self.results.put((flight.flight_id, "done", None))
+        elif key in self.in_flight and not self.in_flight[key].Cancelled():
+            # Single flight: replay what the running request produced so far, the rest arrives live
+            flight = self.in_flight[key]
+            flight.jobs.append(job)
+            if flight.parts:
+                self.Deliver(job, job.on_token, "".join(flight.parts))
+        else:
+            flight = Flight(next(self.ids), key)
+            flight.jobs.append(job)
+            self.flights[flight.flight_id] = flight
+            if key is not None:
+                self.in_flight[key] = flight
+            self.pool.submit(self.Run, flight, prompt() if callable(prompt) else prompt)
+
+        self.StartPolling()
+        return job
+
+    @Timed
+    def Run(self, flight, prompt):
+        """Worker thread: stream the completion into the results queue"""
+        deadline = time.monotonic() + self.timeout
+        stream = None
+        try:
+            if flight.Cancelled():
+                self.results.put((flight.flight_id, "cancelled", None))
+                return
+            stream = self.client.chat.completions.create(
+                model=AI_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True,
+                timeout=self.timeout
+            )
+            for chunk in stream:
+                if flight.Cancelled():
+                    self.results.put((flight.flight_id, "cancelled", None))
+                    return
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"No full answer within {self.timeout}s")
+                if chunk.choices and chunk.choices[0].delta.content:
+                    self.results.put((flight.flight_id, "token", chunk.choices[0].delta.content))
+            self.results.put((flight.flight_id, "done", None))
+        except Exception as e:
+            self.results.put((flight.flight_id, "error", e))
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+
+    def StartPolling(self):
+        """Poll the results queue from the Tk mainloop while jobs are running"""
+        if not self.polling:
+            self.polling = True
+            self.window.after(self.poll_ms, self.Poll)
+
+    def Poll(self):
+        """Tk thread: deliver results & keep polling while flights are running"""
+        try:
+            self.Drain()
+        finally:
+            # Even a failing drain must not leave polling stuck on with nothing scheduled
+            if self.flights:
+                self.window.after(self.poll_ms, self.Poll)
+            else:
+                self.polling = False
+
+    def Deliver(self, job, callback, *args):
+        """Tk thread: run one of a job's callbacks, one that fails (say its window is gone) cancels just that job"""
+        if job.cancelled.is_set():
+            return
+        try:
+            callback(*args)
+        except Exception:
+            job.Cancel()
+            self.window.report_callback_exception(*sys.exc_info())
+
+    def Drain(self):
+        """Tk thread: deliver everything the workers produced since the last drain"""
+        while True:
+            try:
+                flight_id, kind, payload = self.results.get_nowait()
+            except queue.Empty:
+                break
+
+            flight = self.flights.get(flight_id)
+            if flight is None:
+                continue
+
+            if kind == "token":
+                flight.parts.append(payload)
+                for job in flight.jobs:
+                    self.Deliver(job, job.on_token, payload)
+                continue
+
+            # The flight is over, later identical requests start a new one or hit the cache
+            del self.flights[flight_id]
+            if self.in_flight.get(flight.key) is flight:
+                del self.in_flight[flight.key]
+
+            if kind == "done":
+                if flight.key is not None and self.cache is not None:
+                    latency = time.monotonic() - flight.started
+                    self.cache.Put(flight.key, "".join(flight.parts), latency)
+                    for _ in flight.jobs[1:]:
+                        self.cache.Shared(latency)
+                for job in flight.jobs:
+                    self.Deliver(job, job.on_done)
+            elif kind == "error":
+                for job in flight.jobs:
+                    self.Deliver(job, job.on_error, payload)
+
+    def Close(self):
+        """Cancel every job & stop the pool without waiting for the network"""
+        for flight in self.flights.values():
+            for job in flight.jobs:
+                job.Cancel()
+        self.flights.clear()
+        self.in_flight.clear()
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -1,9 +1,19 @@
+import os
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
-import os
-from datetime import datetime
-from openai import OpenAI
+from src.backends import OpenServiceStorage, DEFAULT_STORAGE
+from src import lobby_service
+from src.lobby_service import LobbyService
+from src.accounts import AccountService
+from src.lobby_client import RemoteLobbyService, ParseAddress
+from src.lobby_expiry import LobbyExpiry, RulesFromEnv
+from src.lobby_index import LobbyQuery
+from src.lobby_list import VirtualLobbyList
+from src.metrics import METRICS, Timed
+from src.metrics_panel import MetricsPanel, StallMonitor
+from src.ai_cache import AICache, CacheKey
+from src.ai_worker import AIWorker, LazyClient, OpenAIClient
+from src.lobby_ranker import RankLobbies, PromptLobbies, BuildPrompt, LocalSuggestion, DEFAULT_TOP_K, DEFAULT_TOKEN_BUDGET
 
 class WorldOfWarcraft:
     def __init__(self):
@@ -13,137 +23,114 @@ class WorldOfWarcraft:
         self.window.geometry("800x600")
         self.window.resizable(False, False)
         
-        self.users_file = "users.json"
-        self.lobbies_file = "lobbies.json"
+        # WOW_METRICS=1 records from the start, F12 opens the debug panel to switch it at runtime
+        METRICS.Configure()
+        self.stall_monitor = StallMonitor(self.window)
+        self.window.bind("<F12>", lambda event: self.ShowMetricsPanel())
+        
+        server = os.environ.get("WOW_SERVER")
+        if server:
+            # Client mode, the lobby server owns users & lobbies and pushes every change to us
+            self.storage = None
+            self.lobby_service = RemoteLobbyService(*ParseAddress(server))
+            self.accounts = self.lobby_service
+            # Only the server sees enough players to fill a group, the solo queue lives there
+            self.solo_queue = self.lobby_service
+        else:
+            # WOW_STORAGE picks the backend, e.g. journal:data for the JSON files
+            self.storage = OpenServiceStorage(os.environ.get("WOW_STORAGE", DEFAULT_STORAGE))
+            self.lobby_service = LobbyService(self.storage)
+            self.accounts = AccountService(self.storage)
+            self.solo_queue = None
         
         # Current user that logs in
         self.current_user = None
-        
-        # Initialize AI client       
-        self.ai_client = OpenAI(base_url='https://api.gapgpt.app/v1', api_key='api')
+        self.polling_pushes = False
+        self.queued = False
+        # Built when the lobbies tab is first shown
+        self.lobby_list = None
+        
+        # AI client, built on the first suggestion so launching never waits for openai to import
+        # WOW_AI_BASE_URL can point it at a local stub server
+        self.ai_client = LazyClient(lambda: OpenAIClient(os.environ.get("WOW_AI_BASE_URL", 'https://api.gapgpt.app/v1'),
+                                                         os.environ.get("WOW_AI_API_KEY", 'api')))
+        # Identical questions within the TTL are answered from the cache instead of a new request
+        self.ai_cache = AICache(capacity=128, ttl=300)
+        # Only the best ranked lobbies go into the prompt, so its size stays flat as lobbies pile up
+        self.ai_top_k = int(os.environ.get("WOW_AI_TOP_K", DEFAULT_TOP_K))
+        self.ai_token_budget = int(os.environ.get("WOW_AI_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+        self.ai_worker = AIWorker(self.window, self.ai_client, cache=self.ai_cache)
         
         self.InitDataFiles()
+        # WOW_LOBBY_TTL, WOW_LOBBY_IDLE & WOW_LOBBY_EMPTY evict lobbies in the background, all off unless set
+        # A server does that for its own clients
+        self.lobby_expiry = None
+        rules = RulesFromEnv()
+        if self.storage is not None and any(rules.values()):
+            self.lobby_expiry = LobbyExpiry(self.lobby_service, **rules)
+            self.lobby_expiry.Start()
         self.ShowLoginScreen()
     
     def InitDataFiles(self):
         """Create JSON files if they don't exist"""
-        if not os.path.exists("data"):
-            os.makedirs("data")
-            
-        if not os.path.exists(f"data/{self.users_file}"):
-            json.dump({}, open(f"data/{self.users_file}", 'w')
-)
-        
-        if not os.path.exists(f"data/{self.lobbies_file}"):
-            json.dump({}, open(f"data/{self.lobbies_file}", 'w')
-)
-    
-    def LoadUsers(self):    
-        """Load usrs from JSON file"""
-        try:
-            content = open(f"data/{self.users_file}", 'r').read().strip()
-            if not content:
-                return {}
-            return json.loads(content)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {}
-    
-    def SaveUsers(self, users):
-        """Save users to JSON file"""
-        try:
-            json.dump(users, open(f"data/{self.users_file}", 'w'), indent=2)
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to save users: {str(e)}")
+        if self.storage is not None:
+            self.storage.InitDataFiles()
     
     def LoadLobbies(self):
-        """Load lobbies from JSON file"""
-        try:
-            content = open(f"data/{self.lobbies_file}", 'r').read().strip()
-            if not content:
-                return {}
-            return json.loads(content)
-        except (json.JSONDecodeError, FileNotFoundError):
-            return {}
-    
-    def SaveLobbies(self, lobbies):
-        """Save lobbies to JSON fil"""
+        """Current lobbies from the lobby service, read-only"""
+        return self.lobby_service.LoadLobbies()
+    
+    def ShowResult(self, result):
+        """Show a lobby service Result to the user, returns whether it succeeded"""
+        if result.ok:
+            messagebox.showinfo("Success", result.message)
+        else:
+            messagebox.showerror("Error", result.message)
+        return result.ok
+    
+    def RunLobbyAction(self, action, *args, on_success=None):
+        """Run a lobby service action, refresh the list on success & report the outcome"""
         try:
-            json.dump(lobbies, open(f"data/{self.lobbies_file}", 'w'), indent=2)
+            result = action(self.current_user, *args)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save lobbies: {str(e)}")
+            return False
+        
+        if result.ok:
+            if on_success:
+                on_success()
+            self.RefreshLobbies()
+        return self.ShowResult(result)
     
-    def GetAILobbySuggestions(self):
-        """Get AI lobby suggestions using OpenAi Inference API"""
-        try:
+    def RankAILobbies(self):
+        """How many lobbies there are, the local ranker's top picks among the joinable ones & those lobbies"""
+        # Expiry & the server's pushes change lobbies from other threads, rank & pick under the lock
+        with self.lobby_service.lock:
             lobbies = self.LoadLobbies()
-            if not lobbies:
-                return "No lobbies available for analysis."
+            joinable = self.lobby_service.JoinableLobbies(self.current_user)
+            ranked = RankLobbies(self.current_user, lobbies, joinable, top_k=self.ai_top_k)
+            return len(lobbies), ranked, {lobby_id: lobbies[lobby_id] for _, lobby_id in ranked}
 
-            # Prepare lobby data
-            available_lobbies = []
-            for lobby_id, lobby in lobbies.items():
-                if self.CanJoinLobby(lobby) and not self.IsMemberOfLobby(lobby):
-                    roles_needed = []
-                    if lobby['members']['Tank'] is None:
-                        roles_needed.append("Tank")
-                    if lobby['members']['Healer'] is None:
-                        roles_needed.append("Healer")
-                    dps_null_count = lobby['members']['DPS'].count(None)
-                    if dps_null_count > 0:
-                        roles_needed.append(f"{dps_null_count} DPS")
+    def LocalLobbySuggestion(self):
+        """Instant answer from the local ranker, used while the AI is slow or down"""
+        _, ranked, picked = self.RankAILobbies()
+        return LocalSuggestion(self.current_user, picked, ranked)
 
-                    available_lobbies.append({
-                        "name": lobby['name'],
-                        "leader": lobby['leader'],
-                        "required_rating": lobby['required_rating'],
-                        "roles_needed": ", ".join(roles_needed),
-                        "rating_diff": self.current_user['rating'] - lobby['required_rating']
-                    })
+    def BuildAIPrompt(self, ranking=None):
+        """(function building the AI prompt, cache key, None) or (None, None, message to show instead)"""
+        count, ranked, picked = ranking or self.RankAILobbies()
+        if not count:
+            return None, None, "No lobbies available for analysis."
 
-            if not available_lobbies:
-                return "No suitable lobbies found for your rating and role."
+        if not ranked:
+            return None, None, "No suitable lobbies found for your rating and role."
 
-            # Format lobby information
-            lobbies_info = []
-            for lobby in available_lobbies:
-                rating_status = f"+{lobby['rating_diff']}" if lobby['rating_diff'] >= 0 else f"{lobby['rating_diff']}"
-                lobbies_info.append(
-                    f"- {lobby['name']} (Leader: {lobby['leader']}) "
-                    f"| Needs: {lobby['roles_needed']} "
-                    f"| Req Rating: {lobby['required_rating']} (Your rating: {rating_status})"
-                )
-            lobbies_text = "\n".join(lobbies_info)
-
-            # Create optimized prompt
-            prompt = f"""
-[INST] As a World of Warcraft matchmaking expert, recommend the best lobby for this player:
-
-Player Info:
-- Role: {self.current_user['role']}
-- Rating: {self.current_user['rating']}
-
-Available Lobbies:
-{lobbies_text}
-
-Recommend ONE lobby and explain why in ten sentence.
-explain the roles of anybody in the game
-Format your response as:
-Recommended: [Lobby Name]
-Reason: [Brief explanation]
-[/INST]
-"""
-            # Get AI suggestions
-            response = self.ai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                {"role": "user", "content": prompt}
-                ]
-            )
-            
-            return response.choices[0].message.content.strip()
-
-        except Exception as e:
-            return f"⚠️ AI Error: {str(e)}"
+        # The key only holds what players of one role & rating bucket share, their own rating
+        # differences go into the prompt once the cache has missed
+        user = self.current_user
+        prompt_lobbies = PromptLobbies(picked, ranked, self.ai_token_budget)
+        key = CacheKey(user['role'], user['rating'], "\n".join(line for _, line in prompt_lobbies))
+        return lambda: BuildPrompt(user, picked, prompt_lobbies), key, None
 
     def ShowAISuggestions(self):
         """Display AI lobby suggestions in a new window"""
@@ -173,26 +160,60 @@ Reason: [Brief explanation]
         text_widget.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
-        # Close button
-        tk.Button(suggestions_window, text="Close", command=suggestions_window.destroy,
-                 bg="gray", fg="white").pack(pady=5)
-        
-        # Get AI suggestions in a separate thread to avoid freezing UI
-        def GetSuggestion():
-            loading_label.config(text="Getting AI recommendations...")
-            suggestions_window.update()
-            
-            suggestions = self.GetAILobbySuggestions()
-            
-            # Update the text widget
-            text_widget.delete(1.0, tk.END)
-            text_widget.insert(1.0, suggestions)
-            text_widget.config(state='disabled')  # Make it read-only
-            
+        # One ranking serves both the quick pick & the prompt
+        ranking = self.RankAILobbies()
+        prompt, key, message = self.BuildAIPrompt(ranking)
+        if prompt is None:
             loading_label.destroy()
+            text_widget.insert(1.0, message)
+            text_widget.config(state='disabled')
+            tk.Button(suggestions_window, text="Close", command=suggestions_window.destroy,
+                     bg="gray", fg="white").pack(pady=5)
+            return
+        
+        # Stream the answer from the AI worker pool, the Tk thread only ever inserts tokens
+        def OnToken(token):
+            if loading_label.winfo_exists():
+                loading_label.destroy()
+            text_widget.insert(tk.END, token)
+            text_widget.see(tk.END)
         
-        # Call after a short delay to let window render
-        suggestions_window.after(100, GetSuggestion)
+        def OnDone():
+            if loading_label.winfo_exists():
+                loading_label.destroy()
+            text_widget.config(state='disabled')  # Make it read-only
+            stats = self.ai_cache.Stats()
+            stats_label.config(text=f"Cache hit rate: {stats['hit_rate']:.0%} "
+                                    f"| {stats['saved_seconds']:.1f}s saved")
+        
+        # The AI is slow or down, fall back to the local ranker's pick
+        def OnError(error):
+            OnToken(f"\n⚠️ AI Error: {str(error)}\n\nLocal pick instead:\n{self.LocalLobbySuggestion()}")
+            OnDone()
+        
+        stats_label = tk.Label(suggestions_window, font=("Arial", 9), fg="gray")
+        stats_label.pack()
+        
+        # The local ranker answers instantly, the AI's answer streams in below it
+        _, ranked, picked = ranking
+        pick = picked[ranked[0][1]]['name']
+        loading_label.config(text=f"Getting AI recommendations... quick pick: {pick}")
+        job = self.ai_worker.Stream(prompt, OnToken, OnDone, OnError, key=key)
+        
+        # Closing the window cancels the request, nothing is inserted into a dead widget
+        def Close():
+            job.Cancel()
+            suggestions_window.destroy()
+        
+        # Logging out destroys the window without closing it, its children's <Destroy> land here too
+        suggestions_window.bind("<Destroy>", lambda e: job.Cancel() if e.widget is suggestions_window else None)
+        suggestions_window.protocol("WM_DELETE_WINDOW", Close)
+        tk.Button(suggestions_window, text="Close", command=Close,
+                 bg="gray", fg="white").pack(pady=5)
+    
+    def ShowMetricsPanel(self):
+        """Open the metrics debug panel"""
+        MetricsPanel(self.window)
     
     def ClearWindow(self):
         """Clear all widgets from the window"""
@@ -269,65 +290,33 @@ Reason: [Brief explanation]
     
     def RegisterUser(self):
         """Register a new user"""
-        username = self.username_entry.get().strip()
-        password = self.password_entry.get().strip()
-        email = self.email_entry.get().strip()
-        role = self.role_var.get()
-        rating = self.rating_entry.get().strip()
-        
-        if not all([username, password, email, rating]):
-            messagebox.showerror("Error", "All fields are required!")
-            return
-        
-        if not email.endswith("@gmail.com"):
-            messagebox.showerror("Error", "Please enter a valid Gmail address!")
-            return
-        
         try:
-            rating = int(rating)
-            if rating < 0 or rating > 4000:
-                messagebox.showerror("Error", "Rating must be between 0 and 4000!")
-                return
-        except ValueError:
-            messagebox.showerror("Error", "Rating must be a number!")
+            result = self.accounts.Register(self.username_entry.get(), self.password_entry.get(),
+                                            self.email_entry.get(), self.role_var.get(),
+                                            self.rating_entry.get())
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save users: {str(e)}")
             return
         
-        users = self.LoadUsers()
-        if username in users:
-            messagebox.showerror("Error", "Username already exists!")
+        if not self.ShowResult(result):
             return
         
-        users[username] = {
-            "password": password,
-            "email": email,
-            "role": role,
-            "rating": rating,
-            "created_at": datetime.now().isoformat()
-        }
-        self.SaveUsers(users)
-        
-        messagebox.showinfo("Success", "Registration successful! You can now sign in.")
         self.is_register_mode.set(False)
         self.ToggleMode()
     
     def LoginUser(self):
         """Login user"""
-        username = self.username_entry.get().strip()
-        password = self.password_entry.get().strip()
-        
-        if not username or not password:
-            messagebox.showerror("Error", "Username and password are required!")
+        try:
+            result, user = self.accounts.Login(self.username_entry.get(), self.password_entry.get())
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to sign in: {str(e)}")
             return
         
-        users = self.LoadUsers()
-        if username not in users or users[username]["password"] != password:
-            messagebox.showerror("Error", "Invalid username or password!")
+        if user is None:
+            messagebox.showerror("Error", result.message)
             return
         
-        self.current_user = {
-            "username": username,
-            **users[username]
-        }
+        self.current_user = user
         
         self.ShowMainApp()
     
@@ -340,6 +329,7 @@ Reason: [Brief explanation]
         
         self.CreateProfileTab()
         self.CreateLobbiesTab()
+        self.notebook.bind("<<NotebookTabChanged>>", self.OnTabChanged)
         
         logout_btn = tk.Button(self.window, text="Logout", command=self.Logout, 
                               bg="red", fg="white")
@@ -365,10 +355,19 @@ Reason: [Brief explanation]
                 font=("Arial", 12)).pack(pady=5, anchor='w')
     
     def CreateLobbiesTab(self):
-        """Create the lobbies tab"""
-        lobbies_frame = ttk.Frame(self.notebook)
-        self.notebook.add(lobbies_frame, text="Lobbies")
-        
+        """Create the lobbies tab, its contents are built the first time it's shown"""
+        self.lobbies_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.lobbies_frame, text="Lobbies")
+        self.lobby_list = None
+    
+    def OnTabChanged(self, event):
+        """Build the lobbies tab the first time it's selected"""
+        if self.lobby_list is None and self.notebook.select() == str(self.lobbies_frame):
+            self.BuildLobbiesTab()
+    
+    def BuildLobbiesTab(self):
+        """Fill the lobbies tab & load the lobbies"""
+        lobbies_frame = self.lobbies_frame
         top_frame = tk.Frame(lobbies_frame)
         top_frame.pack(fill='x', padx=10, pady=10)
         
@@ -378,21 +377,58 @@ Reason: [Brief explanation]
                  bg="blue", fg="white").pack(side='left', padx=10)
         tk.Button(top_frame, text="🤖 AI Suggestions", command=self.ShowAISuggestions, 
                  bg="purple", fg="white").pack(side='left', padx=10)
-        
-        self.lobbies_listbox_frame = tk.Frame(lobbies_frame)
-        self.lobbies_listbox_frame.pack(expand=True, fill='both', padx=10, pady=10)
+        if self.solo_queue is not None:
+            self.queue_button = tk.Button(top_frame, command=self.ToggleSoloQueue, bg="darkorange", fg="white")
+            self.queue_button.pack(side='left')
+            self.UpdateQueueButton()
+        
+        # Search filters, the ones left empty match every lobby
+        search_frame = tk.Frame(lobbies_frame)
+        search_frame.pack(fill='x', padx=10)
+        
+        tk.Label(search_frame, text="Name:").pack(side='left')
+        self.search_name_entry = tk.Entry(search_frame, width=14)
+        self.search_name_entry.pack(side='left', padx=(0, 5))
+        tk.Label(search_frame, text="Rating:").pack(side='left')
+        self.search_min_entry = tk.Entry(search_frame, width=5)
+        self.search_min_entry.pack(side='left')
+        tk.Label(search_frame, text="-").pack(side='left')
+        self.search_max_entry = tk.Entry(search_frame, width=5)
+        self.search_max_entry.pack(side='left', padx=(0, 5))
+        tk.Label(search_frame, text="Leader:").pack(side='left')
+        self.search_leader_entry = tk.Entry(search_frame, width=10)
+        self.search_leader_entry.pack(side='left', padx=(0, 5))
+        self.needs_my_role = tk.BooleanVar(value=False)
+        tk.Checkbutton(search_frame, text="Needs my role", variable=self.needs_my_role).pack(side='left')
+        tk.Button(search_frame, text="Search", command=self.SearchLobbies).pack(side='left', padx=5)
+        for entry in (self.search_name_entry, self.search_min_entry, self.search_max_entry, self.search_leader_entry):
+            entry.bind("<Return>", lambda e: self.SearchLobbies())
+        
+        # Keyset pages: the cursor every visited page started after, the last one is the current page
+        self.lobby_query = LobbyQuery()
+        self.page_cursors = [None]
+        self.next_cursor = None
+        page_frame = tk.Frame(lobbies_frame)
+        page_frame.pack(fill='x', padx=10, pady=(5, 0))
+        self.prev_button = tk.Button(page_frame, text="◀ Prev", command=self.PreviousPage)
+        self.prev_button.pack(side='left')
+        self.page_label = tk.Label(page_frame)
+        self.page_label.pack(side='left', padx=10)
+        self.next_button = tk.Button(page_frame, text="Next ▶", command=self.NextPage)
+        self.next_button.pack(side='left')
+        
+        # Only the rows in view exist as widgets, recycled while scrolling
+        self.lobby_list = VirtualLobbyList(lobbies_frame, self)
+        self.lobby_list.frame.pack(expand=True, fill='both', padx=10, pady=10)
         
         self.RefreshLobbies()
+        if isinstance(self.lobby_service, RemoteLobbyService) and not self.polling_pushes:
+            self.polling_pushes = True
+            self.PollPushes()
     
     def IsUserInAnyLobby(self):
         """Check if current user is already in any lobby"""
-        lobbies = self.LoadLobbies()
-        username = self.current_user['username']
-        
-        for lobby in lobbies.values():
-            if self.IsMemberOfLobby(lobby):
-                return True
-        return False
+        return self.lobby_service.IsUserInAnyLobby(self.current_user)
 
     def CreateLobbyDialog(self):
         """Show create lobby dialog"""
@@ -418,238 +454,155 @@ Reason: [Brief explanation]
                 messagebox.showerror("Error", "Rating must be a number!")
                 return
             
-            if not name:
-                messagebox.showerror("Error", "Lobby name is required!")
-                return
-            
-            if required_rating < 0 or required_rating > 4000:
-                messagebox.showerror("Error", "Rating must be between 0 and 4000!")
-                return
-            
-            if self.IsUserInAnyLobby():
-                messagebox.showerror("Error", "You're already in a lobby! Leave your current lobby before creating a new one.")
-                return
-
-            lobbies = self.LoadLobbies()
-            
-            # Check if lobby name exists
-            if name in lobbies:
-                messagebox.showerror("Error", "Lobby name already exists!")
-                return
-            
-            # Create lobby
-            lobby_id = name
-            lobbies[lobby_id] = {
-                "name": name,
-                "leader": self.current_user["username"],
-                "required_rating": required_rating,
-                "members": {
-                    "Tank": None,
-                    "Healer": None,
-                    "DPS": [None, None, None]
-                },
-                "created_at": datetime.now().isoformat()
-            }
-            
-            # Add creator to lobby
-            if self.current_user["role"] == "DPS":
-                for i in range(3):
-                    if lobbies[lobby_id]["members"]["DPS"][i] is None:
-                        lobbies[lobby_id]["members"]["DPS"][i] = self.current_user["username"]
-                        break
-            else:
-                lobbies[lobby_id]["members"][self.current_user["role"]] = self.current_user["username"]
-            
-            self.SaveLobbies(lobbies)
-            dialog.destroy()
-            self.RefreshLobbies()
-            messagebox.showinfo("Success", "Lobby created successfully!")
+            self.RunLobbyAction(self.lobby_service.CreateLobby, name, required_rating,
+                                on_success=dialog.destroy)
         
         tk.Button(dialog, text="Create", command=CreateLobby, 
                  bg="green", fg="white").pack(pady=20)
     
-    def RefreshLobbies(self):
-        """Refresh the lobbies list"""
-        # Clear existing widgets
-        for widget in self.lobbies_listbox_frame.winfo_children():
-            widget.destroy()
-        
-        lobbies = self.LoadLobbies()
-        
-        if not lobbies:
-            tk.Label(self.lobbies_listbox_frame, text="No lobbies available", 
-                    font=("Arial", 12)).pack(pady=20)
+    @Timed
+    def SearchLobbies(self):
+        """Search with the filters in the form, starting from the first page"""
+        try:
+            min_rating = int(self.search_min_entry.get()) if self.search_min_entry.get().strip() else None
+            max_rating = int(self.search_max_entry.get()) if self.search_max_entry.get().strip() else None
+        except ValueError:
+            messagebox.showerror("Error", "Rating must be a number!")
             return
         
-        # Create scrollable frame
-        canvas = tk.Canvas(self.lobbies_listbox_frame)
-        scrollbar = ttk.Scrollbar(self.lobbies_listbox_frame, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-        
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        self.lobby_query = LobbyQuery(prefix=self.search_name_entry.get().strip(),
+                                      min_rating=min_rating, max_rating=max_rating,
+                                      role=self.current_user['role'] if self.needs_my_role.get() else None,
+                                      leader=self.search_leader_entry.get().strip() or None)
+        self.page_cursors = [None]
+        self.RefreshLobbies()
+        self.lobby_list.canvas.yview_moveto(0)
+    
+    def NextPage(self):
+        """Show the page after the current one"""
+        if self.next_cursor is not None:
+            self.page_cursors.append(self.next_cursor)
+            self.RefreshLobbies()
+            self.lobby_list.canvas.yview_moveto(0)
+    
+    def PreviousPage(self):
+        """Show the page before the current one"""
+        if len(self.page_cursors) > 1:
+            self.page_cursors.pop()
+            self.RefreshLobbies()
+            self.lobby_list.canvas.yview_moveto(0)
+    
+    @Timed
+    def RefreshLobbies(self):
+        """Fetch & render the current page of the search, never the whole dataset"""
+        if self.lobby_list is None:
+            return
+        page, versions, self.next_cursor = self.lobby_service.SearchLobbies(self.lobby_query, self.page_cursors[-1])
+        # Everything from here on was deleted, step back to the last page that still has lobbies
+        while not page and len(self.page_cursors) > 1:
+            self.page_cursors.pop()
+            page, versions, self.next_cursor = self.lobby_service.SearchLobbies(self.lobby_query,
+                                                                                self.page_cursors[-1])
+        self.lobby_list.ShowPage(page, versions)
+        
+        self.page_label.config(text=f"Page {len(self.page_cursors)}")
+        self.prev_button.config(state='normal' if len(self.page_cursors) > 1 else 'disabled')
+        self.next_button.config(state='normal' if self.next_cursor is not None else 'disabled')
+    
+    def ToggleSoloQueue(self):
+        """Join the solo queue, or leave it when already queued"""
+        try:
+            if self.queued:
+                result = self.solo_queue.Dequeue(self.current_user['username'])
+            else:
+                result = self.solo_queue.Enqueue(self.current_user)
+        except Exception as e:
+            messagebox.showerror("Error", f"Solo queue failed: {str(e)}")
+            return
         
-        # Add lobbies
-        for lobby_id, lobby in lobbies.items():
-            self.CreateLobbyWidget(scrollable_frame, lobby_id, lobby)
+        if result.ok:
+            self.queued = not self.queued
+            self.UpdateQueueButton()
+            if self.queued:
+                self.PollSoloQueue()
+        self.ShowResult(result)
+    
+    def UpdateQueueButton(self):
+        """Show whether the current user is queued"""
+        self.queue_button.config(text="Leave Queue" if self.queued else "🎲 Solo Queue")
+    
+    def PollSoloQueue(self):
+        """While queued, check every second whether the queue seated us in a lobby"""
+        if not self.queued or self.current_user is None:
+            return
+        lobby_id = self.lobby_service.LobbyOf(self.current_user['username'])
+        if lobby_id is None:
+            self.window.after(1000, self.PollSoloQueue)
+            return
         
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        # Joining a lobby by hand takes us out of the queue too
+        self.queued = False
+        self.UpdateQueueButton()
+        self.RefreshLobbies()
+        lobby = self.lobby_service.lobbies.get(lobby_id)
+        if lobby is not None:
+            messagebox.showinfo("Solo Queue", f"You're in lobby {lobby['name']} now!")
     
-    def CreateLobbyWidget(self, parent, lobby_id, lobby):
-        """Create a widget for a single lobby"""
-        frame = tk.Frame(parent, relief="ridge", bd=2)
-        frame.pack(fill='x', padx=5, pady=5)
-        
-        # Lobby info
-        info_frame = tk.Frame(frame)
-        info_frame.pack(fill='x', padx=10, pady=5)
-        
-        tk.Label(info_frame, text=f"Lobby: {lobby['name']}", 
-                font=("Arial", 12, "bold")).pack(anchor='w')
-        tk.Label(info_frame, text=f"Leader: {lobby['leader']}", 
-                font=("Arial", 10)).pack(anchor='w')
-        tk.Label(info_frame, text=f"Required Rating: {lobby['required_rating']}", 
-                font=("Arial", 10)).pack(anchor='w')
-        
-        # Members info
-        members_frame = tk.Frame(frame)
-        members_frame.pack(fill='x', padx=10, pady=5)
-        
-        tk.Label(members_frame, text="Members:", font=("Arial", 10, "bold")).pack(anchor='w')
-        
-        tank = lobby['members']['Tank'] or "Empty"
-        healer = lobby['members']['Healer'] or "Empty"
-        dps_list = [member or "Empty" for member in lobby['members']['DPS']]
-        
-        tk.Label(members_frame, text=f"Tank: {tank}").pack(anchor='w')
-        tk.Label(members_frame, text=f"Healer: {healer}").pack(anchor='w')
-        tk.Label(members_frame, text=f"DPS: {', '.join(dps_list)}").pack(anchor='w')
-        
-        # Buttons
-        button_frame = tk.Frame(frame)
-        button_frame.pack(fill='x', padx=10, pady=5)
-        
-        # Check if user can join
-        can_join = self.CanJoinLobby(lobby)
-        is_member = self.IsMemberOfLobby(lobby)
-        is_leader = lobby['leader'] == self.current_user['username']
-        
-        if is_leader:
-            tk.Button(button_frame, text="Delete Lobby", 
-                     command=lambda: self.DeleteLobby(lobby_id),
-                     bg="red", fg="white").pack(side='left', padx=5)
-        elif is_member:
-            tk.Button(button_frame, text="Leave Lobby", 
-                     command=lambda: self.LeaveLobby(lobby_id),
-                     bg="orange", fg="white").pack(side='left', padx=5)
-        elif can_join:
-            tk.Button(button_frame, text="Join Lobby", 
-                     command=lambda: self.JoinLobby(lobby_id),
-                     bg="blue", fg="white").pack(side='left', padx=5)
-        else:
-            reason = self.JoinRestrictionReason(lobby)
-            tk.Label(button_frame, text=f"Cannot join: {reason}", 
-                    fg="red").pack(side='left', padx=5)
+    def PollPushes(self):
+        """Client mode: redraw the list whenever the server pushed a change, no Refresh click needed"""
+        if self.current_user is None:
+            self.polling_pushes = False
+            return
+        if self.lobby_service.changed.is_set():
+            self.lobby_service.changed.clear()
+            self.RefreshLobbies()
+        self.window.after(100, self.PollPushes)
     
     def CanJoinLobby(self, lobby):
         """Check if current user can join the lobby"""
-        # Check rating requirement
-        if self.current_user['rating'] < lobby['required_rating']:
-            return False
-        
-        # Check if role slot is available
-        role = self.current_user['role']
-        if role == "DPS":
-            return None in lobby['members']['DPS']
-        else:
-            return lobby['members'][role] is None
+        return lobby_service.CanJoinLobby(self.current_user, lobby)
     
     def IsMemberOfLobby(self, lobby):
         """Check if current user is already a member of the lobby"""
-        username = self.current_user['username']
-        if lobby['members']['Tank'] == username or lobby['members']['Healer'] == username:
-            return True
-        return username in lobby['members']['DPS']
+        return lobby_service.IsMemberOfLobby(self.current_user, lobby)
     
     def JoinRestrictionReason(self, lobby):
         """Get the reason why user cannot join the lobby"""
-        if self.current_user['rating'] < lobby['required_rating']:
-            return "Rating too low"
-        
-        role = self.current_user['role']
-        if role == "DPS":
-            if None not in lobby['members']['DPS']:
-                return "DPS slots full"
-        else:
-            if lobby['members'][role] is not None:
-                return f"{role} slot taken"
-        
-        return "Unknown reason"
+        return lobby_service.JoinRestrictionReason(self.current_user, lobby)
     
     def JoinLobby(self, lobby_id):
         """Join a lobby"""
-        if self.IsUserInAnyLobby():
-            messagebox.showerror("Error", "You're already in a lobby! Leave your current lobby before joining another one.")
-            return
-            
-        lobbies = self.LoadLobbies()
-        lobby = lobbies[lobby_id]
-        username = self.current_user['username']
-        role = self.current_user['role']
-        
-        if role == "DPS":
-            for i in range(3):
-                if lobby['members']['DPS'][i] is None:
-                    lobby['members']['DPS'][i] = username
-                    break
-        else:
-            lobby['members'][role] = username
-        
-        self.SaveLobbies(lobbies)
-        self.RefreshLobbies()
-        messagebox.showinfo("Success", "Joined lobby successfully!")
+        self.RunLobbyAction(self.lobby_service.JoinLobby, lobby_id)
     
     def LeaveLobby(self, lobby_id):
         """Leave a lobby"""
-        lobbies = self.LoadLobbies()
-        lobby = lobbies[lobby_id]
-        username = self.current_user['username']
-        
-        # Remove user from lobby
-        if lobby['members']['Tank'] == username:
-            lobby['members']['Tank'] = None
-        elif lobby['members']['Healer'] == username:
-            lobby['members']['Healer'] = None
-        else:
-            for i in range(3):
-                if lobby['members']['DPS'][i] == username:
-                    lobby['members']['DPS'][i] = None
-                    break
-        
-        self.SaveLobbies(lobbies)
-        self.RefreshLobbies()
-        messagebox.showinfo("Success", "Left lobby successfully!")
+        self.RunLobbyAction(self.lobby_service.LeaveLobby, lobby_id)
     
     def DeleteLobby(self, lobby_id):
         """Delete a lobby (leader only)"""
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this lobby?"):
-            lobbies = self.LoadLobbies()
-            del lobbies[lobby_id]
-            self.SaveLobbies(lobbies)
-            self.RefreshLobbies()
-            messagebox.showinfo("Success", "Lobby deleted successfully!")
+            self.RunLobbyAction(self.lobby_service.DeleteLobby, lobby_id)
     
     def Logout(self):
         """Logout user"""
+        if self.queued:
+            self.queued = False
+            try:
+                self.solo_queue.Dequeue(self.current_user['username'])
+            except OSError:
+                # Lost the server, it drops us from its queue when the connection closes
+                pass
         self.current_user = None
         self.ShowLoginScreen()
     
     def Run(self):
         """Run the application"""
-        self.window.mainloop()
\ No newline at end of file
+        try:
+            self.window.mainloop()
+        finally:
+            self.ai_worker.Close()
+            if self.lobby_expiry is not None:
+                self.lobby_expiry.Stop()
+            # Durability barrier, nothing queued may be lost on exit
+            self.lobby_service.Close()
+            METRICS.Close()
\ No newline at end of file
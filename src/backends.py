@@ -0,0 +1,96 @@
+"""Pick a storage backend from a spec & copy data between backends
+
+Migrate the JSON files into SQLite, from the repository root:
+    python -m src.backends journal:data sqlite:data/wow.db
+"""
+import os
+import sys
+from src.journal import JournaledStorage
+from src.sqlite_storage import SqliteStorage
+from src.storage import JsonStorage
+from src.write_behind import WriteBehindStorage
+
+# Users are keyed rows here, signing in or registering never reads or rewrites every account
+DEFAULT_STORAGE = "sqlite:data/wow.db"
+# Where the default used to keep its data, adopted by the default database the first time it is opened
+LEGACY_STORAGE = "journal:data"
+
+
+def OpenStorage(spec=DEFAULT_STORAGE):
+    """Storage for a 'kind:location' spec, e.g. json:data, journal:data or sqlite:data/wow.db"""
+    kind, _, location = spec.partition(":")
+    if kind == "json":
+        return JsonStorage(location or "data")
+    if kind == "journal":
+        return JournaledStorage(location or "data")
+    if kind == "sqlite":
+        if spec == DEFAULT_STORAGE:
+            AdoptLegacyData(location, LEGACY_STORAGE)
+        return SqliteStorage(location or "data/wow.db")
+    raise ValueError(f"Unknown storage: {spec}")
+
+
+def AdoptLegacyData(path, legacy_spec):
+    """Migrate legacy_spec into a new database at path, once, so switching defaults keeps every account"""
+    legacy = OpenStorage(legacy_spec)
+    if os.path.exists(path) or not os.path.exists(legacy.users_path):
+        return
+    # Built beside it & moved in place, a crash halfway leaves no half-filled database to skip next time
+    partial = path + ".adopting"
+    for leftover in (partial, partial + "-wal", partial + "-shm"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    target = SqliteStorage(partial)
+    try:
+        users, lobbies = Migrate(legacy, target)
+    finally:
+        target.Close()
+        legacy.Close()
+    os.replace(partial, path)
+    print(f"Copied {users} users and {lobbies} lobbies from {legacy_spec} into {path}", flush=True)
+
+
+def OpenServiceStorage(spec=DEFAULT_STORAGE, window=0.02):
+    """Storage for a long-running LobbyService, JSON backends merge bursts of saves into one flush per window"""
+    storage = OpenStorage(spec)
+    if isinstance(storage, JsonStorage):
+        # SQLite commits right away instead, its slot claims have to fail before we tell the player they joined
+        storage = WriteBehindStorage(storage, window=window)
+    return storage
+
+
+def CopyUsers(source, target):
+    """Stream every user from source into target, replacing what target had, returns how many"""
+    copied = 0
+
+    def Counted():
+        nonlocal copied
+        for pair in source.IterUsers():
+            copied += 1
+            yield pair
+
+    target.ReplaceUsers(Counted())
+    return copied
+
+
+def Migrate(source, target):
+    """Copy every user & lobby from source into target, replacing what target had"""
+    target.InitDataFiles()
+    users = CopyUsers(source, target)
+    lobbies = source.LoadLobbies()
+    target.SaveLobbies(lobbies)
+    return users, len(lobbies)
+
+
+def Main(argv):
+    if len(argv) != 2:
+        print("usage: python -m src.backends <source spec> <target spec>")
+        return 2
+
+    users, lobbies = Migrate(OpenStorage(argv[0]), OpenStorage(argv[1]))
+    print(f"Migrated {users} users and {lobbies} lobbies from {argv[0]} to {argv[1]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(Main(sys.argv[1:]))
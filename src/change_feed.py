@@ -0,0 +1,49 @@
+import time
+from collections import deque, namedtuple
+from itertools import islice
+
+# What a client behind at some seq needs: the mutations after it, or the whole lobbies dict when those are gone
+Changes = namedtuple("Changes", ["seq", "mutations", "lobbies"])
+
+
+class ChangeFeed:
+    """Numbers every committed lobby mutation & keeps the latest capacity of them for catching up"""
+
+    def __init__(self, capacity=10000):
+        # Starting from the clock in microseconds, a seq handed out before a restart is always below the floor
+        self.seq = time.time_ns() // 1000
+        # (seq, mutation), oldest first, deque drops the oldest once full
+        self.buffer = deque(maxlen=capacity)
+        # Nobody below this seq can catch up incrementally, everything may have changed since
+        self.floor = self.seq
+
+    def Record(self, mutations):
+        """Listener for LobbyService commits, None means the lobbies were reloaded wholesale"""
+        if mutations is None:
+            self.Reset()
+            return
+        for mutation in mutations:
+            self.seq += 1
+            self.buffer.append((self.seq, mutation))
+
+    def Reset(self):
+        """Forget the buffer, every client is now behind by more than it can replay"""
+        self.seq += 1
+        self.buffer.clear()
+        self.floor = self.seq
+
+    def Since(self, seq):
+        """Mutations after seq, oldest first, or None when they are no longer all in the buffer"""
+        if seq == self.seq:
+            return []
+        if seq > self.seq:
+            # From some other feed, nothing to replay against
+            return None
+        oldest = self.buffer[0][0] if self.buffer else self.seq + 1
+        if seq < self.floor or seq + 1 < oldest:
+            return None
+        # Seqs in the buffer are contiguous, the newest seq - seq entries are exactly the ones missed,
+        # read from the right end so the cost follows how much changed, not how big the buffer is
+        missed = list(islice(reversed(self.buffer), self.seq - seq))
+        missed.reverse()
+        return [mutation for _, mutation in missed]
@@ -0,0 +1,125 @@
+import json
+import os
+import zlib
+from src.lobby_service import ApplyMutation
+from src.metrics import CountRead, CountWritten, Timed
+from src.storage import JsonStorage
+
+
+def EncodeRecord(mutation):
+    """One journal line: crc32 of the payload, a space, the JSON payload & a newline"""
+    payload = json.dumps(mutation, separators=(',', ':')).encode('utf-8')
+    return b"%08x %s\n" % (zlib.crc32(payload), payload)
+
+
+def DecodeRecord(line):
+    """Parse one journal line, None if it is torn or corrupted"""
+    if not line.endswith(b"\n") or len(line) < 10 or line[8:9] != b" ":
+        return None
+    payload = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(payload):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+class JournaledStorage(JsonStorage):
+    """JSON storage whose lobbies are a snapshot (lobbies.json) plus an append-only mutation journal"""
+
+    def __init__(self, data_dir="data", users_file="users.json", lobbies_file="lobbies.json",
+                 journal_file="lobbies.journal", compact_every=1000, fsync=True):
+        super().__init__(data_dir, users_file, lobbies_file, fsync)
+        self.journal_path = os.path.join(data_dir, journal_file)
+        self.compact_every = compact_every
+        self.journal_records = 0
+        # (offset, journal size) of a broken tail the last replay stopped at, None when it read to the end
+        self.torn = None
+
+    def InitDataFiles(self):
+        """Create the JSON files & an empty journal if they don't exist"""
+        super().InitDataFiles()
+        if not os.path.exists(self.journal_path):
+            open(self.journal_path, 'ab').close()
+
+    def LobbiesSignature(self):
+        """Fingerprint of snapshot & journal together"""
+        return (self.Signature(self.lobbies_path), self.Signature(self.journal_path))
+
+    @Timed
+    def LoadLobbies(self):
+        """Load snapshot plus journal, read-only"""
+        return self.Cached(self.journal_path, self.LobbiesSignature(), self.ReplayLobbies)
+
+    def ReplayLobbies(self):
+        """Load the snapshot and replay every intact journal record on top of it"""
+        lobbies = self.ReadLobbies(self.lobbies_path)
+        self.journal_records = 0
+
+        try:
+            with open(self.journal_path, 'rb') as f:
+                good_offset = 0
+                for line in f:
+                    mutation = DecodeRecord(line)
+                    if mutation is None:
+                        break
+                    ApplyMutation(lobbies, mutation)
+                    good_offset += len(line)
+                    self.journal_records += 1
+                size = f.seek(0, os.SEEK_END)
+                CountRead(good_offset)
+        except FileNotFoundError:
+            self.torn = None
+            return lobbies
+
+        # The tail may be another process's append still being written, so readers leave it be
+        self.torn = (good_offset, size) if size > good_offset else None
+        return lobbies
+
+    def CutTornTail(self):
+        """Commit path: drop the broken tail the last replay stopped at, if nobody wrote to the journal since"""
+        offset, size = self.torn
+        self.torn = None
+        with open(self.journal_path, 'r+b') as f:
+            # Grown or compacted meanwhile, whoever is writing isn't done, the next replay takes another look
+            if f.seek(0, os.SEEK_END) != size:
+                return
+            f.seek(offset)
+            if DecodeRecord(f.readline()) is None:
+                f.truncate(offset)
+
+    @Timed
+    def SaveLobbies(self, lobbies):
+        """Write a full snapshot & start an empty journal"""
+        self.Compact(lobbies)
+
+    @Timed
+    def CommitLobbies(self, lobbies, mutations):
+        """Append the batch to the journal, compacting once it has grown long enough"""
+        # O(batch) per commit, a crash mid-append only tears this batch's records
+        data = b"".join(EncodeRecord(mutation) for mutation in mutations)
+        # Appending behind a half-written record would hide this batch from every replay
+        if self.torn is not None:
+            self.CutTornTail()
+        with open(self.journal_path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        CountWritten(len(data))
+        self.journal_records += len(mutations)
+
+        if self.journal_records >= self.compact_every:
+            self.Compact(lobbies)
+
+    def Compact(self, lobbies):
+        """Fold the journal into a new snapshot"""
+        # Snapshot goes in first, a crash before the journal is emptied just replays
+        # mutations the snapshot already has, which ApplyMutation tolerates
+        self.WriteLobbies(self.lobbies_path, lobbies)
+        with open(self.journal_path, 'wb') as f:
+            if self.fsync:
+                os.fsync(f.fileno())
+        self.journal_records = 0
+        self.torn = None
@@ -0,0 +1,175 @@
+import itertools
+import json
+import socket
+import threading
+from src.lobby_service import LobbyService, Result
+from src.metrics import Timed
+from src.storage import Storage
+
+# Where the lobby server listens unless told otherwise, kept here so the app doesn't import the server & asyncio
+DEFAULT_PORT = 7777
+
+
+def ParseAddress(address):
+    """'host:port' or just 'host' -> (host, port)"""
+    host, _, port = address.rpartition(":")
+    if not host:
+        return port or "127.0.0.1", DEFAULT_PORT
+    return host, int(port)
+
+
+class RemoteLobbyService(LobbyService):
+    """LobbyService whose lobbies are a mirror of the lobby server's, kept current by its pushes
+
+    Reads come from the mirror like they would from a local service, actions are sent to the server.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, timeout=10):
+        # The mirror never touches storage, the server owns it
+        super().__init__(Storage())
+        self.timeout = timeout
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock.settimeout(None)
+        self.rfile = self.sock.makefile("rb")
+        self.send_lock = threading.Lock()
+        self.request_ids = itertools.count(1)
+        # request id -> [Event, response], filled by the reader thread
+        self.waiting = {}
+        # Set whenever a push changed the mirror, cleared by whoever redraws
+        self.changed = threading.Event()
+        # Server seq the mirror is current up to, None until the first listing
+        self.seq = None
+        self.reader = threading.Thread(target=self.ReadLoop, daemon=True, name="lobby-client")
+        self.reader.start()
+
+    def Sync(self):
+        """Nothing to reload, pushes keep the mirror current"""
+
+    def LoadLobbies(self):
+        """Mirrored lobbies, callers must treat them as read-only"""
+        with self.lock:
+            return self.lobbies.Copy()
+
+    def Send(self, op, **fields):
+        """Send one request without waiting, returns its id"""
+        request_id = next(self.request_ids)
+        with self.send_lock:
+            self.sock.sendall(json.dumps({"id": request_id, "op": op, **fields}).encode('utf-8') + b"\n")
+        return request_id
+
+    def Call(self, op, **fields):
+        """Send one request & block until its response"""
+        request_id = next(self.request_ids)
+        slot = [threading.Event(), None]
+        self.waiting[request_id] = slot
+        try:
+            with self.send_lock:
+                self.sock.sendall(json.dumps({"id": request_id, "op": op, **fields}).encode('utf-8') + b"\n")
+            if not slot[0].wait(self.timeout):
+                raise TimeoutError(f"Lobby server did not answer {op} within {self.timeout}s")
+        finally:
+            self.waiting.pop(request_id, None)
+        if slot[1] is None:
+            raise ConnectionError("Lost the connection to the lobby server")
+        return slot[1]
+
+    def ReadLoop(self):
+        """Reader thread: route responses to their callers & apply pushes to the mirror"""
+        try:
+            for line in self.rfile:
+                message = json.loads(line)
+                if "event" in message:
+                    self.ApplyChanges(message)
+                    continue
+                if "seq" in message:
+                    # A listing is applied here, before any push that follows it on the wire
+                    self.ApplyChanges(message)
+                slot = self.waiting.get(message.get("id"))
+                if slot is not None:
+                    slot[1] = message
+                    slot[0].set()
+        except (OSError, ValueError):
+            pass
+        finally:
+            # Wake every caller still waiting, they see no response & raise
+            for slot in list(self.waiting.values()):
+                slot[0].set()
+
+    def ApplyChanges(self, message):
+        """Apply a push or listing to the mirror: lobbies replace it, mutations in (since, seq] replay on it"""
+        if "lobbies" in message:
+            self.Reset(message['lobbies'])
+        elif self.seq is None:
+            # Pushes before the first listing are covered by it
+            return
+        elif message['since'] > self.seq:
+            # Missed some seqs, ask for everything after ours, the answer comes back through here
+            self.Send("list", since=self.seq)
+            return
+        else:
+            # A listing may already hold the start of this push, overwriting is harmless but skipping is cheaper
+            mutations = message['mutations'][self.seq - message['since']:]
+            if not mutations:
+                return
+            self.Replay(mutations)
+        self.seq = message['seq']
+        self.changed.set()
+
+    def ToResult(self, response):
+        """A server response as a lobby service Result"""
+        return Result(response['ok'], response['message'], response.get('lobby_id'))
+
+    # Accounts, the same calls AccountService offers
+
+    def Register(self, username, password, email, role, rating):
+        """Register a new user on the server"""
+        return self.ToResult(self.Call("register", username=username, password=password, email=email,
+                                       role=role, rating=rating))
+
+    def Login(self, username, password):
+        """Sign in & start mirroring the server's lobbies, returns (Result, user)"""
+        response = self.Call("login", username=username, password=password)
+        if not response['ok']:
+            return self.ToResult(response), None
+
+        # Signing in again only fetches what changed while signed out, if the server still has it
+        self.Call("list", subscribe=True, since=self.seq)
+        return self.ToResult(response), response['user']
+
+    # Actions, the server checks them against its own state & pushes the outcome
+
+    def CreateLobby(self, user, name, required_rating):
+        """Create a lobby led by the signed in user"""
+        return self.ToResult(self.Call("create", name=name, required_rating=required_rating))
+
+    @Timed
+    def JoinLobby(self, user, lobby_id):
+        """Join a lobby"""
+        return self.ToResult(self.Call("join", lobby_id=lobby_id))
+
+    def LeaveLobby(self, user, lobby_id):
+        """Leave a lobby"""
+        return self.ToResult(self.Call("leave", lobby_id=lobby_id))
+
+    def DeleteLobby(self, user, lobby_id):
+        """Delete a lobby (leader only)"""
+        return self.ToResult(self.Call("delete", lobby_id=lobby_id))
+
+    # Solo queue, the same calls SoloQueue offers, the lobby it forms arrives as a push
+
+    def Enqueue(self, user):
+        """Put the signed in user into the server's solo queue"""
+        return self.ToResult(self.Call("queue"))
+
+    def Dequeue(self, username):
+        """Take the signed in user out of the server's solo queue"""
+        return self.ToResult(self.Call("dequeue"))
+
+    def Close(self):
+        """Disconnect from the server"""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
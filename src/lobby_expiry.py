@@ -0,0 +1,184 @@
+import heapq
+import os
+import time
+from datetime import datetime
+from src.lobby_service import DPS_SLOTS, LobbyMembers
+from src.ticker import Ticker
+
+# Seconds, None turns a rule off
+DEFAULT_TTL = 4 * 60 * 60
+DEFAULT_IDLE = 30 * 60
+DEFAULT_EMPTY = 60
+# Members of a full lobby, one that is playing is never idle
+FULL_LOBBY = 2 + DPS_SLOTS
+# Environment variables with each rule's seconds, unset or 0 turns it off
+RULE_VARIABLES = {"ttl": "WOW_LOBBY_TTL", "idle": "WOW_LOBBY_IDLE", "empty": "WOW_LOBBY_EMPTY"}
+# Lobbies evicted per commit, callers wait for at most one batch
+DEFAULT_BATCH = 100
+REASONS = ("ttl", "idle", "empty")
+
+
+def CreatedAt(lobby, default):
+    """A lobby's created_at as a timestamp, default when it can't be read"""
+    try:
+        return datetime.fromisoformat(lobby['created_at']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+def RulesFromEnv(environ=os.environ):
+    """{rule: seconds or None} from WOW_LOBBY_TTL, WOW_LOBBY_IDLE & WOW_LOBBY_EMPTY, every rule off by default"""
+    return {rule: float(environ.get(variable) or 0) or None for rule, variable in RULE_VARIABLES.items()}
+
+
+class LobbyExpiry:
+    """Evicts lobbies past their TTL, idle for too long while not full or left empty, from a heap of deadlines
+
+    Every commit the service makes passes through OnCommit, which reschedules the
+    lobbies it touched. Sweeping pops whatever is due, a batch per commit.
+    """
+
+    def __init__(self, service, ttl=DEFAULT_TTL, idle=DEFAULT_IDLE, empty=DEFAULT_EMPTY,
+                 batch=DEFAULT_BATCH, clock=time.time):
+        self.service = service
+        self.ttl = ttl
+        self.idle = idle
+        self.empty = empty
+        self.batch = batch
+        self.clock = clock
+        # The service's lock, commits & sweeps never see each other half done
+        self.lock = service.lock
+        # lobby_id -> what we last saw of it: members, created, last activity, when it became empty
+        self.members = {}
+        self.created = {}
+        self.active = {}
+        self.emptied = {}
+        # lobby_id -> (deadline, reason), the heap may still hold older deadlines, skipped when popped
+        self.deadlines = {}
+        self.heap = []
+        self.evicted = dict.fromkeys(REASONS, 0)
+        self.sweeps = 0
+        self.ticker = None
+        # Lobbies are first loaded by the first sweep, so building this never delays a launch
+        self.built = False
+        service.Subscribe(self.OnCommit)
+
+    def Deadline(self, lobby_id):
+        """(when the lobby expires, which rule expires it), (None, None) when no rule applies"""
+        candidates = []
+        if self.ttl is not None:
+            candidates.append((self.created[lobby_id] + self.ttl, "ttl"))
+        if self.idle is not None and len(self.members[lobby_id]) < FULL_LOBBY:
+            candidates.append((self.active[lobby_id] + self.idle, "idle"))
+        if self.empty is not None and self.emptied[lobby_id] is not None:
+            candidates.append((self.emptied[lobby_id] + self.empty, "empty"))
+        return min(candidates) if candidates else (None, None)
+
+    def Observe(self, lobby_id, lobby, now):
+        """Note a lobby's current state & reschedule it, a change of members counts as activity"""
+        members = tuple(LobbyMembers(lobby))
+        if lobby_id not in self.members:
+            self.created[lobby_id] = CreatedAt(lobby, now)
+            # Activity before we first saw it is unknown, idle time counts from now
+            self.active[lobby_id] = now
+            self.emptied[lobby_id] = None
+        elif members != self.members[lobby_id]:
+            self.active[lobby_id] = now
+        self.members[lobby_id] = members
+        if members:
+            self.emptied[lobby_id] = None
+        elif self.emptied[lobby_id] is None:
+            self.emptied[lobby_id] = now
+
+        deadline = self.deadlines[lobby_id] = self.Deadline(lobby_id)
+        if deadline[0] is not None:
+            heapq.heappush(self.heap, (deadline[0], lobby_id))
+        # Rescheduling leaves the old entries behind, start over once they outnumber the live ones
+        if len(self.heap) > 2 * len(self.deadlines) + 1024:
+            self.Reheap()
+
+    def Forget(self, lobby_id):
+        """Stop tracking a deleted lobby"""
+        for state in (self.members, self.created, self.active, self.emptied, self.deadlines):
+            state.pop(lobby_id, None)
+
+    def Reheap(self):
+        """Heap of only the current deadlines"""
+        self.heap = [(deadline, lobby_id) for lobby_id, (deadline, _) in self.deadlines.items()
+                     if deadline is not None]
+        heapq.heapify(self.heap)
+
+    def Rebuild(self):
+        """Catch up with every lobby the service has, keeping what we know of unchanged ones"""
+        now = self.clock()
+        lobbies = self.service.LoadLobbies()
+        for lobby_id in [lobby_id for lobby_id in self.members if lobby_id not in lobbies]:
+            self.Forget(lobby_id)
+        for lobby_id, lobby in lobbies.items():
+            self.Observe(lobby_id, lobby, now)
+        self.Reheap()
+        self.built = True
+
+    def OnCommit(self, mutations):
+        """Service listener, reschedules every lobby a commit touched"""
+        if mutations is None:
+            self.Rebuild()
+            return
+        if not self.built:
+            # The first sweep's Rebuild sees this commit
+            return
+        now = self.clock()
+        for lobby_id in {mutation['lobby_id'] for mutation in mutations}:
+            lobby = self.service.lobbies.get(lobby_id)
+            if lobby is None:
+                self.Forget(lobby_id)
+            else:
+                self.Observe(lobby_id, lobby, now)
+
+    def SweepBatch(self):
+        """Evict up to batch due lobbies in one commit, returns how many were due"""
+        with self.lock:
+            # Catch up with other processes' commits before trusting the deadlines
+            self.service.Sync()
+            if not self.built:
+                self.Rebuild()
+            now = self.clock()
+            due = []
+            while self.heap and self.heap[0][0] <= now and len(due) < self.batch:
+                deadline, lobby_id = heapq.heappop(self.heap)
+                current, reason = self.deadlines.get(lobby_id, (None, None))
+                if current == deadline:
+                    due.append((lobby_id, reason))
+            if due:
+                results = self.service.ExpireMany([(lobby_id,) for lobby_id, _ in due])
+                for (_, reason), result in zip(due, results):
+                    if result.ok:
+                        self.evicted[reason] += 1
+            self.sweeps += 1
+            return len(due)
+
+    def Sweep(self):
+        """Evict everything due, a batch at a time so others get the lock in between, returns how many"""
+        total = 0
+        while True:
+            count = self.SweepBatch()
+            total += count
+            if count < self.batch:
+                return total
+
+    def Stats(self):
+        """Evictions per rule & how many lobbies are tracked"""
+        with self.lock:
+            return {**self.evicted, "evicted": sum(self.evicted.values()), "tracked": len(self.deadlines),
+                    "sweeps": self.sweeps}
+
+    def Start(self, interval=1.0):
+        """Run Sweep on a fixed-rate background ticker"""
+        self.ticker = Ticker(interval, self.Sweep)
+        self.ticker.start()
+
+    def Stop(self):
+        """Stop the ticker, waits for a running sweep to finish"""
+        if self.ticker is not None:
+            self.ticker.Stop()
+            self.ticker = None
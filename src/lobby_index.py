@@ -0,0 +1,239 @@
+import sys
+from bisect import bisect_left, bisect_right, insort
+from collections import namedtuple
+
+ROLES = ("Tank", "Healer", "DPS")
+
+
+def OpenRoles(lobby):
+    """Roles that still have at least one free slot in the lobby"""
+    members = lobby['members']
+    roles = []
+    if members['Tank'] is None:
+        roles.append("Tank")
+    if members['Healer'] is None:
+        roles.append("Healer")
+    if None in members['DPS']:
+        roles.append("DPS")
+    return roles
+
+
+class OpenSlotIndex:
+    """Per role, the lobbies with an open slot of that role sorted by required_rating"""
+
+    def __init__(self):
+        # role -> sorted list of (required_rating, lobby_id)
+        self.by_role = {role: [] for role in ROLES}
+        # lobby_id -> (required_rating, roles it is listed under)
+        self.indexed = {}
+
+    def Build(self, lobbies):
+        """Rebuild the whole index from a lobbies dict"""
+        self.Clear()
+        for lobby_id, lobby in lobbies.items():
+            self.Add(lobby_id, lobby)
+        self.Sort()
+
+    def Clear(self):
+        """Empty the index, Add every lobby & Sort once to refill it"""
+        self.by_role = {role: [] for role in ROLES}
+        self.indexed = {}
+
+    def Add(self, lobby_id, lobby):
+        """List one lobby while refilling, the role lists are unsorted until Sort"""
+        roles = OpenRoles(lobby)
+        key = (lobby['required_rating'], lobby_id)
+        for role in roles:
+            self.by_role[role].append(key)
+        self.indexed[lobby_id] = (lobby['required_rating'], tuple(roles))
+
+    def Sort(self):
+        """Sort the role lists once every lobby is added"""
+        for entries in self.by_role.values():
+            entries.sort()
+
+    def Update(self, lobby_id, lobby):
+        """Re-list one lobby after its slots or rating changed"""
+        roles = tuple(OpenRoles(lobby))
+        rating = lobby['required_rating']
+        old = self.indexed.get(lobby_id)
+        if old == (rating, roles):
+            return
+
+        if old is not None:
+            self.Unlist(lobby_id, *old)
+        for role in roles:
+            insort(self.by_role[role], (rating, lobby_id))
+        self.indexed[lobby_id] = (rating, roles)
+
+    def Remove(self, lobby_id):
+        """Drop a deleted lobby from the index"""
+        old = self.indexed.pop(lobby_id, None)
+        if old is not None:
+            self.Unlist(lobby_id, *old)
+
+    def Unlist(self, lobby_id, rating, roles):
+        """Remove one lobby's entries from the role lists"""
+        key = (rating, lobby_id)
+        for role in roles:
+            entries = self.by_role[role]
+            i = bisect_left(entries, key)
+            if i < len(entries) and entries[i] == key:
+                del entries[i]
+
+    def Query(self, role, max_rating):
+        """Lobby ids with an open slot of role and required_rating <= max_rating, in O(log n + k)"""
+        entries = self.by_role[role]
+        # Ratings are ints, so (max_rating + 1,) sorts right after every key with rating <= max_rating
+        end = bisect_left(entries, (max_rating + 1,))
+        return [lobby_id for _, lobby_id in entries[:end]]
+
+    def Count(self, role):
+        """How many lobbies have an open slot of role"""
+        return len(self.by_role[role])
+
+
+# Lobbies per page of a search
+PAGE_SIZE = 50
+
+# What a search matches, every field left at its default matches any lobby
+LobbyQuery = namedtuple("LobbyQuery", ["prefix", "min_rating", "max_rating", "role", "leader"],
+                        defaults=["", None, None, None, None])
+
+
+def NameKey(name):
+    """How names are compared & sorted, case-insensitively"""
+    return name.casefold()
+
+
+def PrefixEnd(prefix):
+    """The smallest key sorting after every key that starts with prefix, None when no key does"""
+    # The last code point can't be bumped, carry over to the one before it instead
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+class LobbySearchIndex:
+    """Every lobby sorted by name & by required_rating, plus the lobbies of each leader"""
+
+    def __init__(self):
+        # sorted (name key, lobby_id) & (required_rating, lobby_id)
+        self.by_name = []
+        self.by_rating = []
+        # leader -> lobby ids they lead
+        self.by_leader = {}
+        # lobby_id -> (name key, required_rating, leader) it is listed under
+        self.indexed = {}
+
+    def Build(self, lobbies):
+        """Rebuild the whole index from a lobbies dict"""
+        self.Clear()
+        for lobby_id, lobby in lobbies.items():
+            self.Add(lobby_id, lobby)
+        self.Sort()
+
+    def Clear(self):
+        """Empty the index, Add every lobby & Sort once to refill it"""
+        self.indexed = {}
+
+    def Add(self, lobby_id, lobby):
+        """Note one lobby while refilling, it is only listed by Sort"""
+        self.indexed[lobby_id] = (NameKey(lobby['name']), lobby['required_rating'], lobby['leader'])
+
+    def Sort(self):
+        """List every lobby added since Clear"""
+        self.by_name = sorted((name, lobby_id) for lobby_id, (name, _, _) in self.indexed.items())
+        self.by_rating = sorted((rating, lobby_id) for lobby_id, (_, rating, _) in self.indexed.items())
+        self.by_leader = {}
+        for lobby_id, (_, _, leader) in self.indexed.items():
+            self.by_leader.setdefault(leader, set()).add(lobby_id)
+
+    def Update(self, lobby_id, lobby):
+        """List a new lobby or re-list one whose name, rating or leader changed"""
+        entry = (NameKey(lobby['name']), lobby['required_rating'], lobby['leader'])
+        old = self.indexed.get(lobby_id)
+        if old == entry:
+            return
+        if old is not None:
+            self.Unlist(lobby_id, *old)
+        name, rating, leader = entry
+        insort(self.by_name, (name, lobby_id))
+        insort(self.by_rating, (rating, lobby_id))
+        self.by_leader.setdefault(leader, set()).add(lobby_id)
+        self.indexed[lobby_id] = entry
+
+    def Remove(self, lobby_id):
+        """Drop a deleted lobby from the index"""
+        old = self.indexed.pop(lobby_id, None)
+        if old is not None:
+            self.Unlist(lobby_id, *old)
+
+    def Unlist(self, lobby_id, name, rating, leader):
+        """Remove one lobby's entries from the sorted lists & its leader's set"""
+        for entries, key in ((self.by_name, (name, lobby_id)), (self.by_rating, (rating, lobby_id))):
+            i = bisect_left(entries, key)
+            if i < len(entries) and entries[i] == key:
+                del entries[i]
+        led = self.by_leader.get(leader)
+        if led is not None:
+            led.discard(lobby_id)
+            if not led:
+                del self.by_leader[leader]
+
+
+def Matches(lobby, query):
+    """Whether a lobby passes every filter of query"""
+    if query.prefix and not NameKey(lobby['name']).startswith(NameKey(query.prefix)):
+        return False
+    if query.min_rating is not None and lobby['required_rating'] < query.min_rating:
+        return False
+    if query.max_rating is not None and lobby['required_rating'] > query.max_rating:
+        return False
+    if query.role is not None and query.role not in OpenRoles(lobby):
+        return False
+    return query.leader is None or lobby['leader'] == query.leader
+
+
+def Search(search_index, slot_index, lobbies, query, after=None, limit=PAGE_SIZE):
+    """One page of lobby ids matching query & the cursor to pass as after for the next page, None on the last
+
+    A name prefix pages through the names starting with it in name order, anything else
+    through the rating range in rating order, both from a bisect, so a page costs
+    O(log n + limit) plus whatever a prefix search skips for failing the other filters.
+    The cursor is the sort key of the page's last lobby, only handed out when another
+    match follows it. Lobbies added or removed meanwhile never make a page repeat or
+    skip the others.
+    """
+    if query.leader is not None:
+        # A leader leads a handful of lobbies at most, sorting them is cheap
+        entries = sorted((NameKey(lobbies[lobby_id]['name']), lobby_id)
+                         for lobby_id in search_index.by_leader.get(query.leader, ()))
+        start, stop = 0, len(entries)
+    elif query.prefix:
+        prefix = NameKey(query.prefix)
+        entries = search_index.by_name
+        start = bisect_left(entries, (prefix,))
+        end = PrefixEnd(prefix)
+        stop = len(entries) if end is None else bisect_left(entries, (end,))
+    else:
+        # Lobbies with an open slot of a role are already kept sorted by rating
+        entries = slot_index.by_role[query.role] if query.role is not None else search_index.by_rating
+        start = 0 if query.min_rating is None else bisect_left(entries, (query.min_rating,))
+        # Ratings are ints, so (max_rating + 1,) sorts right after every key with rating <= max_rating
+        stop = len(entries) if query.max_rating is None else bisect_left(entries, (query.max_rating + 1,))
+    if after is not None:
+        start = max(start, bisect_right(entries, tuple(after)))
+
+    # One match past the page tells whether there is a next page at all
+    page = []
+    i = start
+    while i < stop and len(page) <= limit:
+        key = entries[i]
+        i += 1
+        if Matches(lobbies[key[1]], query):
+            page.append(key)
+    more = len(page) > limit
+    page = page[:limit]
+    return [lobby_id for _, lobby_id in page], (list(page[-1]) if more else None)
@@ -0,0 +1,205 @@
+import tkinter as tk
+from tkinter import ttk
+from src.lobby_service import DiffVersions
+from src.metrics import Timed
+
+# Every row has the same layout, so rows can sit at index * ROW_HEIGHT on the canvas
+ROW_HEIGHT = 200
+# Extra rows kept rendered above & below the viewport so fast scrolling doesn't flash empty space
+OVERSCAN = 2
+# Parked rows sit above the scrollregion, where the canvas never scrolls to
+PARKED_Y = -10 * ROW_HEIGHT
+
+
+class LobbyRow:
+    """One reusable lobby row, built once and re-filled for whichever lobby scrolls into it"""
+
+    def __init__(self, canvas, app):
+        self.app = app
+        self.lobby_id = None
+        self.version = None
+        self.index = None
+
+        self.frame = tk.Frame(canvas, relief="ridge", bd=2)
+        self.window_id = canvas.create_window(0, PARKED_Y, window=self.frame, anchor="nw",
+                                              height=ROW_HEIGHT - 10)
+
+        # Lobby info
+        info_frame = tk.Frame(self.frame)
+        info_frame.pack(fill='x', padx=10, pady=5)
+
+        self.name_label = tk.Label(info_frame, font=("Arial", 12, "bold"))
+        self.name_label.pack(anchor='w')
+        self.leader_label = tk.Label(info_frame, font=("Arial", 10))
+        self.leader_label.pack(anchor='w')
+        self.rating_label = tk.Label(info_frame, font=("Arial", 10))
+        self.rating_label.pack(anchor='w')
+
+        # Members info
+        members_frame = tk.Frame(self.frame)
+        members_frame.pack(fill='x', padx=10, pady=5)
+
+        tk.Label(members_frame, text="Members:", font=("Arial", 10, "bold")).pack(anchor='w')
+        self.tank_label = tk.Label(members_frame)
+        self.tank_label.pack(anchor='w')
+        self.healer_label = tk.Label(members_frame)
+        self.healer_label.pack(anchor='w')
+        self.dps_label = tk.Label(members_frame)
+        self.dps_label.pack(anchor='w')
+
+        # Buttons, only one of the action button & the reason label is shown at a time
+        button_frame = tk.Frame(self.frame)
+        button_frame.pack(fill='x', padx=10, pady=5)
+
+        self.action_button = tk.Button(button_frame, fg="white", command=self.OnAction)
+        self.reason_label = tk.Label(button_frame, fg="red")
+        self.action = None
+
+    @Timed
+    def Show(self, index, lobby_id, lobby, version):
+        """Fill the row with a lobby"""
+        self.index = index
+        self.lobby_id = lobby_id
+        self.version = version
+
+        self.name_label.config(text=f"Lobby: {lobby['name']}")
+        self.leader_label.config(text=f"Leader: {lobby['leader']}")
+        self.rating_label.config(text=f"Required Rating: {lobby['required_rating']}")
+
+        tank = lobby['members']['Tank'] or "Empty"
+        healer = lobby['members']['Healer'] or "Empty"
+        dps_list = [member or "Empty" for member in lobby['members']['DPS']]
+
+        self.tank_label.config(text=f"Tank: {tank}")
+        self.healer_label.config(text=f"Healer: {healer}")
+        self.dps_label.config(text=f"DPS: {', '.join(dps_list)}")
+
+        # Check if user can join
+        is_leader = lobby['leader'] == self.app.current_user['username']
+        if is_leader:
+            self.ShowAction(self.app.DeleteLobby, "Delete Lobby", "red")
+        elif self.app.IsMemberOfLobby(lobby):
+            self.ShowAction(self.app.LeaveLobby, "Leave Lobby", "orange")
+        elif self.app.CanJoinLobby(lobby):
+            self.ShowAction(self.app.JoinLobby, "Join Lobby", "blue")
+        else:
+            self.action = None
+            self.action_button.pack_forget()
+            self.reason_label.config(text=f"Cannot join: {self.app.JoinRestrictionReason(lobby)}")
+            self.reason_label.pack(side='left', padx=5)
+
+    def ShowAction(self, action, text, color):
+        """Show the action button instead of the reason label"""
+        self.action = action
+        self.reason_label.pack_forget()
+        self.action_button.config(text=text, bg=color)
+        self.action_button.pack(side='left', padx=5)
+
+    def OnAction(self):
+        """Run the button's action on the lobby the row shows right now"""
+        if self.action is not None:
+            self.action(self.lobby_id)
+
+
+class VirtualLobbyList:
+    """Scrollable lobby list that only renders the rows in view, recycling a small pool of rows"""
+
+    def __init__(self, parent, app):
+        self.app = app
+        # Lobby ids of the page in display order, plus its lobbies & the version stamps the next page is diffed against
+        self.items = []
+        self.lobbies = {}
+        self.versions = {}
+        self.rows = []
+
+        self.frame = tk.Frame(parent)
+        self.canvas = tk.Canvas(self.frame, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.OnScroll, yscrollincrement=ROW_HEIGHT // 4)
+
+        self.empty_label = tk.Label(self.frame, text="No lobbies available", font=("Arial", 12))
+
+        self.canvas.bind("<Configure>", lambda e: self.Render())
+        self.canvas.bind("<Enter>", lambda e: self.BindWheel(True))
+        self.canvas.bind("<Leave>", lambda e: self.BindWheel(False))
+
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.pack(side="left", fill="both", expand=True)
+
+    def BindWheel(self, active):
+        """Scroll with the mouse wheel while the pointer is over the list"""
+        if active:
+            # Windows reports multiples of 120 & macOS small deltas, only the direction is the same
+            self.canvas.bind_all("<MouseWheel>", lambda e: self.canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+            self.canvas.bind_all("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+            self.canvas.bind_all("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+        else:
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+                self.canvas.unbind_all(sequence)
+
+    def ShowPage(self, page, versions):
+        """Show exactly these (lobby_id, lobby) pairs in this order, returns how many were added, removed or changed
+
+        The version stamps are diffed against the page shown before, rows of lobbies that
+        kept their place & stamp are left alone.
+        """
+        added, removed, changed = DiffVersions(self.versions, versions)
+        items = [lobby_id for lobby_id, _ in page]
+        moved = items != self.items
+        self.items = items
+        self.lobbies = dict(page)
+        self.versions = versions
+
+        if self.items:
+            self.empty_label.place_forget()
+        else:
+            self.empty_label.place(relx=0.5, y=20, anchor="n")
+
+        if added or removed:
+            self.canvas.configure(scrollregion=(0, 0, 0, len(self.items) * ROW_HEIGHT))
+        if moved or changed:
+            self.Render()
+        return len(added) + len(removed) + len(changed)
+
+    def OnScroll(self, first, last):
+        """Canvas scrolled, move the scrollbar & re-assign rows"""
+        self.scrollbar.set(first, last)
+        self.Render()
+
+    def Render(self):
+        """Point the row pool at the lobbies currently in the viewport (plus overscan)"""
+        height = max(self.canvas.winfo_height(), ROW_HEIGHT)
+        width = max(self.canvas.winfo_width(), 1)
+        top = int(self.canvas.canvasy(0))
+
+        first = max(top // ROW_HEIGHT - OVERSCAN, 0)
+        last = min((top + height) // ROW_HEIGHT + 1 + OVERSCAN, len(self.items))
+
+        # The pool only grows to what the viewport needs, never with the lobby count
+        while len(self.rows) < last - first:
+            self.rows.append(LobbyRow(self.canvas, self.app))
+
+        # Rows already showing an index in range keep it, the rest get recycled
+        wanted = set(range(first, last))
+        kept = {row.index: row for row in self.rows if row.index in wanted}
+        free = [row for row in self.rows if row.index not in kept]
+
+        for index in range(first, last):
+            lobby_id = self.items[index]
+            version = self.versions[lobby_id]
+            row = kept.get(index)
+            if row is None:
+                row = free.pop()
+            # Only rows whose lobby or version changed get their labels & button redone
+            if row.index != index or row.lobby_id != lobby_id or row.version != version:
+                row.Show(index, lobby_id, self.lobbies[lobby_id], version)
+            self.canvas.coords(row.window_id, 5, index * ROW_HEIGHT + 5)
+            self.canvas.itemconfigure(row.window_id, width=width - 10)
+
+        for row in free:
+            row.index = None
+            self.canvas.coords(row.window_id, 5, PARKED_Y)
+
+    def WidgetCount(self):
+        """How many row widgets exist, stays flat no matter how many lobbies there are"""
+        return len(self.rows)
@@ -0,0 +1,173 @@
+import heapq
+from datetime import datetime
+from src.lobby_service import DPS_SLOTS
+
+# Lobbies that only the AI gets to see, the rest never reach the prompt
+DEFAULT_TOP_K = 10
+# Rough token budget for the lobby lines of the prompt
+DEFAULT_TOKEN_BUDGET = 600
+
+# How much each part of the score weighs, all parts are scaled to 0..1
+RATING_WEIGHT = 0.4
+FILL_WEIGHT = 0.3
+ROLE_WEIGHT = 0.2
+AGE_WEIGHT = 0.1
+# A lobby this many points below the player's rating scores half the rating fit of a perfect match
+RATING_SCALE = 250
+# Waiting longer than this gives no extra age bonus
+AGE_CAP_SECONDS = 30 * 60
+SLOTS = 2 + DPS_SLOTS
+# Digits of the largest rating difference a prompt line can show
+MAX_RATING_DIGITS = 4
+
+
+def OpenSlots(lobby):
+    """Empty seats, split into tank/healer & DPS"""
+    members = lobby['members']
+    specials = (members['Tank'] is None) + (members['Healer'] is None)
+    return specials, members['DPS'].count(None)
+
+
+def AgeSeconds(lobby, now):
+    """Seconds since the lobby was created, 0 when created_at is missing or unreadable"""
+    try:
+        created = datetime.fromisoformat(lobby['created_at'])
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+    return max((now - created).total_seconds(), 0.0)
+
+
+def ScoreLobby(user, lobby, now):
+    """Higher is better: close rating, nearly full, needs few roles, waiting a while"""
+    rating_diff = user['rating'] - lobby['required_rating']
+    rating_fit = 1 / (1 + max(rating_diff, 0) / RATING_SCALE)
+
+    specials, dps = OpenSlots(lobby)
+    open_slots = specials + dps
+    # A nearly full lobby starts sooner once the player joins
+    fill = (SLOTS - open_slots) / (SLOTS - 1)
+    # The player's role being the last thing missing makes them the one the lobby waits for
+    roles_needed = (specials > 0) + (dps > 0)
+    role_fit = 1 / roles_needed if roles_needed else 0.0
+
+    age = min(AgeSeconds(lobby, now), AGE_CAP_SECONDS) / AGE_CAP_SECONDS
+
+    return (RATING_WEIGHT * rating_fit + FILL_WEIGHT * fill
+            + ROLE_WEIGHT * role_fit + AGE_WEIGHT * age)
+
+
+class Reverse:
+    """Inverts the ordering of a lobby id so equal scores rank by ascending id"""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+def RankLobbies(user, lobbies, lobby_ids, top_k=DEFAULT_TOP_K, now=None):
+    """The top_k best (score, lobby_id) pairs, best first, ties broken by lobby id"""
+    now = now or datetime.now()
+    scored = ((ScoreLobby(user, lobbies[lobby_id], now), lobby_id) for lobby_id in lobby_ids)
+    # nlargest keeps a heap of top_k, so ranking stays O(n log k) however many lobbies there are
+    return heapq.nlargest(top_k, scored, key=lambda entry: (entry[0], Reverse(entry[1])))
+
+
+def EstimateTokens(text):
+    """About four characters per token, good enough to bound the prompt"""
+    return len(text) // 4 + 1
+
+
+def FitToBudget(lines, token_budget=DEFAULT_TOKEN_BUDGET):
+    """The leading lines that fit into token_budget, always at least one"""
+    kept = []
+    used = 0
+    for line in lines:
+        used += EstimateTokens(line) + 1
+        if kept and used > token_budget:
+            break
+        kept.append(line)
+    return kept
+
+
+def RolesNeeded(lobby):
+    """Open roles the way the prompt lists them"""
+    _, dps = OpenSlots(lobby)
+    roles_needed = []
+    if lobby['members']['Tank'] is None:
+        roles_needed.append("Tank")
+    if lobby['members']['Healer'] is None:
+        roles_needed.append("Healer")
+    if dps > 0:
+        roles_needed.append(f"{dps} DPS")
+    return ", ".join(roles_needed)
+
+
+def LocalSuggestion(user, lobbies, ranked):
+    """The ranker's pick in the same format the AI is asked for"""
+    if not ranked:
+        return "No suitable lobbies found for your rating and role."
+
+    score, lobby_id = ranked[0]
+    lobby = lobbies[lobby_id]
+    rating_diff = user['rating'] - lobby['required_rating']
+    specials, dps = OpenSlots(lobby)
+    reason = (f"Your rating is {rating_diff} above the requirement of {lobby['required_rating']}, "
+              f"{SLOTS - specials - dps} of {SLOTS} seats are taken and it still needs {RolesNeeded(lobby)}.")
+    runners_up = ", ".join(lobbies[other]['name'] for _, other in ranked[1:3])
+    if runners_up:
+        reason += f" Also worth a look: {runners_up}."
+    return f"Recommended: {lobby['name']}\nReason: {reason}"
+
+
+def LobbyLine(lobby):
+    """A lobby the way the prompt lists it, nothing in it depends on who asks"""
+    return (f"- {lobby['name']} (Leader: {lobby['leader']}) "
+            f"| Needs: {RolesNeeded(lobby)} "
+            f"| Req Rating: {lobby['required_rating']}")
+
+
+def RatingStatus(user, lobby):
+    """The player's rating against the lobby's requirement, e.g. +120"""
+    rating_diff = user['rating'] - lobby['required_rating']
+    return f"+{rating_diff}" if rating_diff >= 0 else f"{rating_diff}"
+
+
+def PromptLobbies(lobbies, ranked, token_budget=DEFAULT_TOKEN_BUDGET):
+    """[(lobby_id, line)] of the ranked lobbies that fit token_budget, best first, the same lines for every player"""
+    lines = [(lobby_id, LobbyLine(lobbies[lobby_id])) for _, lobby_id in ranked]
+    # Budgeted with the longest rating suffix BuildPrompt can add
+    kept = FitToBudget([f"{line} (Your rating: -{MAX_RATING_DIGITS * '0'})" for _, line in lines], token_budget)
+    return lines[:len(kept)]
+
+
+def BuildPrompt(user, lobbies, prompt_lobbies):
+    """The AI prompt for the PromptLobbies lines, each with the player's own rating against it"""
+    lobbies_text = "\n".join(f"{line} (Your rating: {RatingStatus(user, lobbies[lobby_id])})"
+                             for lobby_id, line in prompt_lobbies)
+
+    # Create optimized prompt
+    prompt = f"""
+[INST] As a World of Warcraft matchmaking expert, recommend the best lobby for this player:
+
+Player Info:
+- Role: {user['role']}
+- Rating: {user['rating']}
+
+Available Lobbies:
+{lobbies_text}
+
+Recommend ONE lobby and explain why in ten sentence.
+explain the roles of anybody in the game
+Format your response as:
+Recommended: [Lobby Name]
+Reason: [Brief explanation]
+[/INST]
+"""
+    return prompt
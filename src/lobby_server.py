@@ -0,0 +1,300 @@
+"""Lobby server: owns users & lobbies and pushes every change to subscribed clients
+
+One JSON object per line over TCP. Requests carry an id that the response echoes:
+    {"id": 1, "op": "login", "username": "...", "password": "..."}
+    {"id": 2, "op": "list", "subscribe": true, "since": 1718000000000123}
+    {"id": 3, "op": "join", "lobby_id": "..."}
+    {"id": 4, "op": "queue"}    (solo queue, "dequeue" leaves it, the lobby it forms arrives as a push)
+Pushes carry an event instead of an id:
+    {"event": "mutations", "since": 1718000000000123, "seq": 1718000000000125, "mutations": [...]}
+    {"event": "snapshot", "seq": 1718000000000126, "lobbies": {...}}
+Every mutation has a sequence number, a push or listing with since holds the ones in (since, seq].
+A list with since only sends what changed after it, or the whole lobbies dict if that's gone from the feed.
+
+Run from the repository root, then start the app with WOW_SERVER=127.0.0.1:7777:
+    python -m src.lobby_server --port 7777 --storage journal:data
+"""
+import argparse
+import asyncio
+import json
+import time
+from src.accounts import AccountService
+from src.backends import OpenServiceStorage, DEFAULT_STORAGE
+from src.change_feed import Changes
+from src.lobby_client import DEFAULT_PORT
+from src.lobby_expiry import LobbyExpiry, DEFAULT_TTL, DEFAULT_IDLE, DEFAULT_EMPTY
+from src.lobby_service import LobbyService
+from src.metrics import METRICS
+from src.solo_queue import SoloQueue
+
+# A client that lets this much output pile up unread is dropped instead of buffered forever
+MAX_BUFFERED = 4 * 1024 * 1024
+# Commits are pushed at most this often, so a burst of joins costs one fan-out instead of one each
+PUSH_INTERVAL = 0.02
+# Subscribers sent to per loop pass, requests get served in between the chunks of a big fan-out
+PUSH_CHUNK = 64
+# Seconds between expiry sweeps that found nothing left to evict
+SWEEP_INTERVAL = 1.0
+# Seconds between solo queue ticks
+QUEUE_INTERVAL = 1.0
+
+
+def Encode(message):
+    """One protocol line"""
+    return json.dumps(message, separators=(",", ":")).encode('utf-8') + b"\n"
+
+
+def ChangesMessage(since, changes):
+    """The protocol fields for a Changes, a snapshot when it has lobbies instead of mutations"""
+    if changes.lobbies is not None:
+        return {"seq": changes.seq, "lobbies": dict(changes.lobbies.items())}
+    return {"since": since, "seq": changes.seq, "mutations": changes.mutations}
+
+
+class Connection:
+    """One connected client: its writer & who it logged in as"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.user = None
+
+    def Send(self, data):
+        """Queue bytes for the client without waiting, slow readers get disconnected"""
+        if self.writer.is_closing():
+            return
+        self.writer.write(data)
+        if self.writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+            self.writer.close()
+
+
+class LobbyServer:
+    """Serves LobbyService & AccountService over JSON lines, everything runs on the event loop thread"""
+
+    def __init__(self, service, accounts, expiry=None, solo=None):
+        self.service = service
+        self.accounts = accounts
+        self.expiry = expiry
+        self.solo = solo
+        self.connections = set()
+        self.subscribers = set()
+        # Commits not pushed yet, sent together once the current requests have their responses
+        self.outbox = []
+        self.push_scheduled = False
+        # Grows to how long the last fan-out took, so pushes never take more than half the loop's time
+        self.push_delay = PUSH_INTERVAL
+        self.handlers = {
+            "register": self.Register,
+            "login": self.Login,
+            "list": self.List,
+            "create": self.Create,
+            "join": self.Join,
+            "leave": self.Leave,
+            "delete": self.Delete,
+            "queue": self.Queue,
+            "dequeue": self.Dequeue,
+        }
+        service.Subscribe(self.OnCommit)
+
+    async def Serve(self, host="127.0.0.1", port=DEFAULT_PORT):
+        """Start listening, returns the asyncio server"""
+        if self.expiry is not None:
+            asyncio.get_running_loop().call_later(SWEEP_INTERVAL, self.SweepExpired)
+        if self.solo is not None:
+            asyncio.get_running_loop().call_later(QUEUE_INTERVAL, self.TickQueue)
+        return await asyncio.start_server(self.Handle, host, port, backlog=4096)
+
+    def SweepExpired(self):
+        """Evict one batch of expired lobbies on the loop, the next batch right after any requests waiting"""
+        try:
+            full = self.expiry.SweepBatch() >= self.expiry.batch
+        except Exception as e:
+            print(f"Lobby expiry sweep failed: {e}", flush=True)
+            full = False
+        asyncio.get_running_loop().call_later(0 if full else SWEEP_INTERVAL, self.SweepExpired)
+
+    def TickQueue(self):
+        """Form whatever lobbies the solo queue can on the loop, subscribers get them in the next push"""
+        try:
+            self.solo.Tick()
+        except Exception as e:
+            print(f"Solo queue tick failed: {e}", flush=True)
+        asyncio.get_running_loop().call_later(QUEUE_INTERVAL, self.TickQueue)
+
+    async def Handle(self, reader, writer):
+        """Read requests off one connection until it closes"""
+        connection = Connection(writer)
+        self.connections.add(connection)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                connection.Send(Encode(self.Dispatch(connection, line)))
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # Reset by the peer or a line longer than the stream limit
+            pass
+        finally:
+            self.connections.discard(connection)
+            self.subscribers.discard(connection)
+            # Nobody is left to play in the lobby the queue would form
+            if self.solo is not None and connection.user is not None:
+                self.solo.Dequeue(connection.user['username'])
+            writer.close()
+
+    def Dispatch(self, connection, line):
+        """Run one request line, returns the response object"""
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            handler = self.handlers.get(request.get("op"))
+        except (ValueError, AttributeError):
+            return {"id": None, "ok": False, "message": "Malformed request!"}
+
+        if handler is None:
+            return {"id": request_id, "ok": False, "message": f"Unknown op: {request.get('op')}"}
+        if connection.user is None and handler not in (self.Register, self.Login):
+            return {"id": request_id, "ok": False, "message": "Please sign in first!"}
+
+        try:
+            response = handler(connection, request)
+        except KeyError as e:
+            response = {"ok": False, "message": f"Missing field: {e.args[0]}"}
+        except Exception as e:
+            response = {"ok": False, "message": f"Failed to save lobbies: {str(e)}"}
+        response["id"] = request_id
+        return response
+
+    def Reply(self, result):
+        """A lobby service Result as a response object"""
+        return {"ok": result.ok, "message": result.message, "lobby_id": result.lobby_id}
+
+    def Register(self, connection, request):
+        """Create an account"""
+        return self.Reply(self.accounts.Register(request['username'], request['password'], request['email'],
+                                                 request['role'], request['rating']))
+
+    def Login(self, connection, request):
+        """Sign the connection in as a user"""
+        result, user = self.accounts.Login(request['username'], request['password'])
+        connection.user = user
+        response = self.Reply(result)
+        if user is not None:
+            response["user"] = {key: value for key, value in user.items() if key != "password"}
+        return response
+
+    def List(self, connection, request):
+        """Lobbies changed since the client's seq (all of them without one), optionally subscribing to pushes"""
+        since = request.get("since")
+        changes = self.service.ChangesSince(-1 if since is None else int(since))
+        if request.get("subscribe"):
+            # Every commit after this listing reaches the client in a later push
+            self.subscribers.add(connection)
+        return {"ok": True, "message": "", **ChangesMessage(since, changes)}
+
+    def Create(self, connection, request):
+        """Create a lobby led by the signed in user"""
+        return self.Reply(self.service.CreateLobby(connection.user, request['name'], int(request['required_rating'])))
+
+    def Join(self, connection, request):
+        """Join a lobby"""
+        return self.Reply(self.service.JoinLobby(connection.user, request['lobby_id']))
+
+    def Leave(self, connection, request):
+        """Leave a lobby"""
+        return self.Reply(self.service.LeaveLobby(connection.user, request['lobby_id']))
+
+    def Delete(self, connection, request):
+        """Delete a lobby (leader only)"""
+        return self.Reply(self.service.DeleteLobby(connection.user, request['lobby_id']))
+
+    def Queue(self, connection, request):
+        """Put the signed in user into the solo queue"""
+        if self.solo is None:
+            return {"ok": False, "message": "This server has no solo queue!"}
+        return self.Reply(self.solo.Enqueue(connection.user))
+
+    def Dequeue(self, connection, request):
+        """Take the signed in user out of the solo queue"""
+        if self.solo is None:
+            return {"ok": False, "message": "This server has no solo queue!"}
+        return self.Reply(self.solo.Dequeue(connection.user['username']))
+
+    def OnCommit(self, mutations):
+        """Queue a commit for the next push, the response to the request that made it goes out first"""
+        if not self.subscribers:
+            # Later subscribers list after this commit, & the outbox must stay a contiguous run of seqs
+            self.outbox.clear()
+            return
+        self.outbox.append(mutations)
+        self.SchedulePush()
+
+    def SchedulePush(self):
+        """Push the outbox after push_delay, unless a push is already scheduled or still sending"""
+        if not self.push_scheduled and self.outbox:
+            self.push_scheduled = True
+            asyncio.get_running_loop().call_later(self.push_delay, self.Push)
+
+    def Push(self):
+        """Send every queued commit as one push, encoded once however many subscribers there are"""
+        outbox, self.outbox = self.outbox, []
+        seq = self.service.feed.seq
+        if any(mutations is None for mutations in outbox):
+            data = Encode({"event": "snapshot", **ChangesMessage(None, Changes(seq, None, self.service.lobbies))})
+        else:
+            mutations = [mutation for batch in outbox for mutation in batch]
+            # Every commit went through OnCommit, so the outbox holds exactly the newest seqs
+            since = seq - len(mutations)
+            data = Encode({"event": "mutations", **ChangesMessage(since, Changes(seq, mutations, None))})
+        self.SendChunk(list(self.subscribers), 0, data, time.monotonic())
+
+    def SendChunk(self, connections, start, data, started):
+        """Send one push to PUSH_CHUNK subscribers & schedule the rest behind whatever else is ready"""
+        for connection in connections[start:start + PUSH_CHUNK]:
+            connection.Send(data)
+        if start + PUSH_CHUNK < len(connections):
+            asyncio.get_running_loop().call_soon(self.SendChunk, connections, start + PUSH_CHUNK, data, started)
+            return
+
+        self.push_delay = max(PUSH_INTERVAL, time.monotonic() - started)
+        self.push_scheduled = False
+        self.SchedulePush()
+
+
+async def Main(args):
+    storage = OpenServiceStorage(args.storage)
+    storage.InitDataFiles()
+    service = LobbyService(storage)
+    # 0 turns a rule off
+    expiry = LobbyExpiry(service, ttl=args.lobby_ttl or None, idle=args.idle_timeout or None,
+                         empty=args.empty_timeout or None)
+    server = LobbyServer(service, AccountService(storage), expiry, SoloQueue(service))
+    if args.metrics_port:
+        METRICS.SetEnabled(True)
+        METRICS.Serve(args.metrics_port, args.host)
+    listener = await server.Serve(args.host, args.port)
+    # Port 0 picks a free port, print the one we got
+    port = listener.sockets[0].getsockname()[1]
+    print(f"Lobby server listening on {args.host}:{port} ({args.storage})", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        storage.Close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lobby server with push updates")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--storage", default=DEFAULT_STORAGE)
+    parser.add_argument("--lobby-ttl", type=float, default=DEFAULT_TTL, help="seconds a lobby may exist, 0 for ever")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE,
+                        help="seconds without a join or leave before a lobby goes, 0 for never")
+    parser.add_argument("--empty-timeout", type=float, default=DEFAULT_EMPTY,
+                        help="seconds an empty lobby is kept, 0 for ever")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="serve Prometheus metrics on this port, 0 for off")
+    try:
+        asyncio.run(Main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
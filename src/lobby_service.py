@@ -0,0 +1,483 @@
+from collections import namedtuple
+from datetime import datetime
+from src.change_feed import ChangeFeed, Changes
+from src.lobby_index import LobbySearchIndex, OpenSlotIndex, Search, PAGE_SIZE
+from src.metrics import Timed
+from src.model import LobbyTable, DPS_SLOTS
+from src.storage import ConflictError, Thaw
+
+MIN_RATING = 0
+MAX_RATING = 4000
+# How often a batch is redone when a storage reports a concurrent change
+COMMIT_ATTEMPTS = 10
+
+# Outcome of a single lobby action, `message` is what the UI shows to the player
+Result = namedtuple("Result", ["ok", "message", "lobby_id"])
+
+
+def NewLobby(name, leader, required_rating, created_at=None):
+    """Build an empty lobby record in the lobbies.json shape"""
+    return {
+        "name": name,
+        "leader": leader,
+        "required_rating": required_rating,
+        "members": {
+            "Tank": None,
+            "Healer": None,
+            "DPS": [None] * DPS_SLOTS
+        },
+        "created_at": created_at or datetime.now().isoformat()
+    }
+
+
+def CanJoinLobby(user, lobby):
+    """Check if user can join the lobby"""
+    # Check rating requirement
+    if user['rating'] < lobby['required_rating']:
+        return False
+
+    # Check if role slot is available
+    role = user['role']
+    if role == "DPS":
+        return None in lobby['members']['DPS']
+    else:
+        return lobby['members'][role] is None
+
+
+def IsMemberOfLobby(user, lobby):
+    """Check if user is already a member of the lobby"""
+    username = user['username']
+    if lobby['members']['Tank'] == username or lobby['members']['Healer'] == username:
+        return True
+    return username in lobby['members']['DPS']
+
+
+def JoinRestrictionReason(user, lobby):
+    """Get the reason why user cannot join the lobby"""
+    if user['rating'] < lobby['required_rating']:
+        return "Rating too low"
+
+    role = user['role']
+    if role == "DPS":
+        if None not in lobby['members']['DPS']:
+            return "DPS slots full"
+    else:
+        if lobby['members'][role] is not None:
+            return f"{role} slot taken"
+
+    return "Unknown reason"
+
+
+def TakeSlot(lobby, username, role):
+    """Put username into the first free slot of role, returns the (role, slot) taken or None"""
+    if role == "DPS":
+        for i in range(DPS_SLOTS):
+            if lobby['members']['DPS'][i] is None:
+                lobby['members']['DPS'][i] = username
+                return (role, i)
+        return None
+
+    if lobby['members'][role] is not None:
+        return None
+    lobby['members'][role] = username
+    return (role, None)
+
+
+def FreeSlot(lobby, username):
+    """Remove username from whatever slot it holds, returns the (role, slot) freed or None"""
+    if lobby['members']['Tank'] == username:
+        lobby['members']['Tank'] = None
+        return ("Tank", None)
+    if lobby['members']['Healer'] == username:
+        lobby['members']['Healer'] = None
+        return ("Healer", None)
+    if username in lobby['members']['DPS']:
+        i = lobby['members']['DPS'].index(username)
+        lobby['members']['DPS'][i] = None
+        return ("DPS", i)
+    return None
+
+
+def SetSlot(lobby, role, slot, username):
+    """Write username (or None) into an exact slot"""
+    if role == "DPS":
+        lobby['members']['DPS'][slot] = username
+    else:
+        lobby['members'][role] = username
+
+
+def ApplyMutation(lobbies, mutation):
+    """Replay one typed mutation onto a LobbyTable"""
+    # Mutations overwrite state instead of computing from it, so replaying one twice is harmless
+    op = mutation['op']
+    lobby_id = mutation['lobby_id']
+    if op == "create":
+        lobbies[lobby_id] = mutation['lobby']
+    elif op == "delete":
+        lobbies.pop(lobby_id, None)
+    elif op in ("join", "leave"):
+        if lobby_id in lobbies:
+            username = mutation['username'] if op == "join" else None
+            lobbies.SetSlot(lobby_id, mutation['role'], mutation['slot'], username)
+    else:
+        raise ValueError(f"Unknown lobby mutation: {op}")
+
+
+def LobbyMembers(lobby):
+    """All usernames holding a slot in the lobby"""
+    members = [lobby['members']['Tank'], lobby['members']['Healer'], *lobby['members']['DPS']]
+    return [username for username in members if username is not None]
+
+
+def DiffVersions(old, new):
+    """Compare two {lobby_id: version} snapshots, returns (added, removed, changed) lobby ids"""
+    added = [lobby_id for lobby_id in new if lobby_id not in old]
+    removed = [lobby_id for lobby_id in old if lobby_id not in new]
+    changed = [lobby_id for lobby_id, version in new.items()
+               if lobby_id in old and old[lobby_id] != version]
+    return added, removed, changed
+
+
+class LobbyService:
+    """Lobby rules & persistence without any UI, every action returns a Result"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.lock = storage.lock
+        # Held as columns, every lobby read from it is a new dict, see src/model.py
+        self.lobbies = LobbyTable()
+        # username -> lobby_id, kept in step with every action & rebuilt on load
+        self.member_index = {}
+        # Lobbies with an open slot per role, sorted by required_rating
+        self.slot_index = OpenSlotIndex()
+        # Lobbies by name, rating & leader, for paged searches
+        self.search_index = LobbySearchIndex()
+        self.loaded_signature = None
+        # Typed mutations (create/join/leave/delete) of the batch being run
+        self.pending = []
+        # lobby_id -> version stamp, bumped from one shared clock whenever that lobby changes
+        self.versions = {}
+        self.clock = 0
+        # Called with the mutations of every committed batch, or None after a reload from storage
+        self.listeners = []
+        # Sequence numbers for every committed mutation, so clients can sync only what changed
+        self.feed = ChangeFeed()
+        self.Subscribe(self.feed.Record)
+
+    def Subscribe(self, listener):
+        """Have listener(mutations) called after every commit, with None when everything may have changed"""
+        self.listeners.append(listener)
+
+    def Notify(self, mutations):
+        """Tell every listener what just changed"""
+        for listener in self.listeners:
+            listener(mutations)
+
+    def Sync(self):
+        """Reload lobbies from storage only if someone else changed them since we last looked"""
+        signature = self.storage.LobbiesSignature()
+        if signature is None or signature != self.loaded_signature:
+            first_load = self.loaded_signature is None and not self.lobbies
+            # Storage hands out a shared read-only view, we need our own copy to mutate
+            self.Reset(Thaw(self.storage.LoadLobbies()))
+            self.loaded_signature = signature
+            if not first_load:
+                self.Notify(None)
+
+    def Reset(self, lobbies):
+        """Replace every loaded lobby, stamping the ones that differ & rebuilding the indexes"""
+        if not isinstance(lobbies, LobbyTable):
+            lobbies = LobbyTable(lobbies.items())
+        with self.lock:
+            old_lobbies, self.lobbies = self.lobbies, lobbies
+            self.RestampVersions(old_lobbies)
+            self.RebuildIndexes()
+
+    def Replay(self, mutations):
+        """Apply mutations committed elsewhere to the loaded lobbies, keeping indexes & versions in step"""
+        with self.lock:
+            for mutation in mutations:
+                lobby_id = mutation['lobby_id']
+                if lobby_id in self.lobbies:
+                    for username in LobbyMembers(self.lobbies[lobby_id]):
+                        if self.member_index.get(username) == lobby_id:
+                            del self.member_index[username]
+
+                ApplyMutation(self.lobbies, mutation)
+                lobby = self.lobbies.get(lobby_id)
+                if lobby is None:
+                    self.slot_index.Remove(lobby_id)
+                    self.search_index.Remove(lobby_id)
+                    self.versions.pop(lobby_id, None)
+                    continue
+                for username in LobbyMembers(lobby):
+                    self.member_index[username] = lobby_id
+                self.slot_index.Update(lobby_id, lobby)
+                self.search_index.Update(lobby_id, lobby)
+                self.Touch(lobby_id)
+
+    def RebuildIndexes(self):
+        """Rebuild every index from the loaded lobbies"""
+        self.member_index = {}
+        self.slot_index.Clear()
+        self.search_index.Clear()
+        # One pass for all of them, the table decodes a lobby each time it is read
+        for lobby_id, lobby in self.lobbies.items():
+            for username in LobbyMembers(lobby):
+                self.member_index.setdefault(username, lobby_id)
+            self.slot_index.Add(lobby_id, lobby)
+            self.search_index.Add(lobby_id, lobby)
+        self.slot_index.Sort()
+        self.search_index.Sort()
+
+    def RestampVersions(self, old_lobbies):
+        """After a reload, bump the version of every lobby that differs from what we had"""
+        for lobby_id in list(self.versions):
+            if lobby_id not in self.lobbies:
+                del self.versions[lobby_id]
+        changed = set(self.lobbies.Changed(old_lobbies))
+        for lobby_id in self.lobbies:
+            if lobby_id not in self.versions or lobby_id in changed:
+                self.Touch(lobby_id)
+
+    def Touch(self, lobby_id):
+        """Give a lobby a new version stamp"""
+        self.clock += 1
+        self.versions[lobby_id] = self.clock
+
+    def Record(self, mutation):
+        """Queue a mutation for the commit & stamp the lobby it changed"""
+        self.pending.append(mutation)
+        if mutation['op'] == "delete":
+            self.versions.pop(mutation['lobby_id'], None)
+        else:
+            self.Touch(mutation['lobby_id'])
+
+    def ChangesSince(self, seq):
+        """Changes(seq, mutations, None) after seq, or Changes(seq, None, lobbies) for a client too far behind"""
+        with self.lock:
+            self.Sync()
+            mutations = self.feed.Since(seq)
+            if mutations is None:
+                return Changes(self.feed.seq, None, self.lobbies)
+            return Changes(self.feed.seq, mutations, None)
+
+    def LoadLobbies(self):
+        """Current lobbies, callers must treat the table as read-only"""
+        with self.lock:
+            self.Sync()
+            return self.lobbies
+
+    def LobbyOf(self, username):
+        """Id of the lobby username is in, None when in no lobby"""
+        return self.member_index.get(username)
+
+    def JoinableLobbies(self, user):
+        """Ids of lobbies user can join right now, lowest required_rating first"""
+        with self.lock:
+            self.Sync()
+            own_lobby = self.member_index.get(user['username'])
+            return [lobby_id for lobby_id in self.slot_index.Query(user['role'], user['rating'])
+                    if lobby_id != own_lobby]
+
+    def SearchLobbies(self, query, after=None, limit=PAGE_SIZE):
+        """One page of (lobby_id, lobby) matching a LobbyQuery (read-only) with their version stamps, & the next page's cursor"""
+        with self.lock:
+            self.Sync()
+            lobby_ids, cursor = Search(self.search_index, self.slot_index, self.lobbies, query, after, limit)
+            return ([(lobby_id, self.lobbies[lobby_id]) for lobby_id in lobby_ids],
+                    {lobby_id: self.versions[lobby_id] for lobby_id in lobby_ids}, cursor)
+
+    def IsUserInAnyLobby(self, user):
+        """Check if user is already in any lobby"""
+        with self.lock:
+            self.Sync()
+            return user['username'] in self.member_index
+
+    def Close(self):
+        """Release the storage, flushing whatever it still has queued"""
+        self.storage.Close()
+
+    # Single actions, each one is a batch of one
+
+    def CreateLobby(self, user, name, required_rating):
+        """Create a lobby led by user"""
+        return self.CreateMany([(user, name, required_rating)])[0]
+
+    @Timed
+    def JoinLobby(self, user, lobby_id):
+        """Join a lobby"""
+        return self.JoinMany([(user, lobby_id)])[0]
+
+    def LeaveLobby(self, user, lobby_id):
+        """Leave a lobby"""
+        return self.LeaveMany([(user, lobby_id)])[0]
+
+    def DeleteLobby(self, user, lobby_id):
+        """Delete a lobby (leader only)"""
+        return self.RunBatch(self.ApplyDelete, [(user, lobby_id)])[0]
+
+    # Bulk actions, one load/validate/persist cycle for the whole batch
+
+    def CreateMany(self, requests):
+        """Create lobbies from (user, name, required_rating) tuples"""
+        return self.RunBatch(self.ApplyCreate, requests)
+
+    def JoinMany(self, requests):
+        """Join lobbies from (user, lobby_id) tuples"""
+        return self.RunBatch(self.ApplyJoin, requests)
+
+    def LeaveMany(self, requests):
+        """Leave lobbies from (user, lobby_id) tuples"""
+        return self.RunBatch(self.ApplyLeave, requests)
+
+    def FormMany(self, requests):
+        """Create full lobbies from (users, name, required_rating) tuples, users[0] leads"""
+        return self.RunBatch(self.ApplyForm, requests)
+
+    def ExpireMany(self, requests):
+        """Delete lobbies from (lobby_id,) tuples on the system's behalf, no leader needed"""
+        return self.RunBatch(self.ApplyExpire, requests)
+
+    def RunBatch(self, apply, requests):
+        """Apply every request against the loaded lobbies and save once if anything changed"""
+        with self.lock:
+            for attempt in range(COMMIT_ATTEMPTS):
+                self.Sync()
+                self.pending = []
+                results = [apply(*request) for request in requests]
+                if not self.pending:
+                    return results
+
+                mutations, self.pending = self.pending, []
+                try:
+                    self.storage.CommitLobbies(self.lobbies, mutations)
+                except ConflictError:
+                    # Someone else got there first, redo the batch on fresh data
+                    self.loaded_signature = None
+                    continue
+                except Exception:
+                    # Memory is now ahead of disk, force a reload on the next action
+                    self.loaded_signature = None
+                    raise
+                self.loaded_signature = self.storage.LobbiesSignature()
+                self.Notify(mutations)
+                return results
+
+            raise ConflictError(f"Lobbies kept changing, gave up after {COMMIT_ATTEMPTS} attempts")
+
+    def ApplyCreate(self, user, name, required_rating):
+        """Validate & create one lobby in the loaded lobbies"""
+        name = name.strip() if name else ""
+        if not name:
+            return Result(False, "Lobby name is required!", None)
+
+        if required_rating < MIN_RATING or required_rating > MAX_RATING:
+            return Result(False, f"Rating must be between {MIN_RATING} and {MAX_RATING}!", None)
+
+        if user['username'] in self.member_index:
+            return Result(False, "You're already in a lobby! Leave your current lobby before creating a new one.", None)
+
+        # Check if lobby name exists
+        if name in self.lobbies:
+            return Result(False, "Lobby name already exists!", None)
+
+        lobby_id = name
+        lobby = NewLobby(name, user['username'], required_rating)
+
+        # Add creator to lobby
+        TakeSlot(lobby, user['username'], user['role'])
+        self.lobbies[lobby_id] = lobby
+        self.Record({"op": "create", "lobby_id": lobby_id, "lobby": lobby})
+        self.member_index[user['username']] = lobby_id
+        self.slot_index.Update(lobby_id, lobby)
+        self.search_index.Update(lobby_id, lobby)
+        return Result(True, "Lobby created successfully!", lobby_id)
+
+    def ApplyForm(self, users, name, required_rating):
+        """Validate & create one lobby with all of users already seated, all or nothing"""
+        if name in self.lobbies:
+            return Result(False, "Lobby name already exists!", None)
+
+        lobby = NewLobby(name, users[0]['username'], required_rating)
+        for user in users:
+            if user['username'] in self.member_index:
+                return Result(False, f"{user['username']} is already in a lobby!", None)
+            if user['rating'] < required_rating:
+                return Result(False, f"{user['username']}'s rating is too low!", None)
+            if TakeSlot(lobby, user['username'], user['role']) is None:
+                return Result(False, f"No {user['role']} slot left for {user['username']}!", None)
+
+        lobby_id = name
+        self.lobbies[lobby_id] = lobby
+        self.Record({"op": "create", "lobby_id": lobby_id, "lobby": lobby})
+        for user in users:
+            self.member_index[user['username']] = lobby_id
+        self.slot_index.Update(lobby_id, lobby)
+        self.search_index.Update(lobby_id, lobby)
+        return Result(True, "Lobby formed successfully!", lobby_id)
+
+    def ApplyJoin(self, user, lobby_id):
+        """Validate & join one lobby in the loaded lobbies"""
+        if lobby_id not in self.lobbies:
+            return Result(False, "Lobby no longer exists!", lobby_id)
+
+        if user['username'] in self.member_index:
+            return Result(False, "You're already in a lobby! Leave your current lobby before joining another one.", lobby_id)
+
+        lobby = self.lobbies[lobby_id]
+        if not CanJoinLobby(user, lobby):
+            return Result(False, f"Cannot join: {JoinRestrictionReason(user, lobby)}", lobby_id)
+
+        # lobby is a copy, the table takes the seat on its own
+        role, slot = TakeSlot(lobby, user['username'], user['role'])
+        self.lobbies.SetSlot(lobby_id, role, slot, user['username'])
+        self.Record({"op": "join", "lobby_id": lobby_id, "role": role, "slot": slot,
+                     "username": user['username']})
+        self.member_index[user['username']] = lobby_id
+        self.slot_index.Update(lobby_id, lobby)
+        return Result(True, "Joined lobby successfully!", lobby_id)
+
+    def ApplyLeave(self, user, lobby_id):
+        """Validate & leave one lobby in the loaded lobbies"""
+        if lobby_id not in self.lobbies:
+            return Result(False, "Lobby no longer exists!", lobby_id)
+
+        lobby = self.lobbies[lobby_id]
+        freed = FreeSlot(lobby, user['username'])
+        if freed is None:
+            return Result(False, "You're not in this lobby!", lobby_id)
+
+        role, slot = freed
+        self.lobbies.SetSlot(lobby_id, role, slot, None)
+        self.Record({"op": "leave", "lobby_id": lobby_id, "role": role, "slot": slot,
+                     "username": user['username']})
+
+        if self.member_index.get(user['username']) == lobby_id:
+            del self.member_index[user['username']]
+        self.slot_index.Update(lobby_id, lobby)
+        return Result(True, "Left lobby successfully!", lobby_id)
+
+    def ApplyDelete(self, user, lobby_id):
+        """Validate & delete one lobby in the loaded lobbies"""
+        if lobby_id not in self.lobbies:
+            return Result(False, "Lobby no longer exists!", lobby_id)
+
+        if self.lobbies[lobby_id]['leader'] != user['username']:
+            return Result(False, "Only the leader can delete this lobby!", lobby_id)
+
+        return self.ApplyExpire(lobby_id)
+
+    def ApplyExpire(self, lobby_id):
+        """Delete one lobby in the loaded lobbies, whoever is in it"""
+        if lobby_id not in self.lobbies:
+            return Result(False, "Lobby no longer exists!", lobby_id)
+
+        for username in LobbyMembers(self.lobbies[lobby_id]):
+            if self.member_index.get(username) == lobby_id:
+                del self.member_index[username]
+        del self.lobbies[lobby_id]
+        self.slot_index.Remove(lobby_id)
+        self.search_index.Remove(lobby_id)
+        self.Record({"op": "delete", "lobby_id": lobby_id})
+        return Result(True, "Lobby deleted successfully!", lobby_id)
@@ -0,0 +1,102 @@
+import sys
+import numpy as np
+from src.backends import OpenStorage, DEFAULT_STORAGE
+from src.lobby_index import ROLES, OpenSlotIndex
+from src.lobby_service import LobbyService, LobbyMembers
+
+
+def SlotArrays(lobbies, slot_index, role):
+    """Every open slot of role as (lobby ids, required ratings), sorted by required_rating"""
+    entries = slot_index.by_role[role]
+    lobby_ids = np.array([lobby_id for _, lobby_id in entries], dtype=object)
+    ratings = np.fromiter((rating for rating, _ in entries), dtype=np.int64, count=len(entries))
+    if role != "DPS":
+        return lobby_ids, ratings
+
+    # A lobby with several free DPS seats offers each of them
+    free = np.fromiter((lobbies[lobby_id]['members']['DPS'].count(None) for _, lobby_id in entries),
+                       dtype=np.int64, count=len(entries))
+    return np.repeat(lobby_ids, free), np.repeat(ratings, free)
+
+
+def PlayerArrays(players):
+    """Usernames, role codes (index into ROLES) & ratings of the waiting players, gathered in one pass"""
+    role_codes = {role: code for code, role in enumerate(ROLES)}
+    usernames = np.array(list(players), dtype=object)
+    roles = np.fromiter((role_codes[user['role']] for user in players.values()),
+                        dtype=np.int8, count=len(players))
+    ratings = np.fromiter((user['rating'] for user in players.values()),
+                          dtype=np.int64, count=len(players))
+    return usernames, roles, ratings
+
+
+def Assign(player_ratings, slot_ratings):
+    """Slot index for each player (strongest first, slots by ascending rating), -1 when none is left
+
+    Every player, strongest first, takes the most demanding free slot they qualify for. That
+    seats as many players as possible & keeps the easy slots for the weaker players.
+    """
+    players = len(player_ratings)
+    slots = len(slot_ratings)
+    if not players or not slots:
+        return np.full(players, -1, dtype=np.int64)
+
+    # Counted from the top, first[j] is the most demanding slot player j qualifies for
+    first = slots - np.searchsorted(slot_ratings, player_ratings, side="right")
+    # Greedy in one pass: player j takes max(first[j], slot of player j - 1 plus one)
+    steps = np.arange(players)
+    taken = np.maximum.accumulate(first - steps) + steps
+    # Back to ascending slot positions, players past the last slot get nothing
+    return np.where(taken < slots, slots - 1 - taken, -1)
+
+
+def Plan(players, lobbies, slot_index=None):
+    """(username, lobby_id) joins that seat the waiting players, one lobby each, tightest rating fit"""
+    if slot_index is None:
+        slot_index = OpenSlotIndex()
+        slot_index.Build(lobbies)
+
+    usernames, roles, ratings = PlayerArrays(players)
+    joins = []
+    for code, role in enumerate(ROLES):
+        lobby_ids, slot_ratings = SlotArrays(lobbies, slot_index, role)
+        # This role's players, strongest first
+        mine = np.flatnonzero(roles == code)
+        mine = mine[np.argsort(-ratings[mine], kind="stable")]
+        slots = Assign(ratings[mine], slot_ratings)
+        seated = slots >= 0
+        joins.extend(zip(usernames[mine[seated]].tolist(), lobby_ids[slots[seated]].tolist()))
+    return joins
+
+
+def WaitingPlayers(users, lobbies):
+    """Users that are in no lobby yet, keyed by username"""
+    seated = {username for lobby in lobbies.values() for username in LobbyMembers(lobby)}
+    return {username: user for username, user in users.items() if username not in seated}
+
+
+def AutoFill(service, users):
+    """Seat every waiting user the plan has a slot for, returns the join Results"""
+    with service.lock:
+        lobbies = service.LoadLobbies()
+        players = {username: user for username, user in users.items()
+                   if service.LobbyOf(username) is None}
+        joins = Plan(players, lobbies, service.slot_index)
+        # JoinMany re-checks every join, so a plan gone stale by commit time can't break a rule
+        requests = [(dict(players[username], username=username), lobby_id) for username, lobby_id in joins]
+        return service.JoinMany(requests)
+
+
+def Main(argv):
+    """python -m src.matchmaker [storage spec], seat the waiting users of a data directory"""
+    storage = OpenStorage(argv[0] if argv else DEFAULT_STORAGE)
+    try:
+        results = AutoFill(LobbyService(storage), storage.LoadUsers())
+    finally:
+        storage.Close()
+    joined = sum(result.ok for result in results)
+    print(f"Seated {joined} waiting players, {len(results) - joined} joins were refused")
+
+
+if __name__ == "__main__":
+    Main(sys.argv[1:])
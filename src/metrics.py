@@ -0,0 +1,251 @@
+"""Latency histograms & counters for the hot paths, switched on & off at runtime
+
+Calls wrapped in Timed are recorded in the wow_call_seconds histogram, labelled
+with the function's qualified name. While metrics are off a wrapped call costs
+one flag check. Everything can be exported in the Prometheus text format, to a
+file or over HTTP:
+    WOW_METRICS=1 WOW_METRICS_FILE=data/metrics.prom WOW_METRICS_PORT=9464 python main.py
+    curl http://127.0.0.1:9464/metrics
+"""
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds, 1 us doubling up to about 67 s
+BUCKETS = tuple(1e-6 * 2 ** i for i in range(27))
+QUANTILES = (0.5, 0.95, 0.99)
+HELP = {
+    "wow_call_seconds": ("histogram", "Time spent in instrumented calls"),
+    "wow_tk_stall_seconds": ("histogram", "How late the Tk mainloop ran a timer, i.e. how long it was blocked"),
+    "wow_tk_stalls_total": ("counter", "Tk mainloop stalls longer than the stall threshold"),
+    "wow_storage_read_bytes_total": ("counter", "Bytes read from data files"),
+    "wow_storage_written_bytes_total": ("counter", "Bytes written to data files"),
+}
+DEFAULT_EXPORT_INTERVAL = 10.0
+
+
+class Histogram:
+    """Counts per latency bucket plus the total, quantiles are estimated from the buckets"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def Observe(self, value):
+        """Record one value"""
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def Quantile(self, q):
+        """Estimated q-quantile, interpolated inside the bucket it falls in, None before any value"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if i < len(BUCKETS) else BUCKETS[-1] * 2
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-1]
+
+
+def Labels(labels):
+    """Prometheus label set for a sorted tuple of (name, value) pairs"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{Escape(value)}"' for name, value in labels) + "}"
+
+
+def Escape(value):
+    """A label value with backslashes, quotes & newlines escaped"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Histograms & counters keyed by (name, labels), recording only while enabled"""
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        # Called with the new enabled flag whenever it changes
+        self.listeners = []
+        self.export_stopped = None
+        self.export_thread = None
+        self.server = None
+
+    def Subscribe(self, listener):
+        """Have listener(enabled) called whenever metrics are switched on or off"""
+        self.listeners.append(listener)
+
+    def SetEnabled(self, enabled):
+        """Switch recording on or off, what was recorded so far is kept"""
+        if enabled == self.enabled:
+            return
+        self.enabled = enabled
+        for listener in self.listeners:
+            listener(enabled)
+
+    def Reset(self):
+        """Forget everything recorded"""
+        with self.lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def Observe(self, name, value, **labels):
+        """Record value in the histogram name{labels}"""
+        self.Record((name, tuple(sorted(labels.items()))), value)
+
+    def Record(self, key, value):
+        """Observe for a (name, sorted label pairs) key built ahead of time"""
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.Observe(value)
+
+    def Count(self, name, amount=1, **labels):
+        """Add amount to the counter name{labels}"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def Summary(self):
+        """(name, labels, count, p50, p95, p99, sum) per histogram & (name, labels, value) per counter, sorted"""
+        with self.lock:
+            histograms = [(name, dict(labels), histogram.count,
+                           *(histogram.Quantile(q) for q in QUANTILES), histogram.sum)
+                          for (name, labels), histogram in sorted(self.histograms.items())]
+            counters = [(name, dict(labels), value) for (name, labels), value in sorted(self.counters.items())]
+        return histograms, counters
+
+    def Prometheus(self):
+        """Everything recorded in the Prometheus text exposition format"""
+        lines = []
+        described = set()
+
+        def Describe(name, kind):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, (kind, name))[1]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                Describe(name, "histogram")
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{Labels(labels + (('le', f'{bound:.6g}'),))} {cumulative}")
+                lines.append(f"{name}_bucket{Labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                lines.append(f"{name}_sum{Labels(labels)} {histogram.sum:.9g}")
+                lines.append(f"{name}_count{Labels(labels)} {histogram.count}")
+            for (name, labels), value in sorted(self.counters.items()):
+                Describe(name, "counter")
+                lines.append(f"{name}{Labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def WriteFile(self, path):
+        """Write the Prometheus text to path atomically, e.g. for node_exporter's textfile collector"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.Prometheus())
+        os.replace(tmp_path, path)
+
+    def StartExport(self, path, interval=DEFAULT_EXPORT_INTERVAL):
+        """Rewrite path every interval seconds on a background thread, & once more on Close"""
+        # Storage imports this module, so it can't use the storage helpers
+        self.export_stopped = threading.Event()
+
+        def Export():
+            while not self.export_stopped.wait(interval):
+                self.WriteFile(path)
+            self.WriteFile(path)
+
+        self.export_thread = threading.Thread(target=Export, daemon=True, name="metrics-export")
+        self.export_thread.start()
+
+    def Serve(self, port, host="127.0.0.1"):
+        """Serve GET /metrics over HTTP on a daemon thread, returns the server (port 0 picks a free one)"""
+        # Only imported when asked for, storage imports this module & the app shouldn't pay for http.server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.Prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True, name="metrics").start()
+        return self.server
+
+    def Configure(self, environ=os.environ):
+        """Set up from WOW_METRICS (1 to record from the start), WOW_METRICS_FILE & WOW_METRICS_PORT"""
+        if environ.get("WOW_METRICS", "") not in ("", "0"):
+            self.SetEnabled(True)
+        if environ.get("WOW_METRICS_FILE"):
+            self.StartExport(environ["WOW_METRICS_FILE"])
+        if environ.get("WOW_METRICS_PORT"):
+            self.Serve(int(environ["WOW_METRICS_PORT"]))
+
+    def Close(self):
+        """Stop exporting, the file gets one last write"""
+        if self.export_thread is not None:
+            self.export_stopped.set()
+            self.export_thread.join()
+            self.export_thread = None
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+METRICS = Metrics()
+
+
+def Timed(fn):
+    """Record every call of fn in wow_call_seconds{fn=<qualified name>} while metrics are on"""
+    key = ("wow_call_seconds", (("fn", fn.__qualname__),))
+
+    @functools.wraps(fn)
+    def Wrapper(*args, **kwargs):
+        if not METRICS.enabled:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            METRICS.Record(key, time.perf_counter() - start)
+
+    return Wrapper
+
+
+def CountRead(size):
+    """Count bytes read from a data file"""
+    if METRICS.enabled:
+        METRICS.Count("wow_storage_read_bytes_total", size)
+
+
+def CountWritten(size):
+    """Count bytes written to a data file"""
+    if METRICS.enabled:
+        METRICS.Count("wow_storage_written_bytes_total", size)
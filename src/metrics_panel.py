@@ -0,0 +1,102 @@
+import time
+import tkinter as tk
+from tkinter import ttk
+from src.metrics import METRICS
+
+# How often the stall monitor asks the mainloop to run a timer
+STALL_INTERVAL_MS = 50
+# A timer this late means the UI visibly froze
+STALL_THRESHOLD = 0.1
+PANEL_REFRESH_MS = 1000
+
+
+class StallMonitor:
+    """Measures how late the Tk mainloop runs a repeating timer, only while metrics are on"""
+
+    def __init__(self, window, interval_ms=STALL_INTERVAL_MS, threshold=STALL_THRESHOLD):
+        self.window = window
+        self.interval_ms = interval_ms
+        self.threshold = threshold
+        self.running = False
+        self.expected = None
+        # Metrics are switched on & off on the Tk thread (the panel or at startup), so after() is safe here
+        METRICS.Subscribe(self.OnToggle)
+        self.OnToggle(METRICS.enabled)
+
+    def OnToggle(self, enabled):
+        """Start ticking when metrics are switched on, the next tick stops itself once they're off"""
+        if enabled and not self.running:
+            self.running = True
+            self.Schedule()
+
+    def Schedule(self):
+        """Ask for the next tick"""
+        self.expected = time.perf_counter() + self.interval_ms / 1000
+        self.window.after(self.interval_ms, self.Tick)
+
+    def Tick(self):
+        """Record how late this tick came"""
+        if not METRICS.enabled:
+            self.running = False
+            return
+        late = max(time.perf_counter() - self.expected, 0.0)
+        METRICS.Observe("wow_tk_stall_seconds", late)
+        if late > self.threshold:
+            METRICS.Count("wow_tk_stalls_total")
+        self.Schedule()
+
+
+def Milliseconds(seconds):
+    """Seconds as a ms cell, blank when there's no value"""
+    return "" if seconds is None else f"{seconds * 1e3:.2f}"
+
+
+class MetricsPanel:
+    """Debug window with a switch for recording & a live table of everything recorded"""
+
+    def __init__(self, parent):
+        self.window = tk.Toplevel(parent)
+        self.window.title("Metrics")
+        self.window.geometry("760x420")
+
+        top_frame = tk.Frame(self.window)
+        top_frame.pack(fill='x', padx=10, pady=5)
+        self.enabled = tk.BooleanVar(value=METRICS.enabled)
+        tk.Checkbutton(top_frame, text="Record metrics", variable=self.enabled,
+                       command=lambda: METRICS.SetEnabled(self.enabled.get())).pack(side='left')
+        tk.Button(top_frame, text="Reset", command=self.Reset).pack(side='left', padx=10)
+
+        columns = ("calls", "p50", "p95", "p99", "total")
+        self.table = ttk.Treeview(self.window, columns=columns)
+        self.table.heading("#0", text="Metric")
+        self.table.column("#0", width=330)
+        for column, heading in zip(columns, ("Calls", "p50 ms", "p95 ms", "p99 ms", "Total s / value")):
+            self.table.heading(column, text=heading)
+            self.table.column(column, width=80, anchor='e')
+        self.table.pack(expand=True, fill='both', padx=10, pady=5)
+
+        self.Refresh()
+
+    def Reset(self):
+        """Forget everything recorded & redraw"""
+        METRICS.Reset()
+        self.Fill()
+
+    def Fill(self):
+        """Redraw the table from the current metrics"""
+        self.table.delete(*self.table.get_children())
+        histograms, counters = METRICS.Summary()
+        for name, labels, count, p50, p95, p99, total in histograms:
+            label = labels.get("fn", name)
+            self.table.insert("", "end", text=label, values=(count, Milliseconds(p50), Milliseconds(p95),
+                                                              Milliseconds(p99), f"{total:.3f}"))
+        for name, labels, value in counters:
+            self.table.insert("", "end", text=name, values=("", "", "", "", value))
+
+    def Refresh(self):
+        """Redraw every PANEL_REFRESH_MS while the window is open"""
+        if not self.window.winfo_exists():
+            return
+        self.enabled.set(METRICS.enabled)
+        self.Fill()
+        self.window.after(PANEL_REFRESH_MS, self.Refresh)
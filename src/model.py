@@ -0,0 +1,476 @@
+"""Lobbies held as typed columns instead of one JSON-shaped dict each, convertible back without loss
+
+A lobby dict costs about a kilobyte: a members dict, a DPS list, an ISO string
+& its own copy of every username. A LobbyTable keeps one row per lobby in typed
+arrays: required_rating, created_at as microseconds since the epoch, the leader
+& the seats as codes into one list of usernames that every copy of the table
+shares. Lobby ids sit back to back in one bytearray & are found through an open
+addressing hash table on their crc32, so a lobby costs no Python object at all.
+
+Reads hand out a fresh dict in the lobbies.json shape & writes encode one, so
+the table stands in for the dict it replaces. A lobby that doesn't fit the
+columns (a missing key, a rating that isn't an int, ...) is kept as it is.
+"""
+import copy
+import threading
+import zlib
+from array import array
+from bisect import bisect_left
+from collections.abc import ItemsView, Mapping, ValuesView
+from datetime import datetime, timedelta
+from src.lobby_index import ROLES
+
+DPS_SLOTS = 3
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Seats of a row: Tank, Healer, then the DPS slots
+SEATS = 2 + DPS_SLOTS
+SEAT_OF = {"Tank": 0, "Healer": 1}
+LOBBY_KEYS = ["name", "leader", "required_rating", "members", "created_at"]
+MEMBER_KEYS = ["Tank", "Healer", "DPS"]
+# Username code of an empty seat, names[NONE] is None, & the leader code marking a deleted row
+NONE = 0
+DELETED = -1
+# created_at of a row whose timestamp is kept as text
+TEXT = -(1 << 63)
+INT_RANGE = range(-(1 << 31), 1 << 31)
+
+
+def ToEpoch(text):
+    """ISO timestamp -> microseconds since the epoch, kept as text when the int wouldn't print back the same"""
+    # Only exactly what isoformat() prints for a naive datetime comes back unchanged:
+    # YYYY-MM-DDTHH:MM:SS, plus .ffffff when the microseconds aren't 0
+    if not isinstance(text, str) or text[10:11] != "T":
+        return text
+    if len(text) != 19 and (len(text) != 26 or text[19] != "." or text.endswith(".000000")):
+        return text
+    try:
+        moment = datetime.fromisoformat(text)
+    except ValueError:
+        return text
+    if moment.tzinfo is not None or moment.isoformat() != text:
+        return text
+    return (moment - EPOCH) // MICROSECOND
+
+
+def FromEpoch(value):
+    """Microseconds since the epoch -> ISO timestamp, text passes through"""
+    if isinstance(value, int):
+        return (EPOCH + value * MICROSECOND).isoformat()
+    return value
+
+
+def Fields(lobby):
+    """(name, leader, required_rating, seats, created_at) of a lobby shaped like NewLobby's, None for any other"""
+    if not isinstance(lobby, dict) or list(lobby) != LOBBY_KEYS:
+        return None
+    members = lobby['members']
+    if not isinstance(members, dict) or list(members) != MEMBER_KEYS:
+        return None
+    dps = members['DPS']
+    if not isinstance(dps, list) or len(dps) != DPS_SLOTS:
+        return None
+    seats = [members['Tank'], members['Healer'], *dps]
+    name, leader, rating, created_at = lobby['name'], lobby['leader'], lobby['required_rating'], lobby['created_at']
+    if not all(username is None or type(username) is str for username in (leader, *seats)):
+        return None
+    if type(name) is not str or type(rating) is not int or rating not in INT_RANGE or type(created_at) is not str:
+        return None
+    return name, leader, rating, seats, created_at
+
+
+class Usernames:
+    """Every username a table has seen, stored once & known by its index, shared by all copies of the table"""
+
+    def __init__(self):
+        self.names = [None]
+        self.codes = {}
+        # Copies of one table live on different threads, two of them may add the same name at once
+        self.lock = threading.Lock()
+
+    def Code(self, username):
+        """Index of username, added on first sight, NONE for None"""
+        if username is None:
+            return NONE
+        code = self.codes.get(username)
+        if code is None:
+            with self.lock:
+                code = self.codes.get(username)
+                if code is None:
+                    code = len(self.names)
+                    self.names.append(username)
+                    self.codes[username] = code
+        return code
+
+
+class LobbyRows:
+    """The rows of a LobbyTable, replaced as a whole when deleted rows are dropped
+
+    Rows only ever get added or marked deleted in place, so a reader that took the table's
+    LobbyRows keeps finding the same lobby under the same row, even while a writer goes on.
+    """
+
+    def __init__(self, usernames):
+        self.usernames = usernames
+        # Row r's id is ids[id_starts[r]:id_starts[r + 1]]
+        self.ids = bytearray()
+        self.id_starts = array('q', [0])
+        self.leaders = array('i')
+        self.seats = array('i')
+        self.ratings = array('i')
+        self.created = array('q')
+        # row -> what the columns don't hold: a name other than the id, created_at text, a whole odd lobby
+        self.names = {}
+        self.created_texts = {}
+        self.odd = {}
+        # Row + 1 per slot, 0 is empty, kept at most 2/3 full
+        self.slots = array('i', [0]) * 8
+        # (lobby_id, row) of the last lookup, an action reads & writes the same lobby a few times in a row
+        self.last = (None, None)
+
+    def Live(self):
+        """Every row that isn't deleted, in insertion order"""
+        leaders = self.leaders
+        for row in range(len(leaders)):
+            if leaders[row] != DELETED:
+                yield row
+
+    def Id(self, row):
+        """lobby_id of a row"""
+        return self.ids[self.id_starts[row]:self.id_starts[row + 1]].decode('utf-8', 'surrogatepass')
+
+    def Find(self, lobby_id):
+        """Row of lobby_id, None when there is no such lobby"""
+        last_id, last_row = self.last
+        # A row is never reused, only deleted
+        if lobby_id == last_id and last_row is not None and self.leaders[last_row] != DELETED:
+            return last_row
+        if not isinstance(lobby_id, str):
+            return None
+        key = lobby_id.encode('utf-8', 'surrogatepass')
+        # Probe() inlined, every read of the table comes through here
+        slots, ids, starts, leaders = self.slots, self.ids, self.id_starts, self.leaders
+        mask = len(slots) - 1
+        i = zlib.crc32(key) & mask
+        while True:
+            entry = slots[i]
+            if not entry:
+                return None
+            row = entry - 1
+            if ids[starts[row]:starts[entry]] == key and leaders[row] != DELETED:
+                self.last = (lobby_id, row)
+                return row
+            i = (i + 1) & mask
+
+    def Probe(self, key, hashed):
+        """(slot, row) holding the id key, or (the empty slot it would go in, None)"""
+        slots, ids, starts, leaders = self.slots, self.ids, self.id_starts, self.leaders
+        mask = len(slots) - 1
+        i = hashed & mask
+        while True:
+            entry = slots[i]
+            if not entry:
+                return i, None
+            row = entry - 1
+            start, end = starts[row], starts[row + 1]
+            if end - start == len(key) and leaders[row] != DELETED and ids[start:end] == key:
+                return i, row
+            i = (i + 1) & mask
+
+    def Full(self):
+        """Whether one more row would fill the slots past 2/3"""
+        return (len(self.leaders) + 1) * 3 > len(self.slots) * 2
+
+    def Append(self, key, lobby_id, lobby, slot):
+        """Add a row for lobby & list it in slot once it is complete"""
+        row = len(self.leaders)
+        self.ids += key
+        self.id_starts.append(len(self.ids))
+        self.seats.extend((NONE,) * SEATS)
+        self.ratings.append(0)
+        self.created.append(0)
+        self.leaders.append(NONE)
+        self.Store(row, lobby_id, lobby)
+        self.slots[slot] = row + 1
+
+    def Store(self, row, lobby_id, lobby):
+        """Encode a lobby into its row"""
+        self.Forget(row)
+        fields = Fields(lobby)
+        if fields is None:
+            self.odd[row] = copy.deepcopy(lobby)
+            self.leaders[row] = NONE
+            return
+
+        name, leader, rating, seats, created_at = fields
+        if name != lobby_id:
+            self.names[row] = name
+        code = self.usernames.Code
+        self.seats[row * SEATS:(row + 1) * SEATS] = array('i', map(code, seats))
+        self.ratings[row] = rating
+        micros = ToEpoch(created_at)
+        if isinstance(micros, int):
+            self.created[row] = micros
+        else:
+            self.created[row] = TEXT
+            self.created_texts[row] = created_at
+        self.leaders[row] = code(leader)
+
+    def SetSeat(self, row, lobby_id, role, slot, username):
+        """Write username (or None) into one seat of a row"""
+        if row in self.odd or not (username is None or type(username) is str):
+            lobby = self.Decode(row)
+            if role == "DPS":
+                lobby['members']['DPS'][slot] = username
+            else:
+                lobby['members'][role] = username
+            self.Store(row, lobby_id, lobby)
+            return
+        if role == "DPS":
+            if not 0 <= slot < DPS_SLOTS:
+                raise IndexError(f"No DPS slot {slot}")
+            seat = 2 + slot
+        else:
+            seat = SEAT_OF[role]
+        self.seats[row * SEATS + seat] = self.usernames.Code(username)
+
+    def Delete(self, row):
+        """Mark a row deleted, it keeps its slot until the next rehash"""
+        self.leaders[row] = DELETED
+        self.Forget(row)
+
+    def Forget(self, row):
+        """Drop whatever a row keeps outside the columns"""
+        self.names.pop(row, None)
+        self.created_texts.pop(row, None)
+        self.odd.pop(row, None)
+
+    def Stored(self, row):
+        """What a row holds, comparable with another table's rows"""
+        if row in self.odd:
+            return self.odd[row]
+        names = self.usernames.names
+        return (self.names.get(row), self.ratings[row], self.created[row], self.created_texts.get(row),
+                tuple(map(names.__getitem__, self.seats[row * SEATS:(row + 1) * SEATS])), names[self.leaders[row]])
+
+    def Decode(self, row):
+        """The lobby of a row as a new lobbies.json dict"""
+        if row in self.odd:
+            return copy.deepcopy(self.odd[row])
+        names = self.usernames.names
+        seats = list(map(names.__getitem__, self.seats[row * SEATS:(row + 1) * SEATS]))
+        name = self.names.get(row)
+        created = self.created[row]
+        return {
+            "name": self.Id(row) if name is None else name,
+            "leader": names[self.leaders[row]],
+            "required_rating": self.ratings[row],
+            "members": {
+                "Tank": seats[0],
+                "Healer": seats[1],
+                "DPS": seats[2:]
+            },
+            "created_at": self.created_texts[row] if created == TEXT else FromEpoch(created)
+        }
+
+    def Rehash(self):
+        """List every live row in new slots with room for as many again"""
+        size = 8
+        while size < len(self.leaders) * 3:
+            size *= 2
+        slots = array('i', [0]) * size
+        mask = size - 1
+        ids, starts = self.ids, self.id_starts
+        for row in self.Live():
+            i = zlib.crc32(ids[starts[row]:starts[row + 1]]) & mask
+            while slots[i]:
+                i = (i + 1) & mask
+            slots[i] = row + 1
+        self.slots = slots
+
+    def Copy(self):
+        """Copy sharing nothing but the usernames"""
+        rows = LobbyRows(self.usernames)
+        rows.ids = bytearray(self.ids)
+        rows.id_starts = self.id_starts[:]
+        rows.leaders = self.leaders[:]
+        rows.seats = self.seats[:]
+        rows.ratings = self.ratings[:]
+        rows.created = self.created[:]
+        rows.names = dict(self.names)
+        rows.created_texts = dict(self.created_texts)
+        rows.odd = copy.deepcopy(self.odd)
+        rows.slots = self.slots[:]
+        return rows
+
+    def Compacted(self):
+        """New rows holding only the live ones, renumbered in order & rehashed"""
+        live = list(self.Live())
+        rows = LobbyRows(self.usernames)
+        for row in live:
+            rows.ids += self.ids[self.id_starts[row]:self.id_starts[row + 1]]
+            rows.id_starts.append(len(rows.ids))
+        rows.leaders = array('i', (self.leaders[row] for row in live))
+        rows.seats = array('i', (code for row in live for code in self.seats[row * SEATS:(row + 1) * SEATS]))
+        rows.ratings = array('i', (self.ratings[row] for row in live))
+        rows.created = array('q', (self.created[row] for row in live))
+        # Only live rows have side entries, their new number is their position in live
+        rows.names = {bisect_left(live, row): value for row, value in self.names.items()}
+        rows.created_texts = {bisect_left(live, row): value for row, value in self.created_texts.items()}
+        rows.odd = {bisect_left(live, row): value for row, value in self.odd.items()}
+        rows.Rehash()
+        return rows
+
+
+class LobbyItems(ItemsView):
+    """(lobby_id, lobby) pairs, read row by row instead of looking every id up again"""
+
+    def __iter__(self):
+        rows = self._mapping.rows
+        for row in rows.Live():
+            yield rows.Id(row), rows.Decode(row)
+
+
+class LobbyValues(ValuesView):
+    """Every lobby, read row by row"""
+
+    def __iter__(self):
+        rows = self._mapping.rows
+        for row in rows.Live():
+            yield rows.Decode(row)
+
+
+class LobbyTable(Mapping):
+    """lobby_id -> lobby in the lobbies.json shape, stored as columns, see the module docstring
+
+    Every read decodes a new dict, change a lobby through the table (table[lobby_id] = lobby,
+    SetSlot, del, pop), changing a dict read from it changes nothing.
+    """
+
+    def __init__(self, pairs=(), usernames=None):
+        # Readers take self.rows once & read everything from it, it is only ever swapped whole
+        self.rows = LobbyRows(usernames if usernames is not None else Usernames())
+        self.count = 0
+        self.frozen = False
+        for lobby_id, lobby in pairs:
+            self[lobby_id] = lobby
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        rows = self.rows
+        for row in rows.Live():
+            yield rows.Id(row)
+
+    def __contains__(self, lobby_id):
+        return self.rows.Find(lobby_id) is not None
+
+    def __getitem__(self, lobby_id):
+        rows = self.rows
+        row = rows.Find(lobby_id)
+        if row is None:
+            raise KeyError(lobby_id)
+        return rows.Decode(row)
+
+    def get(self, lobby_id, default=None):
+        rows = self.rows
+        row = rows.Find(lobby_id)
+        return default if row is None else rows.Decode(row)
+
+    def items(self):
+        return LobbyItems(self)
+
+    def values(self):
+        return LobbyValues(self)
+
+    def __setitem__(self, lobby_id, lobby):
+        self.CheckWritable()
+        if not isinstance(lobby_id, str):
+            raise TypeError(f"Lobby ids are strings, not {type(lobby_id).__name__}")
+        key = lobby_id.encode('utf-8', 'surrogatepass')
+        hashed = zlib.crc32(key)
+        rows = self.rows
+        slot, row = rows.Probe(key, hashed)
+        if row is not None:
+            rows.Store(row, lobby_id, lobby)
+            return
+        if rows.Full():
+            self.Grow()
+            rows = self.rows
+            slot, _ = rows.Probe(key, hashed)
+        rows.Append(key, lobby_id, lobby, slot)
+        self.count += 1
+
+    def __delitem__(self, lobby_id):
+        self.CheckWritable()
+        row = self.rows.Find(lobby_id)
+        if row is None:
+            raise KeyError(lobby_id)
+        self.rows.Delete(row)
+        self.count -= 1
+
+    def pop(self, lobby_id, *default):
+        """Remove a lobby & return it, like dict.pop"""
+        rows = self.rows
+        row = rows.Find(lobby_id)
+        if row is None:
+            if default:
+                return default[0]
+            raise KeyError(lobby_id)
+        lobby = rows.Decode(row)
+        del self[lobby_id]
+        return lobby
+
+    def __deepcopy__(self, memo):
+        return self.Copy()
+
+    def __reduce__(self):
+        return (LobbyTable, (list(self.items()),))
+
+    def __repr__(self):
+        return f"<LobbyTable of {self.count} lobbies>"
+
+    def SetSlot(self, lobby_id, role, slot, username):
+        """Write username (or None) into an exact slot, what lobby_service.SetSlot does to a lobby dict"""
+        self.CheckWritable()
+        rows = self.rows
+        row = rows.Find(lobby_id)
+        if row is None:
+            raise KeyError(lobby_id)
+        rows.SetSeat(row, lobby_id, role, slot, username)
+
+    def Changed(self, other):
+        """Ids of the lobbies another LobbyTable doesn't hold exactly like this one, found without decoding them"""
+        rows, other_rows = self.rows, other.rows
+        for row in rows.Live():
+            lobby_id = rows.Id(row)
+            other_row = other_rows.Find(lobby_id)
+            if other_row is None or rows.Stored(row) != other_rows.Stored(other_row):
+                yield lobby_id
+
+    def Copy(self):
+        """Writable copy, sharing nothing that either of them changes"""
+        table = LobbyTable()
+        table.rows = self.rows.Copy()
+        table.count = self.count
+        return table
+
+    def Freeze(self):
+        """Refuse every change from now on, returns the table"""
+        self.frozen = True
+        return self
+
+    def CheckWritable(self):
+        if self.frozen:
+            raise TypeError("Cached data is read-only, copy it before changing it")
+
+    def Grow(self):
+        """Make room for more rows, dropping the deleted ones once they are the majority"""
+        rows = self.rows
+        if (len(rows.leaders) - self.count) * 2 > len(rows.leaders):
+            self.rows = rows.Compacted()
+        else:
+            rows.Rehash()
@@ -0,0 +1,300 @@
+"""Lobbies split across worker processes by a hash of their name, with a router in front
+
+Each shard is a LobbyService in its own process with its own storage, so joins
+on different shards run on different cores. The router owns who is in which
+lobby: a player is reserved before their request reaches a shard, which keeps
+"one lobby per player" true across shards.
+"""
+import heapq
+import multiprocessing
+import os
+import threading
+import zlib
+from collections import defaultdict
+from src.backends import OpenServiceStorage, DEFAULT_STORAGE
+from src.lobby_service import LobbyService, LobbyMembers, Result
+
+DEFAULT_SHARDS = os.cpu_count() or 1
+
+
+def ShardSpec(spec, index):
+    """Storage spec of one shard: a subdirectory for the JSON backends, a sibling file for SQLite"""
+    kind, _, location = spec.partition(":")
+    if kind == "sqlite":
+        root, ext = os.path.splitext(location or "data/wow.db")
+        return f"{kind}:{root}.shard{index}{ext}"
+    return f"{kind}:{os.path.join(location or 'data', f'shard{index}')}"
+
+
+def ShardOf(lobby_id, shards):
+    """Shard a lobby lives on, the same in every process (unlike hash())"""
+    return zlib.crc32(lobby_id.encode('utf-8')) % shards
+
+
+# Per op: the LobbyService bulk method a shard runs, the lobby a request goes to, the players it claims
+# and what the router answers when one of them is already in a lobby
+OPS = {
+    "create": ("CreateMany", lambda user, name, rating: name.strip() if name else "",
+               lambda user, name, rating: [user['username']],
+               lambda username: "You're already in a lobby! Leave your current lobby before creating a new one."),
+    "join": ("JoinMany", lambda user, lobby_id: lobby_id,
+             lambda user, lobby_id: [user['username']],
+             lambda username: "You're already in a lobby! Leave your current lobby before joining another one."),
+    "form": ("FormMany", lambda users, name, rating: name,
+             lambda users, name, rating: [user['username'] for user in users],
+             lambda username: f"{username} is already in a lobby!"),
+    "leave": ("LeaveMany", lambda user, lobby_id: lobby_id, lambda user, lobby_id: [], None),
+    "delete": (None, lambda user, lobby_id: lobby_id, lambda user, lobby_id: [], None),
+}
+
+
+def Released(op, request, result):
+    """Players a successful action took out of their lobby"""
+    if op == "leave" and result.ok:
+        return [request[0]['username']]
+    return []
+
+
+def ShardMain(conn, spec):
+    """Worker process: run the requests that arrive on conn against one shard's LobbyService"""
+    storage = OpenServiceStorage(spec)
+    storage.InitDataFiles()
+    service = LobbyService(storage)
+    try:
+        while True:
+            try:
+                messages = [conn.recv()]
+                # Whatever queued up meanwhile goes into the same batches, one commit instead of one each
+                while conn.poll():
+                    messages.append(conn.recv())
+            except EOFError:
+                break
+            closing = messages[-1][1] == "close"
+            if closing:
+                messages.pop()
+            conn.send(RunMessages(service, messages))
+            if closing:
+                break
+    finally:
+        service.Close()
+        conn.close()
+
+
+def RunMessages(service, messages):
+    """Run (request_id, op, requests) messages in order, merging neighbours of the same op into one batch"""
+    replies = []
+    start = 0
+    while start < len(messages):
+        op = messages[start][1]
+        end = start + 1
+        if op in OPS and op != "delete":
+            while end < len(messages) and messages[end][1] == op:
+                end += 1
+        run = messages[start:end]
+        results = iter(RunOp(service, op, [request for _, _, requests in run for request in requests]))
+        for request_id, _, requests in run:
+            replies.append((request_id, [next(results) for _ in requests]))
+        start = end
+    return replies
+
+
+def RunOp(service, op, requests):
+    """One op over a list of requests, returns one reply per request"""
+    if op == "delete":
+        replies = []
+        for user, lobby_id in requests:
+            with service.lock:
+                lobby = service.LoadLobbies().get(lobby_id)
+                members = LobbyMembers(lobby) if lobby is not None else []
+                result = service.DeleteLobby(user, lobby_id)
+            replies.append((result, members if result.ok else []))
+        return replies
+    if op in OPS:
+        results = getattr(service, OPS[op][0])(requests)
+        return [(result, Released(op, request, result)) for request, result in zip(requests, results)]
+    if op == "lobbies":
+        return [dict(service.LoadLobbies()) for _ in requests]
+    if op == "members":
+        with service.lock:
+            service.Sync()
+            return [dict(service.member_index) for _ in requests]
+    if op == "joinable":
+        # (required_rating, lobby_id) so the router can merge every shard's list in rating order
+        with service.lock:
+            lobbies = service.LoadLobbies()
+            return [[(lobbies[lobby_id]['required_rating'], lobby_id) for lobby_id in service.JoinableLobbies(user)]
+                    for user in requests]
+    raise ValueError(f"Unknown shard op: {op}")
+
+
+class Shard:
+    """Router side of one worker process: sends requests & hands each reply to whoever waits for it"""
+
+    def __init__(self, context, spec):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=ShardMain, args=(child, spec), daemon=True)
+        self.process.start()
+        child.close()
+        self.send_lock = threading.Lock()
+        self.next_id = 0
+        # request id -> [Event, replies], filled by the reader thread
+        self.waiting = {}
+        self.reader = threading.Thread(target=self.ReadLoop, daemon=True, name="shard-reader")
+        self.reader.start()
+
+    def Send(self, op, requests):
+        """Send a batch of requests without waiting, returns the slot its replies land in"""
+        slot = [threading.Event(), None]
+        with self.send_lock:
+            self.next_id += 1
+            self.waiting[self.next_id] = slot
+            self.conn.send((self.next_id, op, requests))
+        return slot
+
+    def Wait(self, slot):
+        """Replies of a sent batch"""
+        slot[0].wait()
+        if slot[1] is None:
+            raise ConnectionError("Lobby shard stopped")
+        return slot[1]
+
+    def Call(self, op, requests):
+        """Send a batch of requests & block until their replies"""
+        return self.Wait(self.Send(op, requests))
+
+    def ReadLoop(self):
+        """Reader thread: route replies to their callers"""
+        try:
+            while True:
+                for request_id, replies in self.conn.recv():
+                    slot = self.waiting.pop(request_id)
+                    slot[1] = replies
+                    slot[0].set()
+        except (EOFError, OSError):
+            pass
+        finally:
+            # Wake every caller still waiting, they see no reply & raise
+            for slot in list(self.waiting.values()):
+                slot[0].set()
+
+    def Close(self):
+        """Stop the worker once it has finished what it was sent"""
+        with self.send_lock:
+            self.conn.send((None, "close", []))
+        self.process.join()
+        self.reader.join()
+        self.conn.close()
+
+
+class ShardedLobbyService:
+    """LobbyService's actions over lobbies split across worker processes, every action returns a Result"""
+
+    def __init__(self, spec=DEFAULT_STORAGE, shards=DEFAULT_SHARDS):
+        # Spawned workers don't inherit the router's threads & locks mid-use like forked ones would
+        context = multiprocessing.get_context("spawn")
+        self.shards = [Shard(context, ShardSpec(spec, i)) for i in range(shards)]
+        # username -> lobby_id for every player in a lobby or on the way into one, across all shards
+        self.lock = threading.Lock()
+        self.owners = {}
+        for shard in self.shards:
+            for username, lobby_id in shard.Call("members", [None])[0].items():
+                self.owners.setdefault(username, lobby_id)
+
+    def ShardOf(self, lobby_id):
+        """The Shard a lobby lives on"""
+        return self.shards[ShardOf(lobby_id, len(self.shards))]
+
+    def Run(self, op, requests):
+        """Reserve every request's players, send the rest to their shards & settle reservations on the replies"""
+        _, lobby_of, claims_of, taken_message = OPS[op]
+        results = [None] * len(requests)
+        batches = defaultdict(list)
+        with self.lock:
+            for i, request in enumerate(requests):
+                lobby_id = lobby_of(*request)
+                claims = claims_of(*request)
+                taken = next((username for username in claims if username in self.owners), None)
+                if taken is not None:
+                    results[i] = Result(False, taken_message(taken), lobby_id if op == "join" else None)
+                    continue
+                for username in claims:
+                    self.owners[username] = lobby_id
+                batches[self.ShardOf(lobby_id)].append(i)
+
+        sent = [(shard, indexes, shard.Send(op, [requests[i] for i in indexes])) for shard, indexes in batches.items()]
+        for shard, indexes, slot in sent:
+            for i, (result, released) in zip(indexes, shard.Wait(slot)):
+                results[i] = result
+                lobby_id = lobby_of(*requests[i])
+                # A refused request gives back what it claimed, a leave or delete frees its players
+                freed = released if result.ok else claims_of(*requests[i])
+                with self.lock:
+                    for username in freed:
+                        if self.owners.get(username) == lobby_id:
+                            del self.owners[username]
+        return results
+
+    # Single actions, each one is a batch of one
+
+    def CreateLobby(self, user, name, required_rating):
+        """Create a lobby led by user"""
+        return self.CreateMany([(user, name, required_rating)])[0]
+
+    def JoinLobby(self, user, lobby_id):
+        """Join a lobby"""
+        return self.JoinMany([(user, lobby_id)])[0]
+
+    def LeaveLobby(self, user, lobby_id):
+        """Leave a lobby"""
+        return self.LeaveMany([(user, lobby_id)])[0]
+
+    def DeleteLobby(self, user, lobby_id):
+        """Delete a lobby (leader only)"""
+        return self.Run("delete", [(user, lobby_id)])[0]
+
+    # Bulk actions, each shard gets its share of the batch as one message
+
+    def CreateMany(self, requests):
+        """Create lobbies from (user, name, required_rating) tuples"""
+        return self.Run("create", requests)
+
+    def JoinMany(self, requests):
+        """Join lobbies from (user, lobby_id) tuples"""
+        return self.Run("join", requests)
+
+    def LeaveMany(self, requests):
+        """Leave lobbies from (user, lobby_id) tuples"""
+        return self.Run("leave", requests)
+
+    def FormMany(self, requests):
+        """Create full lobbies from (users, name, required_rating) tuples, users[0] leads"""
+        return self.Run("form", requests)
+
+    # Reads
+
+    def LoadLobbies(self):
+        """Every shard's lobbies merged into one dict"""
+        lobbies = {}
+        for slot, shard in [(shard.Send("lobbies", [None]), shard) for shard in self.shards]:
+            lobbies.update(shard.Wait(slot)[0])
+        return lobbies
+
+    def LobbyOf(self, username):
+        """Id of the lobby username is in (or being seated in), None when in no lobby"""
+        return self.owners.get(username)
+
+    def IsUserInAnyLobby(self, user):
+        """Check if user is already in any lobby"""
+        return user['username'] in self.owners
+
+    def JoinableLobbies(self, user):
+        """Ids of lobbies user can join right now, lowest required_rating first"""
+        slots = [(shard.Send("joinable", [user]), shard) for shard in self.shards]
+        own_lobby = self.owners.get(user['username'])
+        ranked = heapq.merge(*(shard.Wait(slot)[0] for slot, shard in slots))
+        return [lobby_id for _, lobby_id in ranked if lobby_id != own_lobby]
+
+    def Close(self):
+        """Stop every worker, each flushes its storage on the way out"""
+        for shard in self.shards:
+            shard.Close()
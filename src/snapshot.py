@@ -0,0 +1,307 @@
+"""Binary snapshot of users & lobbies that readers mmap instead of parsing JSON
+
+Layout, all little-endian:
+    header       HEADER, positions of everything below
+    string table offsets (u32 per string, plus one end offset) then the UTF-8 bytes
+    users        USER records, strings as indexes into the string table
+    lobbies      LOBBY records
+    user index   open addressing hash table on crc32(username), u32 record number + 1, 0 is empty
+    lobby index  the same on lobby_id
+
+Lookups read a handful of records straight from the page cache, so opening is
+O(1) & every process mapping the file shares one copy of it. The snapshot
+records the signature of the JSON it was made from, OpenSnapshot ignores it
+once the JSON has changed since. JsonStorage.GetUser, & with it signing in,
+reads users from it for as long as users.json is unchanged.
+
+Write one next to the JSON files, then look a user or lobby up, from the repository root:
+    python -m src.snapshot write journal:data
+    python -m src.snapshot user journal:data player42
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from src.backends import OpenStorage
+from src.lobby_index import ROLES
+from src.model import ROLE_CODES, ToEpoch, FromEpoch
+from src.storage import AtomicWrite, JsonStorage
+
+SNAPSHOT_FILE = "snapshot.bin"
+MAGIC = b"WOWSNAP1"
+VERSION = 1
+# magic, version, user count, lobby count, string count, user index slots, lobby index slots,
+# source signature string, then the positions of string offsets, string bytes, users, lobbies & both indexes
+HEADER = struct.Struct("<8sIIIIIII6Q")
+# username, password, email, role code, rating, created_at micros, created_at text (NONE when micros fit)
+USER = struct.Struct("<IIIBiqI")
+# lobby_id, name, leader, required_rating, Tank, Healer, DPS x3, created_at micros, created_at text
+LOBBY = struct.Struct("<IIIi5IqI")
+SLOT = struct.Struct("<I")
+# String index standing for None
+NONE = 0xFFFFFFFF
+
+
+def SourceSignature(storage):
+    """What the snapshot of storage is current for, as text"""
+    return json.dumps([storage.Signature(storage.users_path), storage.LobbiesSignature()])
+
+
+def IndexSlots(count):
+    """Hash table size for count keys, a power of two at most half full"""
+    slots = 1
+    while slots < count * 2:
+        slots *= 2
+    return slots
+
+
+def BuildIndex(keys):
+    """Open addressing table of record number + 1, probed linearly from crc32(key)"""
+    slots = IndexSlots(len(keys))
+    mask = slots - 1
+    table = [0] * slots
+    for number, key in enumerate(keys):
+        slot = zlib.crc32(key) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = number + 1
+    return slots, struct.pack(f"<{slots}I", *table)
+
+
+class StringTable:
+    """Collects each distinct string once & hands out its index"""
+
+    def __init__(self):
+        self.indexes = {}
+        self.encoded = []
+
+    def Add(self, text):
+        """Index of text, None becomes NONE"""
+        if text is None:
+            return NONE
+        index = self.indexes.get(text)
+        if index is None:
+            index = self.indexes[text] = len(self.encoded)
+            self.encoded.append(text.encode('utf-8'))
+        return index
+
+    def Pack(self):
+        """(offsets bytes, string bytes)"""
+        offsets = [0]
+        for data in self.encoded:
+            offsets.append(offsets[-1] + len(data))
+        return struct.pack(f"<{len(offsets)}I", *offsets), b"".join(self.encoded)
+
+
+def Created(strings, text):
+    """created_at as (micros, text index), micros when they print back the same"""
+    value = ToEpoch(text)
+    if isinstance(value, int):
+        return value, NONE
+    return 0, strings.Add(value)
+
+
+def BuildSnapshot(users, lobbies, source=""):
+    """The snapshot file contents for users.json & lobbies.json dicts"""
+    strings = StringTable()
+    source_index = strings.Add(source)
+
+    user_records = []
+    for username, user in users.items():
+        micros, text = Created(strings, user['created_at'])
+        user_records.append(USER.pack(strings.Add(username), strings.Add(user['password']),
+                                      strings.Add(user['email']), ROLE_CODES[user['role']], user['rating'],
+                                      micros, text))
+
+    lobby_records = []
+    for lobby_id, lobby in lobbies.items():
+        members = lobby['members']
+        micros, text = Created(strings, lobby['created_at'])
+        seats = [strings.Add(username) for username in (members['Tank'], members['Healer'], *members['DPS'])]
+        lobby_records.append(LOBBY.pack(strings.Add(lobby_id), strings.Add(lobby['name']), strings.Add(lobby['leader']),
+                                        lobby['required_rating'], *seats, micros, text))
+
+    user_slots, user_index = BuildIndex([username.encode('utf-8') for username in users])
+    lobby_slots, lobby_index = BuildIndex([lobby_id.encode('utf-8') for lobby_id in lobbies])
+    offsets, data = strings.Pack()
+
+    sections = [offsets, data, b"".join(user_records), b"".join(lobby_records), user_index, lobby_index]
+    positions = []
+    parts = [None]
+    position = HEADER.size
+    for section in sections:
+        # Every section starts 8-byte aligned, so readers can view the u32 arrays in place
+        padding = -position % 8
+        parts.append(b"\0" * padding)
+        positions.append(position + padding)
+        parts.append(section)
+        position += padding + len(section)
+    parts[0] = HEADER.pack(MAGIC, VERSION, len(users), len(lobbies), len(strings.encoded), user_slots, lobby_slots,
+                           source_index, *positions)
+    return b"".join(parts)
+
+
+def WriteSnapshot(storage, path=None):
+    """Write a snapshot of a JSON storage's users & lobbies next to its files, returns its path"""
+    path = path or os.path.join(storage.data_dir, SNAPSHOT_FILE)
+    with storage.lock:
+        source = SourceSignature(storage)
+        data = BuildSnapshot(storage.LoadUsers(), storage.LoadLobbies(), source)
+    AtomicWrite(path, data, storage.fsync)
+    return path
+
+
+def OpenSnapshot(storage, path=None):
+    """The storage's snapshot if it is still current, else None"""
+    path = path or os.path.join(storage.data_dir, SNAPSHOT_FILE)
+    try:
+        snapshot = Snapshot(path)
+    except (FileNotFoundError, ValueError):
+        return None
+    if snapshot.Source() != SourceSignature(storage):
+        snapshot.Close()
+        return None
+    return snapshot
+
+
+class Snapshot:
+    """Read-only view of a snapshot file, records are decoded only when asked for"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size or self.map[:len(MAGIC)] != MAGIC:
+            self.map.close()
+            raise ValueError(f"Not a lobby snapshot: {path}")
+        (_, version, self.user_count, self.lobby_count, string_count, self.user_slots, self.lobby_slots,
+         self.source, offsets_at, self.strings_at, self.users_at, self.lobbies_at, user_index_at,
+         lobby_index_at) = HEADER.unpack_from(self.map)
+        if version != VERSION or sys.byteorder != "little":
+            self.map.close()
+            raise ValueError(f"Unsupported lobby snapshot version {version} on a {sys.byteorder}-endian CPU: {path}")
+        # u32 arrays read in place, nothing is copied out of the page cache
+        view = memoryview(self.map)
+        self.offsets = view[offsets_at:offsets_at + 4 * (string_count + 1)].cast("I")
+        self.user_index = view[user_index_at:user_index_at + 4 * self.user_slots].cast("I")
+        self.lobby_index = view[lobby_index_at:lobby_index_at + 4 * self.lobby_slots].cast("I")
+        view.release()
+
+    def Bytes(self, index):
+        """Raw UTF-8 bytes of a string"""
+        return self.map[self.strings_at + self.offsets[index]:self.strings_at + self.offsets[index + 1]]
+
+    def String(self, index):
+        """A string from the table, NONE gives None"""
+        if index == NONE:
+            return None
+        return self.Bytes(index).decode('utf-8')
+
+    def Source(self):
+        """Signature of the JSON this snapshot was made from"""
+        return self.String(self.source)
+
+    def Find(self, key, index, records_at, record):
+        """Record number of key via one of the hash indexes, None when absent"""
+        if not len(index):
+            return None
+        data = key.encode('utf-8')
+        mask = len(index) - 1
+        slot = zlib.crc32(data) & mask
+        while True:
+            entry = index[slot]
+            if not entry:
+                return None
+            # The key is every record's first field
+            key_index = SLOT.unpack_from(self.map, records_at + record.size * (entry - 1))[0]
+            if self.Bytes(key_index) == data:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    def Created(self, micros, text):
+        """created_at back as the text it was written from"""
+        return self.String(text) if text != NONE else FromEpoch(micros)
+
+    def ReadUser(self, number):
+        """(username, users.json entry) of a record"""
+        username, password, email, role, rating, micros, text = USER.unpack_from(
+            self.map, self.users_at + USER.size * number)
+        return self.String(username), {
+            "password": self.String(password),
+            "email": self.String(email),
+            "role": ROLES[role],
+            "rating": rating,
+            "created_at": self.Created(micros, text)
+        }
+
+    def ReadLobby(self, number):
+        """(lobby_id, lobbies.json entry) of a record"""
+        lobby_id, name, leader, required_rating, tank, healer, *rest = LOBBY.unpack_from(
+            self.map, self.lobbies_at + LOBBY.size * number)
+        *dps, micros, text = rest
+        return self.String(lobby_id), {
+            "name": self.String(name),
+            "leader": self.String(leader),
+            "required_rating": required_rating,
+            "members": {
+                "Tank": self.String(tank),
+                "Healer": self.String(healer),
+                "DPS": [self.String(username) for username in dps]
+            },
+            "created_at": self.Created(micros, text)
+        }
+
+    def User(self, username):
+        """users.json entry of username, None when there is no such user"""
+        number = self.Find(username, self.user_index, self.users_at, USER)
+        return self.ReadUser(number)[1] if number is not None else None
+
+    def Lobby(self, lobby_id):
+        """lobbies.json entry of a lobby, None when there is no such lobby"""
+        number = self.Find(lobby_id, self.lobby_index, self.lobbies_at, LOBBY)
+        return self.ReadLobby(number)[1] if number is not None else None
+
+    def Users(self):
+        """Every user decoded, the same dict as users.json"""
+        return dict(self.ReadUser(number) for number in range(self.user_count))
+
+    def Lobbies(self):
+        """Every lobby decoded, the same dict as lobbies.json"""
+        return dict(self.ReadLobby(number) for number in range(self.lobby_count))
+
+    def Close(self):
+        """Unmap the file"""
+        for array in (self.offsets, self.user_index, self.lobby_index):
+            array.release()
+        self.map.close()
+
+
+def Main(argv):
+    if len(argv) < 2 or argv[0] not in ("write", "user", "lobby") or (argv[0] != "write" and len(argv) != 3):
+        print("usage: python -m src.snapshot write <spec> | user <spec> <username> | lobby <spec> <lobby id>")
+        return 2
+
+    storage = OpenStorage(argv[1])
+    if not isinstance(storage, JsonStorage):
+        print("Snapshots sit next to the JSON files, use a json: or journal: storage")
+        return 2
+    if argv[0] == "write":
+        path = WriteSnapshot(storage)
+        print(f"Wrote {path} ({os.path.getsize(path)} bytes)")
+        return 0
+
+    snapshot = OpenSnapshot(storage)
+    if snapshot is None:
+        print(f"No current snapshot in {argv[1]}, run: python -m src.snapshot write {argv[1]}")
+        return 1
+    try:
+        record = snapshot.User(argv[2]) if argv[0] == "user" else snapshot.Lobby(argv[2])
+    finally:
+        snapshot.Close()
+    print(json.dumps(record, indent=2))
+    return 0 if record is not None else 1
+
+
+if __name__ == "__main__":
+    sys.exit(Main(sys.argv[1:]))
@@ -0,0 +1,213 @@
+import itertools
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import deque
+from src.lobby_index import ROLES
+from src.lobby_service import DPS_SLOTS, LobbyMembers, Result
+from src.ticker import Ticker
+
+# Players of each role a formed group needs, the same shape as a lobby's members
+GROUP_SHAPE = {"Tank": 1, "Healer": 1, "DPS": DPS_SLOTS}
+# How many of the latest queue times per role the percentiles are computed over
+WAIT_SAMPLES = 1000
+
+
+class SoloQueue:
+    """Forms full lobbies out of queued players, accepting a wider rating spread the longer they wait"""
+
+    def __init__(self, service, base_window=100, widen_per_second=10, max_window=1000,
+                 clock=time.monotonic):
+        self.service = service
+        self.base_window = base_window
+        self.widen_per_second = widen_per_second
+        self.max_window = max_window
+        self.clock = clock
+        self.lock = threading.Lock()
+        # role -> sorted list of (rating, username), entries of players who left stay until compacted
+        self.by_role = {role: [] for role in ROLES}
+        # role -> the (rating, username) entries in by_role that no longer count
+        self.removed = {role: set() for role in ROLES}
+        # username -> (user, queued_at), insertion order is queue order
+        self.waiting = {}
+        self.waits = {role: deque(maxlen=WAIT_SAMPLES) for role in ROLES}
+        self.names = itertools.count(1)
+        self.ticker = None
+        # Usernames every commit seated since the last tick, only they can have left the queue for a lobby
+        self.seated = deque()
+        # Set when the service reloaded & anyone may be seated now
+        self.resync = False
+        service.Subscribe(self.Seated)
+
+    def Enqueue(self, user):
+        """Put a player into the queue"""
+        with self.lock:
+            if user['username'] in self.waiting:
+                return Result(False, "You're already queued!", None)
+            if self.service.LobbyOf(user['username']) is not None:
+                return Result(False, "You're already in a lobby! Leave your current lobby before queueing.", None)
+
+            self.Add(user, self.clock())
+            return Result(True, "Queued, a lobby will be formed for you.", None)
+
+    def Dequeue(self, username):
+        """Take a player out of the queue"""
+        with self.lock:
+            if username not in self.waiting:
+                return Result(False, "You're not queued!", None)
+            self.Remove(username)
+            return Result(True, "Left the queue.", None)
+
+    def Add(self, user, queued_at):
+        """Put a player into the queue structures"""
+        self.waiting[user['username']] = (user, queued_at)
+        entry = (user['rating'], user['username'])
+        removed = self.removed[user['role']]
+        if entry in removed:
+            # The old entry is still in the list, it counts again instead of inserting another
+            removed.discard(entry)
+        else:
+            insort(self.by_role[user['role']], entry)
+
+    def Remove(self, username):
+        """Drop a player from the queue structures, O(1) by marking their entry removed"""
+        user, _ = self.waiting.pop(username)
+        role = user['role']
+        removed = self.removed[role]
+        removed.add((user['rating'], username))
+        # Sweep the marked entries out once they make up half the list, O(1) amortized per removal
+        if len(removed) * 2 > len(self.by_role[role]):
+            self.by_role[role] = [entry for entry in self.by_role[role] if entry not in removed]
+            removed.clear()
+
+    def Seated(self, mutations):
+        """Service listener: note who a commit seated, the service's lock is held so the queue's isn't taken"""
+        if mutations is None:
+            self.resync = True
+            return
+        for mutation in mutations:
+            if mutation['op'] == "join":
+                self.seated.append(mutation['username'])
+            elif mutation['op'] == "create":
+                self.seated.extend(LobbyMembers(mutation['lobby']))
+
+    def DropSeated(self):
+        """Take whoever got into a lobby since the last tick out of the queue, caller holds the lock"""
+        if self.resync:
+            self.resync = False
+            self.seated.clear()
+            candidates = list(self.waiting)
+        else:
+            candidates = [self.seated.popleft() for _ in range(len(self.seated))]
+        for username in candidates:
+            # They may have left that lobby & queued again since
+            if username in self.waiting and self.service.LobbyOf(username) is not None:
+                self.Remove(username)
+
+    def Window(self, waited):
+        """Rating spread accepted around a player who has waited this many seconds"""
+        return min(self.base_window + self.widen_per_second * waited, self.max_window)
+
+    def Nearest(self, role, rating, window, count, skip=None):
+        """Up to count queued usernames of role closest to rating & within window of it"""
+        entries = self.by_role[role]
+        removed = self.removed[role]
+        # Walk outwards from where rating would sit, always taking the closer side
+        hi = bisect_left(entries, (rating,))
+        lo = hi - 1
+        found = []
+        while len(found) < count:
+            below = rating - entries[lo][0] if lo >= 0 else None
+            above = entries[hi][0] - rating if hi < len(entries) else None
+            if below is not None and (above is None or below <= above):
+                distance, entry = below, entries[lo]
+                lo -= 1
+            elif above is not None:
+                distance, entry = above, entries[hi]
+                hi += 1
+            else:
+                break
+            if distance > window:
+                break
+            if entry[1] != skip and entry not in removed:
+                found.append(entry[1])
+        return found
+
+    def FindGroup(self, username, now):
+        """A full group around username within their current window, None if the queue can't fill one"""
+        user, queued_at = self.waiting[username]
+        window = self.Window(now - queued_at)
+        group = [username]
+        for role, count in GROUP_SHAPE.items():
+            if role == user['role']:
+                count -= 1
+            found = self.Nearest(role, user['rating'], window, count, skip=username)
+            if len(found) < count:
+                return None
+            group.extend(found)
+        return group
+
+    def Tick(self):
+        """Form every group the queue allows right now, longest waiting players first, returns the Results"""
+        with self.lock:
+            now = self.clock()
+            # Players who joined a lobby by hand meanwhile leave the queue
+            self.DropSeated()
+
+            groups = []
+            for username in list(self.waiting):
+                if username not in self.waiting:
+                    continue
+                group = self.FindGroup(username, now)
+                if group is None:
+                    continue
+                users = [self.waiting[member][0] for member in group]
+                queued = [self.waiting[member][1] for member in group]
+                for member in group:
+                    self.Remove(member)
+                groups.append((users, queued))
+
+            if not groups:
+                return []
+
+            requests = [(users, f"Solo Queue {users[0]['username']} #{next(self.names)}",
+                         min(user['rating'] for user in users))
+                        for users, _ in groups]
+            results = self.service.FormMany(requests)
+
+            for (users, queued), result in zip(groups, results):
+                if result.ok:
+                    for user, queued_at in zip(users, queued):
+                        self.waits[user['role']].append(now - queued_at)
+                    continue
+                # Put the group back with its original queue times, whoever is now in a lobby drops out next tick
+                for user, queued_at in zip(users, queued):
+                    self.Add(user, queued_at)
+            return results
+
+    def Percentiles(self, points=(50, 90, 99)):
+        """Queue time in seconds at each percentile, per role, over the latest formed groups"""
+        with self.lock:
+            report = {}
+            for role, waits in self.waits.items():
+                ordered = sorted(waits)
+                report[role] = {point: ordered[min(len(ordered) - 1, len(ordered) * point // 100)] if ordered else None
+                                for point in points}
+            return report
+
+    def QueuedCount(self, role):
+        """How many players of role are waiting"""
+        with self.lock:
+            return len(self.by_role[role]) - len(self.removed[role])
+
+    def Start(self, interval=1.0):
+        """Run Tick on a fixed-rate background ticker"""
+        self.ticker = Ticker(interval, self.Tick)
+        self.ticker.start()
+
+    def Stop(self):
+        """Stop the ticker, waits for a running tick to finish"""
+        if self.ticker is not None:
+            self.ticker.Stop()
+            self.ticker = None
+
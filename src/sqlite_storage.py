@@ -0,0 +1,264 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from src.lobby_service import DPS_SLOTS
+from src.metrics import Timed
+from src.model import LobbyTable
+from src.storage import Storage, ConflictError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    email TEXT NOT NULL,
+    role TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_role_rating ON users(role, rating);
+
+CREATE TABLE IF NOT EXISTS lobbies (
+    lobby_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    leader TEXT NOT NULL,
+    required_rating INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lobbies_required_rating ON lobbies(required_rating);
+
+CREATE TABLE IF NOT EXISTS slots (
+    lobby_id TEXT NOT NULL REFERENCES lobbies(lobby_id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    username TEXT,
+    PRIMARY KEY (lobby_id, role, slot)
+);
+-- One lobby per player, enforced by the database across every process
+CREATE UNIQUE INDEX IF NOT EXISTS slots_username ON slots(username) WHERE username IS NOT NULL;
+CREATE INDEX IF NOT EXISTS slots_open_role ON slots(role, lobby_id) WHERE username IS NULL;
+"""
+
+# (role, slot) of every seat in a lobby, Tank & Healer only have slot 0
+SEATS = [("Tank", 0), ("Healer", 0)] + [("DPS", i) for i in range(DPS_SLOTS)]
+
+
+class SqliteStorage(Storage):
+    """Users & lobbies in one SQLite database (WAL mode), safe to share between processes"""
+
+    def __init__(self, path="data/wow.db", fsync=True):
+        super().__init__()
+        self.path = path
+        self.fsync = fsync
+        self.db = None
+        # Bumped on our own commits, PRAGMA data_version only counts other connections'
+        self.user_writes = 0
+        self.lobby_writes = 0
+
+    def Connect(self):
+        """Open the connection on first use"""
+        if self.db is None:
+            self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+            self.db.execute("PRAGMA foreign_keys=ON")
+        return self.db
+
+    def Close(self):
+        """Close the connection"""
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    def InitDataFiles(self):
+        """Create the database & its tables if they don't exist"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self.lock:
+            self.Connect().executescript(SCHEMA)
+
+    @contextmanager
+    def Transaction(self):
+        """Write transaction, takes the database write lock up front so it can't deadlock later"""
+        db = self.Connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def DataVersion(self):
+        """Changes whenever another connection commits"""
+        return self.Connect().execute("PRAGMA data_version").fetchone()[0]
+
+    def UsersSignature(self):
+        """Fingerprint of the users table"""
+        with self.lock:
+            return (self.DataVersion(), self.user_writes)
+
+    def LobbiesSignature(self):
+        """Fingerprint of the lobbies & slots tables"""
+        with self.lock:
+            return (self.DataVersion(), self.lobby_writes)
+
+    @Timed
+    def LoadUsers(self):
+        """Load every user, read-only"""
+        return self.Cached("users", self.UsersSignature(), self.ReadUsers)
+
+    def ReadUsers(self):
+        """Query every user into the users.json shape"""
+        with self.lock:
+            rows = self.Connect().execute(
+                "SELECT username, password, email, role, rating, created_at FROM users ORDER BY rowid")
+            return {username: {"password": password, "email": email, "role": role,
+                               "rating": rating, "created_at": created_at}
+                    for username, password, email, role, rating, created_at in rows}
+
+    @Timed
+    def SaveUsers(self, users):
+        """Replace every user"""
+        with self.lock:
+            with self.Transaction() as db:
+                db.execute("DELETE FROM users")
+                db.executemany(
+                    "INSERT INTO users (username, password, email, role, rating, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(username, user['password'], user['email'], user['role'], user['rating'], user['created_at'])
+                     for username, user in users.items()])
+            self.user_writes += 1
+
+    @Timed
+    def GetUser(self, username):
+        """One user by primary key, None when there is no such user"""
+        with self.lock:
+            row = self.Connect().execute(
+                "SELECT password, email, role, rating, created_at FROM users WHERE username = ?",
+                (username,)).fetchone()
+        if row is None:
+            return None
+        password, email, role, rating, created_at = row
+        return {"password": password, "email": email, "role": role, "rating": rating, "created_at": created_at}
+
+    @Timed
+    def AddUser(self, username, user):
+        """Insert one user, the primary key refuses a taken name even from another process"""
+        with self.lock:
+            try:
+                with self.Transaction() as db:
+                    db.execute(
+                        "INSERT INTO users (username, password, email, role, rating, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (username, user['password'], user['email'], user['role'], user['rating'], user['created_at']))
+            except sqlite3.IntegrityError:
+                return False
+            self.user_writes += 1
+            return True
+
+    def IterUsers(self):
+        """Stream every user in insertion order, on a connection of its own so writes can go on meanwhile"""
+        db = sqlite3.connect(self.path, timeout=30)
+        try:
+            for username, password, email, role, rating, created_at in db.execute(
+                    "SELECT username, password, email, role, rating, created_at FROM users ORDER BY rowid"):
+                yield username, {"password": password, "email": email, "role": role,
+                                 "rating": rating, "created_at": created_at}
+        finally:
+            db.close()
+
+    def ReplaceUsers(self, pairs):
+        """Replace every user in one transaction, sqlite consumes the pairs as it inserts them"""
+        with self.lock:
+            with self.Transaction() as db:
+                db.execute("DELETE FROM users")
+                db.executemany(
+                    "INSERT INTO users (username, password, email, role, rating, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    ((username, user['password'], user['email'], user['role'], user['rating'], user['created_at'])
+                     for username, user in pairs))
+            self.user_writes += 1
+
+    @Timed
+    def LoadLobbies(self):
+        """Load every lobby, read-only"""
+        return self.Cached("lobbies", self.LobbiesSignature(), self.ReadLobbies)
+
+    def ReadLobbies(self):
+        """Query every lobby & its slots into a LobbyTable"""
+        with self.lock:
+            db = self.Connect()
+            # One read transaction so lobbies & slots come from the same snapshot
+            db.execute("BEGIN")
+            try:
+                lobbies = LobbyTable()
+                for lobby_id, name, leader, required_rating, created_at in db.execute(
+                        "SELECT lobby_id, name, leader, required_rating, created_at FROM lobbies ORDER BY rowid"):
+                    lobbies[lobby_id] = {
+                        "name": name,
+                        "leader": leader,
+                        "required_rating": required_rating,
+                        "members": {"Tank": None, "Healer": None, "DPS": [None] * DPS_SLOTS},
+                        "created_at": created_at
+                    }
+
+                for lobby_id, role, slot, username in db.execute(
+                        "SELECT lobby_id, role, slot, username FROM slots WHERE username IS NOT NULL"):
+                    lobbies.SetSlot(lobby_id, role, slot, username)
+            finally:
+                db.execute("COMMIT")
+            return lobbies
+
+    @Timed
+    def SaveLobbies(self, lobbies):
+        """Replace every lobby"""
+        with self.lock:
+            with self.Transaction() as db:
+                db.execute("DELETE FROM lobbies")
+                for lobby_id, lobby in lobbies.items():
+                    self.InsertLobby(db, lobby_id, lobby)
+            self.lobby_writes += 1
+
+    def InsertLobby(self, db, lobby_id, lobby):
+        """Insert one lobby row & its five slot rows"""
+        db.execute("INSERT INTO lobbies (lobby_id, name, leader, required_rating, created_at) VALUES (?, ?, ?, ?, ?)",
+                   (lobby_id, lobby['name'], lobby['leader'], lobby['required_rating'], lobby['created_at']))
+        members = lobby['members']
+        db.executemany("INSERT INTO slots (lobby_id, role, slot, username) VALUES (?, ?, ?, ?)",
+                       [(lobby_id, role, slot, members['DPS'][slot] if role == "DPS" else members[role])
+                        for role, slot in SEATS])
+
+    @Timed
+    def CommitLobbies(self, lobbies, mutations):
+        """Apply a batch of mutations as conditional statements in one transaction"""
+        with self.lock:
+            try:
+                with self.Transaction() as db:
+                    for mutation in mutations:
+                        self.ApplySql(db, mutation)
+            except sqlite3.IntegrityError as e:
+                # Duplicate lobby name or a player who already sits in another lobby
+                raise ConflictError(str(e))
+            self.lobby_writes += 1
+
+    def ApplySql(self, db, mutation):
+        """Run one mutation, raises ConflictError if the row it expects has changed"""
+        op = mutation['op']
+        lobby_id = mutation['lobby_id']
+        if op == "create":
+            self.InsertLobby(db, lobby_id, mutation['lobby'])
+            return
+
+        if op == "delete":
+            cursor = db.execute("DELETE FROM lobbies WHERE lobby_id = ?", (lobby_id,))
+        elif op == "join":
+            # Claiming a seat is one conditional UPDATE, a racing claim finds it taken & updates nothing
+            cursor = db.execute(
+                "UPDATE slots SET username = ? WHERE lobby_id = ? AND role = ? AND slot = ? AND username IS NULL",
+                (mutation['username'], lobby_id, mutation['role'], mutation['slot'] or 0))
+        elif op == "leave":
+            cursor = db.execute(
+                "UPDATE slots SET username = NULL WHERE lobby_id = ? AND role = ? AND slot = ? AND username = ?",
+                (lobby_id, mutation['role'], mutation['slot'] or 0, mutation['username']))
+        else:
+            raise ValueError(f"Unknown lobby mutation: {op}")
+
+        if cursor.rowcount == 0:
+            raise ConflictError(f"{op} on {lobby_id} lost a race")
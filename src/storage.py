@@ -0,0 +1,383 @@
+import json
+import os
+import threading
+from src.metrics import CountRead, CountWritten, Timed
+from src.model import LobbyTable
+
+
+def AtomicWrite(path, data, fsync=True):
+    """Write bytes to a temp file, fsync it & rename it over path so readers never see half a file"""
+    AtomicWriteChunks(path, [data], fsync)
+
+
+def AtomicWriteChunks(path, chunks, fsync=True):
+    """AtomicWrite for data produced a piece at a time, only one chunk is in memory at once"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+            CountWritten(len(chunk))
+        f.flush()
+        if fsync:
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    # Make the rename itself durable
+    if not fsync:
+        return
+    try:
+        dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def JsonObjectChunks(pairs):
+    """json.dumps(dict(pairs), indent=2) as UTF-8 chunks, one per pair, without building the dict"""
+    empty = True
+    for key, value in pairs:
+        # Nested lines move in by one level, JSON strings never hold a raw newline
+        entry = f"  {json.dumps(key)}: {json.dumps(value, indent=2)}".replace("\n", "\n  ")
+        yield (("{\n" if empty else ",\n") + entry).encode('utf-8')
+        empty = False
+    yield b"{}" if empty else b"\n}"
+
+
+def IterJsonObject(f, chunk_size=1 << 20):
+    """(key, value) pairs of the JSON object in a text file, reading chunk_size characters at a time"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def Fill():
+        # Keep only the unparsed tail, so memory stays at one chunk plus the entry being parsed
+        nonlocal buffer, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def Skip():
+        # Next non-whitespace character, None at the end of the file
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos] if pos < len(buffer) else None
+            Fill()
+
+    def Value():
+        # A value that ends right at the buffer's end may be cut short (a number), read on to be sure
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if end < len(buffer) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            Fill()
+
+    def Expect(characters):
+        nonlocal pos
+        character = Skip()
+        if character is None or character not in characters:
+            raise json.JSONDecodeError(f"Expected one of {characters!r}", buffer, pos)
+        pos += 1
+        return character
+
+    if Skip() is None:
+        return
+    Expect("{")
+    if Skip() == "}":
+        return
+    while True:
+        Skip()
+        key = Value()
+        Expect(":")
+        Skip()
+        yield key, Value()
+        if Expect(",}") == "}":
+            return
+
+
+class FrozenDict(dict):
+    """Read-only dict handed out by the load cache, dict(view) gives a writable shallow copy"""
+
+    def Refuse(self, *args, **kwargs):
+        raise TypeError("Cached data is read-only, copy it before changing it")
+
+    __setitem__ = __delitem__ = __ior__ = Refuse
+    clear = pop = popitem = setdefault = update = Refuse
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def __deepcopy__(self, memo):
+        return Thaw(self)
+
+
+class FrozenList(list):
+    """Read-only list handed out by the load cache"""
+
+    def Refuse(self, *args, **kwargs):
+        raise TypeError("Cached data is read-only, copy it before changing it")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = Refuse
+    append = extend = insert = pop = remove = clear = sort = reverse = Refuse
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+    def __deepcopy__(self, memo):
+        return Thaw(self)
+
+
+def Freeze(data):
+    """Deep read-only copy of parsed JSON, a LobbyTable is frozen as it is"""
+    if isinstance(data, LobbyTable):
+        return data.Freeze()
+    if isinstance(data, dict):
+        return FrozenDict((key, Freeze(value)) for key, value in data.items())
+    if isinstance(data, list):
+        return FrozenList(Freeze(value) for value in data)
+    return data
+
+
+def Thaw(data):
+    """Deep writable copy of (possibly frozen) JSON data or a LobbyTable"""
+    if isinstance(data, LobbyTable):
+        return data.Copy()
+    if isinstance(data, dict):
+        return {key: Thaw(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [Thaw(value) for value in data]
+    return data
+
+
+class ConflictError(Exception):
+    """Another process changed the lobbies first, the batch has to be retried on fresh data"""
+
+
+class Storage:
+    """Base of every storage backend: LoadUsers/SaveUsers/LoadLobbies/SaveLobbies plus a load cache"""
+
+    def __init__(self):
+        # Held by whoever reads or mutates the loaded state, so a writer thread never sees it half changed
+        self.lock = threading.RLock()
+        # key -> (signature, frozen data), only reloaded once another writer changed the data
+        self.cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def Cached(self, key, signature, load):
+        """Frozen result of load(), reused for as long as signature stays the same"""
+        with self.lock:
+            entry = self.cache.get(key)
+            if signature is not None and entry is not None and entry[0] == signature:
+                self.cache_hits += 1
+                return entry[1]
+
+            self.cache_misses += 1
+            data = Freeze(load())
+            if signature is not None:
+                self.cache[key] = (signature, data)
+            return data
+
+    def CacheStats(self):
+        """Load cache hit & miss counters"""
+        return {"hits": self.cache_hits, "misses": self.cache_misses}
+
+    def GetUser(self, username):
+        """One user (read-only) or None, by default looked up in every loaded user"""
+        return self.LoadUsers().get(username)
+
+    def AddUser(self, username, user):
+        """Add one user unless the name is taken, returns whether it was added"""
+        with self.lock:
+            # Loaded users are a read-only view, copy before adding to it
+            users = dict(self.LoadUsers())
+            if username in users:
+                return False
+            users[username] = user
+            self.SaveUsers(users)
+            return True
+
+    def IterUsers(self):
+        """(username, user) of every user, backends that can stream them avoid loading them all"""
+        return iter(self.LoadUsers().items())
+
+    def ReplaceUsers(self, pairs):
+        """Replace every user with (username, user) pairs, backends that can stream them avoid a dict"""
+        self.SaveUsers(dict(pairs))
+
+    def CommitLobbies(self, lobbies, mutations):
+        """Persist a batch of lobby mutations, by default by saving the whole dict"""
+        self.SaveLobbies(lobbies)
+
+    def Flush(self):
+        """Durability barrier, writes are synchronous unless a backend says otherwise"""
+
+    def Close(self):
+        """Release whatever the backend holds open"""
+
+
+class JsonStorage(Storage):
+    """Reads & writes users and lobbies as JSON files"""
+
+    def __init__(self, data_dir="data", users_file="users.json", lobbies_file="lobbies.json", fsync=True):
+        super().__init__()
+        self.data_dir = data_dir
+        self.users_path = os.path.join(data_dir, users_file)
+        self.lobbies_path = os.path.join(data_dir, lobbies_file)
+        self.fsync = fsync
+        # snapshot.bin next to the JSON files, mapped on the first lookup that can use it
+        self.snapshot = None
+        self.snapshot_signature = None
+        self.snapshot_users = None
+
+    def InitDataFiles(self):
+        """Create JSON files if they don't exist"""
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        for path in (self.users_path, self.lobbies_path):
+            if not os.path.exists(path):
+                self.WriteJson(path, {})
+
+    def ReadJson(self, path):
+        """Read a JSON object, an empty/missing/broken file counts as empty"""
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            CountRead(len(content))
+            content = content.strip()
+            if not content:
+                return {}
+            return json.loads(content)
+        except (json.JSONDecodeError, FileNotFoundError):
+            return {}
+
+    def ReadLobbies(self, path):
+        """Stream a lobbies file into a LobbyTable, an empty/missing/broken file counts as empty"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                lobbies = LobbyTable(IterJsonObject(f))
+                CountRead(os.fstat(f.fileno()).st_size)
+            return lobbies
+        except (json.JSONDecodeError, FileNotFoundError):
+            return LobbyTable()
+
+    def WriteLobbies(self, path, lobbies):
+        """Stream lobbies into a JSON file, atomically, the same bytes WriteJson would write"""
+        AtomicWriteChunks(path, JsonObjectChunks(lobbies.items()), self.fsync)
+        with self.lock:
+            self.cache.pop(path, None)
+
+    def WriteJson(self, path, data):
+        """Write a JSON object to the given path, atomically"""
+        AtomicWrite(path, json.dumps(data, indent=2).encode('utf-8'), self.fsync)
+        with self.lock:
+            self.cache.pop(path, None)
+
+    def Signature(self, path):
+        """Cheap fingerprint of a file, changes whenever someone rewrites it"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        # Atomic writes rename a new file in, so the inode changes even if mtime & size don't
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def LobbiesSignature(self):
+        """Fingerprint of the lobbies file"""
+        return self.Signature(self.lobbies_path)
+
+    @Timed
+    def LoadUsers(self):
+        """Load users from JSON file, read-only"""
+        return self.Cached(self.users_path, self.Signature(self.users_path),
+                           lambda: self.ReadJson(self.users_path))
+
+    @Timed
+    def SaveUsers(self, users):
+        """Save users to JSON file"""
+        self.WriteJson(self.users_path, users)
+
+    @Timed
+    def GetUser(self, username):
+        """One user (read-only) or None, read from a current snapshot.bin instead of parsing users.json if there is one"""
+        with self.lock:
+            signature = self.Signature(self.users_path)
+            entry = self.cache.get(self.users_path)
+            # Users parsed already are the faster lookup
+            if entry is None or entry[0] != signature:
+                snapshot = self.UsersSnapshot(signature)
+                if snapshot is not None:
+                    return snapshot.User(username)
+            return self.LoadUsers().get(username)
+
+    def UsersSnapshot(self, signature):
+        """The mapped snapshot.bin if it was written from users.json as of signature, else None"""
+        # The snapshot module builds on this one, so it is only imported once a lookup gets here
+        from src.snapshot import SNAPSHOT_FILE, Snapshot
+        path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        snapshot_signature = self.Signature(path)
+        if snapshot_signature != self.snapshot_signature:
+            self.CloseSnapshot()
+            if snapshot_signature is not None:
+                try:
+                    self.snapshot = Snapshot(path)
+                    # Written as [users signature, lobbies signature], tuples come back as lists
+                    self.snapshot_users = json.loads(self.snapshot.Source())[0]
+                except (FileNotFoundError, ValueError):
+                    self.CloseSnapshot()
+            self.snapshot_signature = snapshot_signature
+        if self.snapshot is None or self.snapshot_users != (list(signature) if signature is not None else None):
+            return None
+        return self.snapshot
+
+    def CloseSnapshot(self):
+        """Unmap the snapshot, if one is mapped"""
+        if self.snapshot is not None:
+            self.snapshot.Close()
+        self.snapshot = None
+        self.snapshot_users = None
+
+    def Close(self):
+        """Unmap the snapshot"""
+        with self.lock:
+            self.CloseSnapshot()
+
+    def IterUsers(self):
+        """Stream (username, user) pairs out of the JSON file without parsing it all at once"""
+        try:
+            with open(self.users_path, 'r', encoding='utf-8') as f:
+                yield from IterJsonObject(f)
+        except FileNotFoundError:
+            return
+
+    def ReplaceUsers(self, pairs):
+        """Stream (username, user) pairs into a new JSON file, the same bytes SaveUsers would write"""
+        AtomicWriteChunks(self.users_path, JsonObjectChunks(pairs), self.fsync)
+        with self.lock:
+            self.cache.pop(self.users_path, None)
+
+    @Timed
+    def LoadLobbies(self):
+        """Load lobbies from JSON file into a read-only LobbyTable"""
+        return self.Cached(self.lobbies_path, self.LobbiesSignature(),
+                           lambda: self.ReadLobbies(self.lobbies_path))
+
+    @Timed
+    def SaveLobbies(self, lobbies):
+        """Save lobbies to JSON file"""
+        self.WriteLobbies(self.lobbies_path, lobbies)
@@ -0,0 +1,33 @@
+import threading
+import time
+
+
+class Ticker(threading.Thread):
+    """Calls fn every interval seconds on a fixed schedule, a slow tick skips the ticks it overran"""
+
+    def __init__(self, interval, fn):
+        super().__init__(daemon=True, name="ticker")
+        self.interval = interval
+        self.fn = fn
+        self.stopped = threading.Event()
+        self.error = None
+
+    def run(self):
+        next_tick = time.monotonic() + self.interval
+        while not self.stopped.wait(max(next_tick - time.monotonic(), 0)):
+            try:
+                self.fn()
+            except Exception as e:
+                # Kept for whoever checks on the ticker, one failed tick doesn't stop the schedule
+                self.error = e
+            # Schedule from the plan, not from when fn returned, so ticks don't drift
+            next_tick += self.interval
+            now = time.monotonic()
+            if next_tick < now:
+                next_tick += (now - next_tick) // self.interval * self.interval + self.interval
+
+    def Stop(self):
+        """Stop ticking & wait for the thread"""
+        self.stopped.set()
+        if self is not threading.current_thread():
+            self.join()
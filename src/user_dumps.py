@@ -0,0 +1,41 @@
+"""Stream users between a users.json dump & any storage, in memory that doesn't grow with the dump
+
+From the repository root:
+    python -m src.user_dumps import dump.json sqlite:data/wow.db
+    python -m src.user_dumps export sqlite:data/wow.db dump.json
+"""
+import os
+import sys
+import time
+from src.backends import CopyUsers, OpenStorage
+from src.storage import JsonStorage
+
+
+def DumpFile(path):
+    """A users.json-shaped file anywhere, as a storage that streams it"""
+    return JsonStorage(os.path.dirname(path) or ".", users_file=os.path.basename(path))
+
+
+def Main(argv):
+    if len(argv) != 3 or argv[0] not in ("import", "export"):
+        print("usage: python -m src.user_dumps import <dump.json> <spec> | export <spec> <dump.json>")
+        return 2
+
+    if argv[0] == "import":
+        source, target = DumpFile(argv[1]), OpenStorage(argv[2])
+        target.InitDataFiles()
+    else:
+        source, target = OpenStorage(argv[1]), DumpFile(argv[2])
+
+    start = time.perf_counter()
+    try:
+        users = CopyUsers(source, target)
+    finally:
+        source.Close()
+        target.Close()
+    print(f"Copied {users} users from {argv[1]} to {argv[2]} in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(Main(sys.argv[1:]))
@@ -0,0 +1,251 @@
+import threading
+import time
+from src.lobby_service import ApplyMutation
+from src.storage import Thaw
+
+# Seconds between retries of a flush that failed
+RETRY_DELAY = 1.0
+# Failed flushes in a row after which new writes are refused instead of queued behind them
+MAX_FAILURES = 3
+
+
+class WriteBehindStorage:
+    """Wraps a storage & merges every write made within a short window into one flush"""
+
+    def __init__(self, inner, window=0.02, max_ops=64):
+        self.inner = inner
+        self.window = window
+        self.max_ops = max_ops
+        # Held by the services on top while they read & queue writes, a flush only holds it to take the batch
+        self.lock = threading.RLock()
+        self.wakeup = threading.Condition(self.lock)
+        # The inner storage's lock keeps flushes in order, taken after self.lock, never before it
+        self.flush_lock = inner.lock
+
+        self.pending_users = None
+        self.pending_mutations = []
+        self.pending_ops = 0
+        self.first_pending_at = None
+
+        # Flush side, guarded by flush_lock: what the last failed flush still has to write,
+        # & the lobbies as of the last flush, advanced batch by batch so a flush never reads the service's dict
+        self.unwritten_users = None
+        self.unwritten_mutations = []
+        self.unwritten_ops = 0
+        self.flushed_lobbies = None
+        self.failures = 0
+        self.error = None
+        self.retry_at = 0
+        self.flushes = 0
+
+        # Our own flushes must not look like someone else changed the file, see LobbiesSignature
+        self.known_signature = None
+        self.flushing = False
+        self.epoch = 0
+
+        self.closed = False
+        self.thread = threading.Thread(target=self.FlushLoop, name="write-behind", daemon=True)
+        self.thread.start()
+
+    def InitDataFiles(self):
+        """Create the data files of the inner storage"""
+        self.inner.InitDataFiles()
+
+    def QueuedUsers(self):
+        """The newest users dict that isn't on disk yet, None when there is none, caller holds the lock"""
+        if self.pending_users is not None:
+            return self.pending_users
+        with self.flush_lock:
+            return self.unwritten_users
+
+    def LoadUsers(self):
+        """Load users, including writes that haven't been flushed yet"""
+        with self.lock:
+            users = self.QueuedUsers()
+            if users is not None:
+                return dict(users)
+            return self.inner.LoadUsers()
+
+    def SaveUsers(self, users):
+        """Queue a users write, only the latest dict of a window gets written"""
+        with self.lock:
+            self.Schedule()
+            self.pending_users = users
+
+    def GetUser(self, username):
+        """One user, including writes that haven't been flushed yet"""
+        with self.lock:
+            users = self.QueuedUsers()
+            if users is not None:
+                return users.get(username)
+            return self.inner.GetUser(username)
+
+    def AddUser(self, username, user):
+        """Queue one new user unless the name is taken, returns whether it was added"""
+        with self.lock:
+            users = dict(self.LoadUsers())
+            if username in users:
+                return False
+            users[username] = user
+            self.SaveUsers(users)
+            return True
+
+    def IterUsers(self):
+        """Every user, after flushing our own pending writes"""
+        with self.lock:
+            self.Flush()
+            return self.inner.IterUsers()
+
+    def ReplaceUsers(self, pairs):
+        """Replace every user right away"""
+        with self.lock:
+            self.Flush()
+            self.inner.ReplaceUsers(pairs)
+
+    def LoadLobbies(self):
+        """Load lobbies after flushing our own pending writes"""
+        with self.lock:
+            self.Flush()
+            return self.inner.LoadLobbies()
+
+    def SaveLobbies(self, lobbies):
+        """Write a full lobbies dict right away"""
+        with self.lock:
+            self.Flush()
+            with self.flush_lock:
+                self.inner.SaveLobbies(lobbies)
+                self.flushed_lobbies = None
+                self.known_signature = self.inner.LobbiesSignature()
+
+    def CommitLobbies(self, lobbies, mutations):
+        """Queue a batch of lobby mutations for the next group commit, the mutations alone say what changed"""
+        with self.lock:
+            self.Schedule()
+            self.pending_mutations.extend(mutations)
+
+    def LobbiesSignature(self):
+        """Changes only when someone other than us writes the lobbies"""
+        with self.lock:
+            # Mid-flush the file is ours, the flush records its signature once it is done
+            if self.flushing:
+                return self.epoch
+            signature = self.inner.LobbiesSignature()
+            if signature != self.known_signature:
+                self.known_signature = signature
+                self.epoch += 1
+                # Someone else's lobbies, the next flush replays our batches onto those
+                self.flushed_lobbies = None
+            return self.epoch
+
+    def CacheStats(self):
+        """Load cache counters of the inner storage"""
+        return self.inner.CacheStats()
+
+    def Schedule(self):
+        """Count one queued write & wake the flusher when the window starts or fills up"""
+        if self.closed:
+            raise RuntimeError("Storage is closed")
+        # Don't let players think their action was saved while nothing reaches the disk
+        if self.failures >= MAX_FAILURES:
+            raise RuntimeError(f"Saving failed {self.failures} times in a row: {self.error}")
+
+        self.pending_ops += 1
+        if self.pending_ops == 1:
+            self.first_pending_at = time.monotonic()
+            self.wakeup.notify()
+        elif self.pending_ops >= self.max_ops:
+            self.wakeup.notify()
+
+    def FlushLoop(self):
+        """Background thread, flushes once per window or every max_ops writes, a failed flush every RETRY_DELAY"""
+        while True:
+            with self.lock:
+                while True:
+                    if self.closed:
+                        return
+                    if not self.pending_ops and not self.failures:
+                        self.wakeup.wait()
+                        continue
+
+                    due = self.retry_at if self.failures else self.first_pending_at + self.window
+                    remaining = due - time.monotonic()
+                    if remaining > 0 and (self.failures or self.pending_ops < self.max_ops):
+                        self.wakeup.wait(remaining)
+                        continue
+                    break
+
+                # Taking the batch needs both locks, writing it only flush_lock, so the services go on queueing
+                self.flush_lock.acquire()
+                batch = self.TakeBatch()
+            try:
+                self.WriteBatch(*batch)
+            except Exception:
+                # WriteBatch reported it & kept the batch for the retry
+                pass
+            finally:
+                self.flush_lock.release()
+
+    def TakeBatch(self):
+        """Move everything queued behind whatever a failed flush left, caller holds both locks"""
+        users = self.pending_users if self.pending_users is not None else self.unwritten_users
+        mutations = self.unwritten_mutations + self.pending_mutations
+        ops = self.unwritten_ops + self.pending_ops
+        self.pending_users, self.pending_mutations, self.pending_ops = None, [], 0
+        self.unwritten_users, self.unwritten_mutations, self.unwritten_ops = None, [], 0
+        self.flushing = True
+        return users, mutations, ops
+
+    def WriteBatch(self, users, mutations, ops):
+        """Write one batch in one go, caller holds flush_lock, returns how many writes it merged
+
+        A batch that fails is kept for the next flush, which writes it ahead of anything newer.
+        """
+        try:
+            if users is not None:
+                self.inner.SaveUsers(users)
+                users = None
+            if mutations:
+                if self.flushed_lobbies is None:
+                    self.flushed_lobbies = Thaw(self.inner.LoadLobbies())
+                # Replaying one twice after a failed commit is harmless
+                for mutation in mutations:
+                    ApplyMutation(self.flushed_lobbies, mutation)
+                self.inner.CommitLobbies(self.flushed_lobbies, mutations)
+        except Exception as e:
+            self.unwritten_users, self.unwritten_mutations, self.unwritten_ops = users, mutations, ops
+            self.failures += 1
+            self.error = e
+            self.retry_at = time.monotonic() + RETRY_DELAY
+            print(f"Write-behind flush failed ({self.failures} in a row), {ops} writes not on disk yet: {e}", flush=True)
+            raise
+        finally:
+            self.known_signature = self.inner.LobbiesSignature()
+            self.flushing = False
+
+        if self.failures:
+            print(f"Write-behind flush recovered after {self.failures} failures", flush=True)
+        self.failures = 0
+        self.error = None
+        self.flushes += 1
+        return ops
+
+    def Flush(self):
+        """Durability barrier, returns once every write queued so far is on disk"""
+        with self.lock:
+            with self.flush_lock:
+                batch = self.TakeBatch()
+                if batch[2]:
+                    self.WriteBatch(*batch)
+                else:
+                    self.flushing = False
+
+    def Close(self):
+        """Flush what is left, stop the background thread & close the inner storage"""
+        with self.lock:
+            try:
+                self.Flush()
+            finally:
+                self.closed = True
+                self.wakeup.notify()
+        self.thread.join()
+        self.inner.Close()